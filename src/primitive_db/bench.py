@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""Замеры производительности хранения и выполнения запросов.
+
+Создает во временном каталоге синтетические таблицы нужных размеров и
+замеряет основные операции: чтение и запись файла таблицы, insert с
+выдачей ID, select без условия и с условием, update, delete и вывод
+результата select. Для каждой операции выводятся пропускная
+способность, задержки p50 и p99 и пиковый объем выделенной памяти.
+Результаты сохраняются в JSON, чтобы сравнивать их с прошлыми запусками:
+
+    python -m src.primitive_db.bench --sizes 1000 100000 --output new.json
+    python -m src.primitive_db.bench --baseline old.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from src.primitive_db.catalog import Catalog
+from src.primitive_db.columnar import to_table
+from src.primitive_db.constants import METADATA_FILE
+from src.primitive_db.core import create_table, delete, insert, select, update
+from src.primitive_db.decorators import configure
+from src.primitive_db.index import build_table_indexes
+from src.primitive_db.predicate import compile_where
+from src.primitive_db.render import write_records
+from src.primitive_db.schema import get_schema
+from src.primitive_db.utils import load_table_data, save_metadata, save_table_data
+from src.primitive_db.vector import get_engine
+
+TABLE = 'bench'
+COLUMNS = ['name:str', 'age:int', 'active:bool']
+OPERATIONS = (
+    'save', 'load', 'insert', 'select', 'select_where', 'select_id',
+    'update', 'delete', 'format',
+)
+# Условие для select_where: около 10% записей, просмотр всей таблицы.
+SCAN_WHERE = 'age < 10'
+# Условие для update и delete: около 1% записей.
+CHANGE_WHERE = 'age = 7'
+REPORT_COLUMNS = [
+    'операция', 'записей', 'записей/с', 'p50, мс', 'p99, мс', 'память, КиБ',
+]
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        prog='bench',
+        description='Замеры производительности базы данных.',
+    )
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[1000, 10000, 100000, 1000000],
+        metavar='N', help='размеры синтетических таблиц',
+    )
+    parser.add_argument(
+        '--operations', nargs='+', choices=OPERATIONS, default=list(OPERATIONS),
+        metavar='OP', help=f'замеряемые операции: {", ".join(OPERATIONS)}',
+    )
+    parser.add_argument(
+        '--repeat', type=int, default=3, metavar='N',
+        help='число повторов каждой операции над всей таблицей',
+    )
+    parser.add_argument(
+        '--inserts', type=int, default=1000, metavar='N',
+        help='число команд insert, по которым считаются задержки',
+    )
+    parser.add_argument(
+        '--memory', action=argparse.BooleanOptionalAction, default=True,
+        help='замерять пиковую память (отдельным запуском под tracemalloc)',
+    )
+    parser.add_argument(
+        '--output', default='bench_results.json', metavar='FILE',
+        help='файл для сохранения результатов в JSON',
+    )
+    parser.add_argument(
+        '--baseline', metavar='FILE',
+        help='файл с прошлыми результатами для сравнения',
+    )
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора данных')
+    return parser.parse_args(argv)
+
+
+def make_records(size, seed=0):
+    """Создает записи синтетической таблицы: 1000 различных имен."""
+    rng = random.Random(seed)
+    return [
+        {
+            'ID': record_id,
+            'name': f'name{rng.randrange(1000)}',
+            'age': rng.randrange(100),
+            'active': rng.random() < 0.5,
+        }
+        for record_id in range(1, size + 1)
+    ]
+
+
+def _percentile(values, fraction):
+    """Возвращает перцентиль отсортированного списка значений."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def _peak_memory(run, args):
+    """Возвращает пиковый объем памяти, выделенной за один вызов run."""
+    tracemalloc.start()
+    try:
+        run(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(run, rows, setup=tuple, repeat=3, memory=True):
+    """Замеряет операцию над всей таблицей.
+
+    setup готовит аргументы run перед каждым повтором и в замер не
+    входит. Задержки считаются по повторам, пропускная способность -
+    по медианному повтору. Память замеряется отдельным запуском, так
+    как tracemalloc заметно замедляет выполнение.
+    """
+    latencies = []
+    for _ in range(repeat):
+        args = setup()
+        began = time.perf_counter()
+        run(*args)
+        latencies.append(time.perf_counter() - began)
+    peak = _peak_memory(run, setup()) if memory else None
+    return summarize(latencies, rows, _percentile(sorted(latencies), 0.5), peak)
+
+
+def measure_calls(call, count, memory=True):
+    """Замеряет count отдельных вызовов call(number) по одному."""
+    latencies = []
+    for number in range(count):
+        began = time.perf_counter()
+        call(number)
+        latencies.append(time.perf_counter() - began)
+    peak = None
+    if memory:
+        peak = _peak_memory(
+            lambda: [call(number) for number in range(count, 2 * count)], ()
+        )
+    return summarize(latencies, count, sum(latencies), peak)
+
+
+def summarize(latencies, rows, elapsed, peak):
+    """Собирает показатели замера: rows записей обработано за elapsed секунд."""
+    latencies = sorted(latencies)
+    return {
+        'rows': rows,
+        'throughput': rows / elapsed if elapsed > 0 else None,
+        'p50_ms': _percentile(latencies, 0.5) * 1000,
+        'p99_ms': _percentile(latencies, 0.99) * 1000,
+        'peak_bytes': peak,
+    }
+
+
+def _consume(records):
+    """Перебирает записи результата так же, как их перебирает вывод."""
+    for _ in records:
+        pass
+
+
+class Bench:
+    """Замеры операций над синтетической таблицей одного размера.
+
+    Работает в текущем каталоге: таблица записывается в data/, как в
+    обычном запуске.
+    """
+
+    def __init__(self, size, args):
+        self.size = size
+        self.args = args
+        self.records = make_records(size, args.seed)
+        self.metadata, _ = create_table({}, TABLE, COLUMNS)
+        self.schema = get_schema(self.metadata, TABLE)
+        self.names = self.schema.names
+        save_metadata(METADATA_FILE, self.metadata)
+        save_table_data(TABLE, self.records)
+
+    def fresh_table(self):
+        """Строит колоночную таблицу с индексами, как при загрузке."""
+        data = to_table(self.records, self.schema)
+        return data, build_table_indexes(data)
+
+    def measure(self, run, setup=tuple, rows=None):
+        return measure(
+            run, self.size if rows is None else rows, setup,
+            self.args.repeat, self.args.memory,
+        )
+
+    def bench_save(self):
+        return self.measure(lambda: save_table_data(TABLE, self.records))
+
+    def bench_load(self):
+        return self.measure(lambda: load_table_data(TABLE))
+
+    def bench_insert(self):
+        """insert с преобразованием значений и выдачей ID в каталоге.
+
+        Каталог работает в режиме скрипта: изменения копятся в памяти, и
+        замеряется сама команда, а не fsync журнала предзаписи.
+        """
+        catalog = Catalog()
+        catalog.deferred = True
+        catalog.load_table(TABLE)
+
+        def call(number):
+            record, _ = insert(
+                self.metadata, TABLE, [f'"item{number}"', str(number % 100), 'true']
+            )
+            with catalog.writing(TABLE):
+                record['ID'] = catalog.reserve_ids(TABLE)
+                catalog.insert_records(TABLE, [record])
+
+        try:
+            return measure_calls(call, self.args.inserts, self.args.memory)
+        finally:
+            catalog.invalidate(TABLE)
+            catalog.wal.close()
+
+    def bench_select(self):
+        data, indexes = self.fresh_table()
+        return self.measure(lambda: _consume(select(data, None, indexes)))
+
+    def bench_select_where(self):
+        data, indexes = self.fresh_table()
+        where_clause = compile_where(SCAN_WHERE, self.schema)
+        return self.measure(lambda: _consume(select(data, where_clause, indexes)))
+
+    def bench_select_id(self):
+        data, indexes = self.fresh_table()
+        where_clause = compile_where(f'ID = {self.size // 2}', self.schema)
+        return self.measure(
+            lambda: _consume(select(data, where_clause, indexes)), rows=1
+        )
+
+    def bench_update(self):
+        data, indexes = self.fresh_table()
+        where_clause = compile_where(CHANGE_WHERE, self.schema)
+        return self.measure(
+            lambda: update(data, {'active': False}, where_clause, indexes)
+        )
+
+    def bench_delete(self):
+        where_clause = compile_where(CHANGE_WHERE, self.schema)
+        return self.measure(
+            lambda data, indexes: delete(data, where_clause, indexes),
+            self.fresh_table,
+        )
+
+    def bench_format(self):
+        data, _ = self.fresh_table()
+        with open(os.devnull, 'w', encoding='utf-8') as out:
+            return self.measure(
+                lambda: write_records(data, self.names, 'table', out=out)
+            )
+
+
+def run_benchmarks(args):
+    """Выполняет замеры для всех размеров, возвращает список результатов."""
+    results = []
+    for size in args.sizes:
+        bench = Bench(size, args)
+        for operation in args.operations:
+            result = getattr(bench, f'bench_{operation}')()
+            results.append({'operation': operation, 'size': size, **result})
+            print_result(results[-1])
+    return results
+
+
+def _report_row(result):
+    """Переводит результат замера в строку отчета."""
+    throughput = result['throughput']
+    peak = result['peak_bytes']
+    return dict(zip(REPORT_COLUMNS, (
+        result['operation'],
+        result['size'],
+        '-' if throughput is None else f'{throughput:.0f}',
+        f'{result["p50_ms"]:.3f}',
+        f'{result["p99_ms"]:.3f}',
+        '-' if peak is None else f'{peak / 1024:.0f}',
+    )))
+
+
+def print_result(result):
+    """Выводит строку о замере по мере его завершения."""
+    row = _report_row(result)
+    print(', '.join(f'{name}: {row[name]}' for name in REPORT_COLUMNS), flush=True)
+
+
+def compare(results, baseline):
+    """Выводит изменение пропускной способности относительно прошлого запуска."""
+    previous = {
+        (item['operation'], item['size']): item for item in baseline['results']
+    }
+    rows = []
+    for result in results:
+        old = previous.get((result['operation'], result['size']))
+        if old is None or not old['throughput'] or not result['throughput']:
+            continue
+        change = result['throughput'] / old['throughput'] - 1
+        rows.append({
+            'операция': result['operation'],
+            'записей': result['size'],
+            'было, записей/с': f'{old["throughput"]:.0f}',
+            'стало, записей/с': f'{result["throughput"]:.0f}',
+            'изменение': f'{change:+.1%}',
+        })
+    if rows:
+        print('\nСравнение с прошлым запуском:')
+        write_records(rows, list(rows[0]))
+
+
+def main(argv=None):
+    """Точка входа замеров производительности."""
+    args = parse_args(argv)
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as e:
+            print(f'Ошибка: Не удалось прочитать файл {args.baseline} ({e}).')
+            return 1
+    output = os.path.abspath(args.output)
+    configure(confirm=False, pager=False)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='primitive_db_bench_') as workdir:
+        os.chdir(workdir)
+        try:
+            results = run_benchmarks(args)
+        finally:
+            os.chdir(cwd)
+
+    print()
+    write_records([_report_row(result) for result in results], REPORT_COLUMNS)
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'engine': get_engine().name,
+        'repeat': args.repeat,
+        'inserts': args.inserts,
+        'seed': args.seed,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f'Результаты сохранены в {args.output}.')
+    if baseline is not None:
+        compare(results, baseline)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,629 @@
+import contextlib
+import os
+import threading
+from collections import OrderedDict
+
+from src.primitive_db.columnar import to_table
+from src.primitive_db.constants import (
+    CATALOG_MAX_BYTES,
+    DATA_DIR,
+    METADATA_FILE,
+    WAL_CHECKPOINT_BYTES,
+    WAL_FILE,
+)
+from src.primitive_db.index import ID_NAME, build_table_indexes, save_table_indexes
+from src.primitive_db.metrics import metrics
+from src.primitive_db.schema import get_schema
+from src.primitive_db.stats import (
+    add_records,
+    change_columns,
+    column_stats,
+    compute_stats,
+    remove_records,
+)
+from src.primitive_db.utils import (
+    append_table_log,
+    compact_table_data,
+    file_lock,
+    load_metadata,
+    load_table_snapshot,
+    metadata_state,
+    repair_table_log,
+    save_metadata,
+    sync_table_data,
+    table_lock,
+    table_log_state,
+)
+from src.primitive_db.wal import WriteAheadLog, log_path, orphaned_logs, read_records
+
+
+class CachedTable:
+    """Данные таблицы в памяти вместе с индексами, счетчиком ID и состоянием файла.
+
+    data - колоночная таблица (ColumnarTable) или, если записи не
+    укладываются в типы столбцов, список словарей. stats - статистика
+    таблицы (см. stats.py), которая обновляется при каждой записи.
+    """
+
+    __slots__ = ('data', 'indexes', 'state', 'next_id', 'stats')
+
+    def __init__(self, data, indexes, state, next_id=1, stats=None):
+        self.data = data
+        self.indexes = indexes
+        self.state = state
+        self.next_id = next_id
+        self.stats = stats
+
+    @property
+    def size(self):
+        """Размер файла таблицы, по которому ограничивается кэш."""
+        return self.state[0] if self.state else 0
+
+
+class Catalog:
+    """Кэш метаданных и таблиц в памяти.
+
+    Файл перечитывается, только если изменились его размер или время
+    изменения. Записи через каталог сразу попадают и на диск, и в кэш.
+    При любом изменении данных таблицы вызывается on_change(имя_таблицы).
+    Когда суммарный размер закэшированных таблиц превышает лимит, давно
+    не использованные таблицы вытесняются целиком.
+
+    В отложенном режиме (deferred) изменения копятся в памяти и попадают
+    на диск одной записью на таблицу при вызове flush(). Транзакция
+    работает в отложенном режиме: commit() записывает изменения, а
+    rollback() отбрасывает их и перечитывает затронутые таблицы с диска,
+    где они остались в состоянии до начала транзакции.
+
+    Каждая группа изменений сначала записывается в журнал предзаписи
+    (WAL) и только потом в файлы таблиц. После сбоя незавершенные группы
+    применяются заново при первом обращении к каталогу.
+
+    Статистика таблиц (число записей, диапазоны столбцов int) хранится
+    в метаданных вместе с состоянием файла таблицы, для которого она
+    посчитана, и сохраняется на контрольной точке. Если файл с тех пор
+    изменился, статистика считается заново при загрузке таблицы. Так же
+    на контрольной точке (checkpoint) сохраняются вторичные индексы
+    таблиц, измененных за сеанс.
+
+    Загрузка и вытеснение таблиц выполняются под блокировкой, поэтому
+    читать таблицы можно из нескольких потоков одновременно (см.
+    server.py). Изменения данных должны выполняться по одному.
+
+    С одной базой могут работать несколько процессов: файлы читаются
+    и пишутся под блокировками fcntl (см. utils.FileLock), а кэш
+    сверяется со счетчиками изменений в файлах блокировок. У каждого
+    процесса свой WAL; группы изменений из WAL завершившихся процессов
+    применяются заново, если счетчик таблицы показывает, что они не
+    дошли до файла.
+    """
+
+    def __init__(
+        self, metadata_file=METADATA_FILE, max_bytes=CATALOG_MAX_BYTES, on_change=None
+    ):
+        self.metadata_file = metadata_file
+        self.max_bytes = max_bytes
+        self.on_change = on_change
+        self.deferred = False
+        self.in_transaction = False
+        self._deferred_before = False
+        self._metadata = None
+        self._metadata_state = None
+        self._metadata_dirty = False
+        self._tables = OrderedDict()
+        self._cached_bytes = 0
+        self._pending = {}
+        self._touched = set()
+        self._stats_changed = set()
+        self._indexes_changed = set()
+        self._recovered = False
+        self._lock = threading.RLock()
+        self.wal = WriteAheadLog(log_path(DATA_DIR, WAL_FILE))
+
+    def load_metadata(self):
+        """Возвращает метаданные, перечитывая файл только при его изменении."""
+        self._ensure_recovered()
+        state = metadata_state(self.metadata_file)
+        if self._metadata is None or state != self._metadata_state:
+            self._metadata = load_metadata(self.metadata_file)
+            self._metadata_state = state
+        return self._metadata
+
+    def save_metadata(self, metadata):
+        """Сохраняет метаданные на диск и в кэш."""
+        self._metadata = metadata
+        if self.deferred:
+            self._metadata_dirty = True
+            return
+        self._metadata_dirty = False
+        self._commit({}, metadata)
+
+    def load_table(self, table_name):
+        """Возвращает таблицу из кэша или загружает ее с диска."""
+        self._ensure_recovered()
+        with self._lock:
+            return self._load_table(table_name)
+
+    def _load_table(self, table_name):
+        cached = self._tables.get(table_name)
+        if cached is not None and (
+            table_name in self._pending
+            or cached.state == table_log_state(table_name)
+        ):
+            self._tables.move_to_end(table_name)
+            metrics.count('table_cache_hits', table=table_name)
+            return cached
+
+        metrics.count('table_cache_misses', table=table_name)
+        self.invalidate(table_name)
+        data, next_id, state = load_table_snapshot(table_name)
+        metadata = self.load_metadata()
+        stats = self._saved_stats(table_name, state)
+        if table_name in metadata:
+            schema = get_schema(metadata, table_name)
+            data = to_table(data, schema)
+            if stats is None:
+                stats = compute_stats(data, schema)
+                self._stats_changed.add(table_name)
+        indexes = build_table_indexes(data, table_name, metadata, state)
+        cached = CachedTable(data, indexes, state, next_id, stats)
+        self._tables[table_name] = cached
+        self._cached_bytes += cached.size
+        self._evict()
+        return cached
+
+    def cached_table(self, table_name):
+        """Возвращает таблицу, только если она уже актуальна в кэше."""
+        cached = self._tables.get(table_name)
+        if cached is not None and cached.state == table_log_state(table_name):
+            return cached
+        return None
+
+    def _saved_stats(self, table_name, state):
+        """Возвращает статистику из метаданных, если файл таблицы не менялся."""
+        table_info = self.load_metadata().get(table_name, {})
+        saved = table_info.get('stats')
+        if saved is None or saved.get('log_state') != list(state or ()):
+            return None
+        columns = {
+            name: dict(entry) for name, entry in saved['columns'].items()
+        }
+        return {'rows': saved['rows'], 'columns': columns}
+
+    def table_stats(self, table_name):
+        """Возвращает статистику таблицы.
+
+        Если таблица не загружена, а статистика в метаданных актуальна,
+        таблица не читается с диска.
+        """
+        cached = self.cached_table(table_name)
+        if cached is None:
+            stats = self._saved_stats(table_name, table_log_state(table_name))
+            if stats is not None and None not in stats['columns'].values():
+                return stats
+            cached = self.load_table(table_name)
+        for name in cached.stats['columns']:
+            column_stats(cached.stats, cached.data, name)
+        return cached.stats
+
+    def invalidate(self, table_name):
+        """Убирает таблицу из кэша вместе с ее отложенными изменениями."""
+        with self._lock:
+            self._pending.pop(table_name, None)
+            cached = self._tables.pop(table_name, None)
+            if cached is not None:
+                self._cached_bytes -= cached.size
+        self._notify(table_name)
+
+    @contextlib.contextmanager
+    def writing(self, table_name):
+        """Не дает другим процессам менять таблицу во время команды изменения.
+
+        Между проверкой кэша и записью таблица не может измениться,
+        поэтому чужие изменения не теряются, а ID не выдаются дважды.
+        """
+        with table_lock(table_name).exclusive():
+            yield
+
+    def rebuild_indexes(self, table_name):
+        """Перестраивает индексы закэшированной таблицы по метаданным.
+
+        Индексы таблицы с отложенными изменениями не сохраняются: ее
+        данные в памяти не соответствуют ни одному состоянию журнала.
+        """
+        cached = self.load_table(table_name)
+        state = None if table_name in self._pending else cached.state
+        cached.indexes = build_table_indexes(
+            cached.data, table_name, self.load_metadata(), state
+        )
+        return cached
+
+    def reserve_ids(self, table_name, count=1):
+        """Выделяет блок из count последовательных ID и возвращает первый.
+
+        Счетчик не пересчитывается по данным таблицы, поэтому выдача ID
+        не зависит от ее размера. Блок выделяется только в памяти и
+        попадает в журнал вместе с записями (см. insert_records), поэтому
+        ID выдаются под блокировкой writing.
+        """
+        cached = self.load_table(table_name)
+        first_id = cached.next_id
+        cached.next_id += count
+        return first_id
+
+    def insert_records(self, table_name, records):
+        """Добавляет записи в таблицу на диске и в кэше.
+
+        Если запись не укладывается в столбцы колоночной таблицы, таблица
+        в кэше переводится в список словарей. Если выделенные reserve_ids
+        ID не все заняты записями, счетчик ID записывается той же
+        операцией, чтобы эти ID не были выданы повторно.
+        """
+        cached = self.load_table(table_name)
+        entries = [{'op': 'insert', 'record': rec} for rec in records]
+        if cached.next_id > max((rec[ID_NAME] for rec in records), default=0) + 1:
+            entries.append({'op': 'sequence', 'next_id': cached.next_id})
+        self._write(table_name, entries)
+        for record in records:
+            position = len(cached.data)
+            try:
+                cached.data.append(record)
+            except (TypeError, KeyError, OverflowError):
+                cached.data = [dict(row) for row in cached.data]
+                cached.data.append(record)
+            cached.next_id = max(cached.next_id, record[ID_NAME] + 1)
+            for column, index in cached.indexes.items():
+                if column in record:
+                    index.add(record[column], index.ref(record, position))
+        self._update_stats(table_name, add_records, records)
+
+    def log_updates(self, table_name, table_data, updated, columns=()):
+        """Записывает на диск записи, уже обновленные в кэше.
+
+        table_data - данные таблицы после update (колоночная таблица могла
+        стать списком словарей). columns - измененные столбцы, статистика
+        которых устарела.
+        """
+        self._write(
+            table_name, [{'op': 'update', 'record': dict(rec)} for rec in updated]
+        )
+        cached = self._tables.get(table_name)
+        if cached is not None:
+            cached.data = table_data
+        self._update_stats(table_name, change_columns, columns)
+
+    def log_deletes(self, table_name, table_data, deleted):
+        """Записывает на диск удаление записей и обновляет кэш."""
+        self._write(
+            table_name, [{'op': 'delete', 'ID': rec['ID']} for rec in deleted]
+        )
+        cached = self._tables.get(table_name)
+        if cached is not None:
+            cached.data = table_data
+        self._update_stats(table_name, remove_records, deleted)
+
+    def _update_stats(self, table_name, update, items):
+        """Применяет изменение к статистике закэшированной таблицы."""
+        cached = self._tables.get(table_name)
+        if cached is not None and cached.stats is not None:
+            update(cached.stats, items)
+            self._stats_changed.add(table_name)
+
+    def save_stats(self):
+        """Сохраняет статистику измененных таблиц в метаданные.
+
+        Статистика помечается состоянием файла, по данным которого она
+        посчитана, поэтому ее сохраняют, только когда все изменения уже
+        записаны в файлы. Статистика таблицы, которую с тех пор изменил
+        другой процесс, не сохраняется.
+        """
+        if self.in_transaction or self._pending or self._metadata_dirty:
+            return
+        with file_lock(self.metadata_file).exclusive(), self._lock:
+            self._save_stats()
+
+    def _save_stats(self):
+        metadata = self.load_metadata()
+        changed = False
+        for table_name in self._stats_changed:
+            cached = self._tables.get(table_name)
+            if cached is None or cached.stats is None or table_name not in metadata:
+                continue
+            if self._changed_elsewhere(table_name):
+                continue
+            for name in cached.stats['columns']:
+                column_stats(cached.stats, cached.data, name)
+            metadata[table_name]['stats'] = {
+                'rows': cached.stats['rows'],
+                'columns': {
+                    name: dict(entry)
+                    for name, entry in cached.stats['columns'].items()
+                },
+                'log_state': list(cached.state or ()),
+            }
+            changed = True
+        self._stats_changed.clear()
+        if changed:
+            self._metadata_state = save_metadata(self.metadata_file, metadata)
+
+    def save_indexes(self):
+        """Сохраняет вторичные индексы таблиц, измененных с прошлого сохранения.
+
+        Индексы помечаются состоянием файла после последней записи, поэтому
+        следующий запуск загружает их, а не строит заново. Индексы таблицы
+        с отложенными изменениями или измененной другим процессом не
+        сохраняются.
+        """
+        with self._lock:
+            for table_name in self._indexes_changed:
+                cached = self._tables.get(table_name)
+                if (
+                    cached is None
+                    or table_name in self._pending
+                    or self._changed_elsewhere(table_name)
+                ):
+                    continue
+                save_table_indexes(table_name, cached.indexes, cached.state)
+            self._indexes_changed.clear()
+
+    def compact(self, table_name):
+        """Сжимает журнал таблицы (см. compact_table_data).
+
+        Записи и их порядок при сжатии не меняются, поэтому актуальная
+        таблица остается в кэше с новым состоянием файла, а ее индексы
+        сохраняются на контрольной точке. Возвращает количество строк
+        журнала до и после сжатия.
+        """
+        with table_lock(table_name).exclusive():
+            cached = self.cached_table(table_name)
+            result = compact_table_data(table_name)
+            if cached is not None and table_name not in self._pending:
+                with self._lock:
+                    cached.state = table_log_state(table_name)
+                    self._indexes_changed.add(table_name)
+        return result
+
+    def begin(self):
+        """Начинает транзакцию.
+
+        Возвращает таблицы, отложенные изменения которых отменены (см. flush).
+        """
+        conflicts = self.flush()
+        self._deferred_before = self.deferred
+        self.deferred = True
+        self.in_transaction = True
+        return conflicts
+
+    def commit(self):
+        """Завершает транзакцию, записывая каждую измененную таблицу один раз.
+
+        Возвращает таблицы, изменения которых отменены (см. flush).
+        """
+        self.in_transaction = False
+        conflicts = self.flush()
+        self.deferred = self._deferred_before
+        return conflicts
+
+    def rollback(self):
+        """Отменяет транзакцию и возвращает данные к состоянию до ее начала."""
+        for table_name in list(self._pending):
+            self.invalidate(table_name)
+        if self._metadata_dirty:
+            self._metadata = None
+            self._metadata_dirty = False
+            for table_name in list(self._tables):
+                self.invalidate(table_name)
+        self.in_transaction = False
+        self.deferred = self._deferred_before
+
+    def flush(self):
+        """Записывает на диск все отложенные изменения.
+
+        Таблица с отложенными изменениями не перечитывается с диска до
+        записи. Если за это время ее изменил другой процесс, изменения
+        таблицы отменяются, чтобы не затереть чужие. Возвращает список
+        таких таблиц. Внутри транзакции ничего не делает: изменения
+        записывает commit().
+        """
+        if self.in_transaction:
+            return []
+        metadata = self._metadata if self._metadata_dirty else None
+        self._metadata_dirty = False
+        pending, self._pending = self._pending, {}
+        return self._commit(pending, metadata)
+
+    def checkpoint(self):
+        """Сбрасывает файлы таблиц на диск, очищает WAL, сохраняет статистику.
+
+        Сохраняет также вторичные индексы измененных таблиц (см.
+        save_indexes). Вызывается, когда другие потоки не меняют таблицы:
+        пока команда изменения не записала изменения в журнал, индексы в
+        памяти опережают его.
+        """
+        self._checkpoint_wal()
+        self.save_indexes()
+
+    def _checkpoint_wal(self):
+        """Сбрасывает файлы таблиц на диск, очищает WAL и сохраняет статистику."""
+        for table_name in self._touched:
+            sync_table_data(table_name)
+        self._touched.clear()
+        self.wal.checkpoint()
+        self.save_stats()
+
+    def close(self):
+        """Записывает отложенные изменения и закрывает WAL."""
+        self.flush()
+        self.checkpoint()
+        self.wal.close()
+
+    def recover(self):
+        """Применяет группы изменений из WAL завершившихся процессов.
+
+        Группа записана в WAL вместе со значениями счетчиков изменений,
+        которые получат ее таблицы. Если счетчик таблицы уже не меньше,
+        группа дошла до файла и пропускается; иначе она применяется
+        заново, для каждой таблицы в порядке счетчиков. Повторное
+        применение группы безопасно: операции журнала таблицы задают
+        итоговое состояние записи, а не изменение относительно
+        предыдущего. Возвращает количество прочитанных групп.
+        """
+        self._recovered = True
+        logs = orphaned_logs(DATA_DIR, WAL_FILE)
+        try:
+            records = [
+                record for log in logs for record in read_records(log.name)
+            ]
+            tables = self._replay_tables(records)
+            self._replay_metadata(records)
+            self._touched.update(tables)
+            self._checkpoint_wal()
+            for log in logs:
+                os.remove(log.name)
+        finally:
+            for log in logs:
+                log.close()
+        return len(records)
+
+    def _replay_tables(self, records):
+        """Дописывает в журналы таблиц группы, не дошедшие до файлов."""
+        groups = {}
+        for order, record in enumerate(records):
+            versions = record.get('versions', {})
+            for table_name, entries in record.get('tables', {}).items():
+                version = versions.get(table_name)
+                groups.setdefault(table_name, []).append((version or 0, order, entries))
+        for table_name, table_groups in groups.items():
+            lock = table_lock(table_name)
+            with lock.exclusive():
+                repair_table_log(table_name)
+                for version, _, entries in sorted(table_groups, key=lambda g: g[:2]):
+                    if version and lock.version() >= version:
+                        continue
+                    append_table_log(table_name, entries)
+                    if lock.version() < version:
+                        lock.set_version(version)
+        return set(groups)
+
+    def _replay_metadata(self, records):
+        """Сохраняет последнюю версию метаданных из WAL, если она не дошла до файла."""
+        saved = [
+            (record.get('metadata_version', 0), order, record['metadata'])
+            for order, record in enumerate(records)
+            if 'metadata' in record
+        ]
+        if not saved:
+            return
+        version, _, metadata = max(saved, key=lambda item: item[:2])
+        lock = file_lock(self.metadata_file)
+        with lock.exclusive():
+            if version and lock.version() >= version:
+                return
+            save_metadata(self.metadata_file, metadata)
+            if lock.version() < version:
+                lock.set_version(version)
+
+    def _ensure_recovered(self):
+        """Выполняет восстановление по WAL при первом обращении."""
+        if not self._recovered:
+            self.recover()
+
+    def _commit(self, tables, metadata=None):
+        """Записывает группу изменений в WAL, затем в файлы.
+
+        tables - словарь {имя_таблицы: операции журнала}. Таблицы и
+        метаданные блокируются на всю запись (таблицы - в порядке имен,
+        затем метаданные), поэтому в WAL группа получает те значения
+        счетчиков изменений, которые будут у файлов после нее.
+        Возвращает таблицы, изменения которых отменены (см. flush).
+        """
+        if not tables and metadata is None:
+            return []
+        with contextlib.ExitStack() as stack:
+            locks = {}
+            for table_name in sorted(tables):
+                locks[table_name] = table_lock(table_name)
+                stack.enter_context(locks[table_name].exclusive())
+            conflicts = [name for name in tables if self._changed_elsewhere(name)]
+            tables = {
+                name: entries for name, entries in tables.items()
+                if name not in conflicts
+            }
+            record = {
+                'tables': tables,
+                'versions': {name: locks[name].version() + 1 for name in tables},
+            }
+            if metadata is not None:
+                lock = file_lock(self.metadata_file)
+                stack.enter_context(lock.exclusive())
+                record['metadata'] = metadata
+                record['metadata_version'] = lock.version() + 1
+            if tables or metadata is not None:
+                self.wal.append(record)
+            if metadata is not None:
+                self._metadata_state = save_metadata(self.metadata_file, metadata)
+            for table_name, entries in tables.items():
+                self._append(table_name, entries)
+        for table_name in conflicts:
+            self.invalidate(table_name)
+        if self.wal.size >= WAL_CHECKPOINT_BYTES:
+            self._checkpoint_wal()
+        return conflicts
+
+    def _changed_elsewhere(self, table_name):
+        """Проверяет, изменился ли файл таблицы после загрузки ее в кэш."""
+        cached = self._tables.get(table_name)
+        return cached is not None and cached.state != table_log_state(table_name)
+
+    def _write(self, table_name, entries):
+        """Записывает операции сразу или откладывает их до flush()."""
+        if self.deferred:
+            pending = self._pending.setdefault(table_name, [])
+            for entry in entries:
+                if 'record' in entry:
+                    entry = {**entry, 'record': dict(entry['record'])}
+                pending.append(entry)
+            self._notify(table_name)
+            return
+        self._commit({table_name: entries})
+
+    def _append(self, table_name, entries):
+        """Дописывает операции в журнал и обновляет состояние файла в кэше."""
+        try:
+            state = append_table_log(table_name, entries)
+        except Exception:
+            self.invalidate(table_name)
+            raise
+        self._touched.add(table_name)
+        self._notify(table_name)
+        with self._lock:
+            cached = self._tables.get(table_name)
+            if cached is not None:
+                self._indexes_changed.add(table_name)
+                self._cached_bytes -= cached.size
+                cached.state = state
+                self._cached_bytes += cached.size
+                self._evict()
+
+    def _notify(self, table_name):
+        """Сообщает подписчику об изменении данных таблицы."""
+        if self.on_change is not None:
+            self.on_change(table_name)
+
+    def _evict(self):
+        """Вытесняет давно не использованные таблицы при превышении лимита.
+
+        Таблицы с отложенными изменениями и последняя использованная
+        таблица не вытесняются.
+        """
+        last_used = next(reversed(self._tables), None)
+        candidates = [
+            name
+            for name in self._tables
+            if name != last_used and name not in self._pending
+        ]
+        for table_name in candidates:
+            if self._cached_bytes <= self.max_bytes:
+                break
+            cached = self._tables.pop(table_name)
+            self._cached_bytes -= cached.size
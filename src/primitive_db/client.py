@@ -0,0 +1,121 @@
+import asyncio
+import socket
+import sys
+
+import prompt
+
+from src.primitive_db.constants import SERVER_HOST, SERVER_PORT
+
+# Протокол сервера (см. server.py): клиент отправляет команду одной
+# строкой, сервер отвечает заголовком "OK <n>" или "ERR <n>" и n байтами
+# вывода команды в UTF-8.
+
+
+def encode_command(command):
+    """Кодирует команду для отправки серверу."""
+    return command.replace('\n', ' ').encode('utf-8') + b'\n'
+
+
+def encode_response(ok, text):
+    """Кодирует ответ сервера: заголовок и вывод команды."""
+    payload = text.encode('utf-8')
+    return f"{'OK' if ok else 'ERR'} {len(payload)}\n".encode('ascii') + payload
+
+
+def _parse_header(header):
+    """Разбирает заголовок ответа, возвращает (успех, размер вывода)."""
+    if not header:
+        raise ConnectionError('сервер закрыл соединение')
+    status, size = header.split()
+    return status == b'OK', int(size)
+
+
+class Connection:
+    """Соединение с сервером базы данных."""
+
+    def __init__(self, host=SERVER_HOST, port=SERVER_PORT):
+        self._socket = socket.create_connection((host, port))
+        self._file = self._socket.makefile('rb')
+
+    def request(self, command):
+        """Выполняет команду на сервере, возвращает (успех, вывод)."""
+        self._socket.sendall(encode_command(command))
+        ok, size = _parse_header(self._file.readline())
+        return ok, self._file.read(size).decode('utf-8')
+
+    def close(self):
+        """Завершает сеанс и закрывает соединение."""
+        try:
+            self._socket.sendall(b'exit\n')
+        except OSError:
+            pass
+        self._file.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AsyncConnection:
+    """Соединение с сервером для asyncio (используется в loadgen.py)."""
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+
+    @classmethod
+    async def open(cls, host=SERVER_HOST, port=SERVER_PORT):
+        """Подключается к серверу."""
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def request(self, command):
+        """Выполняет команду на сервере, возвращает (успех, вывод)."""
+        self._writer.write(encode_command(command))
+        await self._writer.drain()
+        ok, size = _parse_header(await self._reader.readline())
+        return ok, (await self._reader.readexactly(size)).decode('utf-8')
+
+    async def close(self):
+        """Завершает сеанс и закрывает соединение."""
+        try:
+            self._writer.write(b'exit\n')
+            await self._writer.drain()
+        except ConnectionError:
+            pass
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def run_client(host=SERVER_HOST, port=SERVER_PORT):
+    """Цикл работы с сервером вместо локального цикла run().
+
+    Возвращает код завершения: 0 при выходе по exit, 1, если
+    подключиться не удалось или соединение было потеряно.
+    """
+    try:
+        connection = Connection(host, port)
+    except OSError as e:
+        print(f'Ошибка: Не удалось подключиться к серверу {host}:{port} ({e}).')
+        return 1
+
+    with connection:
+        print(f"***Операции с данными*** (сервер {host}:{port})")
+        try:
+            sys.stdout.write(connection.request('help')[1])
+            while True:
+                user_input = prompt.string(">>> Введите команду: ").strip()
+                if not user_input:
+                    continue
+                if user_input == 'exit':
+                    break
+                sys.stdout.write(connection.request(user_input)[1])
+        except (ConnectionError, OSError, ValueError):
+            print('Ошибка: Соединение с сервером потеряно.')
+            return 1
+    return 0
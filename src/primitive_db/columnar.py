@@ -0,0 +1,389 @@
+import operator
+import sys
+from array import array
+from collections.abc import Mapping
+from functools import partial
+from itertools import compress
+
+# Операторы с переставленными аргументами: map(partial(op, значение), столбец)
+# вычисляет "элемент_столбца оператор значение" без цикла на Python.
+_SWAPPED = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.gt,
+    '<=': operator.ge,
+    '>': operator.lt,
+    '>=': operator.le,
+}
+_DIRECT = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def mask_and(first, second):
+    """Пересечение двух масок (bytes из 0 и 1)."""
+    size = len(first)
+    value = int.from_bytes(first, 'little') & int.from_bytes(second, 'little')
+    return value.to_bytes(size, 'little')
+
+
+def mask_or(first, second):
+    """Объединение двух масок."""
+    size = len(first)
+    value = int.from_bytes(first, 'little') | int.from_bytes(second, 'little')
+    return value.to_bytes(size, 'little')
+
+
+def mask_not(mask):
+    """Дополнение маски."""
+    size = len(mask)
+    ones = int.from_bytes(b'\x01' * size, 'little')
+    return (int.from_bytes(mask, 'little') ^ ones).to_bytes(size, 'little')
+
+
+def mask_positions(mask):
+    """Возвращает позиции, отмеченные в маске."""
+    return list(compress(range(len(mask)), mask))
+
+
+def _check(column, value):
+    """Проверяет, что значение подходит по типу для столбца."""
+    if type(value) is not column.kind:
+        raise TypeError(f'ожидается {column.kind.__name__}, получено: {value!r}')
+
+
+class IntColumn:
+    """Столбец int: значения хранятся в array('q') по 8 байт."""
+
+    __slots__ = ('values',)
+    kind = int
+
+    def __init__(self, values=()):
+        self.values = array('q', values)
+
+    @classmethod
+    def view(cls, buffer):
+        """Создает столбец только для чтения поверх memoryview формата 'q'."""
+        column = cls.__new__(cls)
+        column.values = buffer
+        return column
+
+    def buffer(self):
+        """Возвращает байты значений столбца."""
+        return memoryview(self.values).cast('B')
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, position):
+        return self.values[position]
+
+    def set(self, position, value):
+        _check(self, value)
+        self.values[position] = value
+
+    def append(self, value):
+        self.values.append(value)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def compare_mask(self, op, value):
+        return bytes(map(partial(_SWAPPED[op], value), self.values))
+
+    def member_mask(self, values):
+        return bytes(map(values.__contains__, self.values))
+
+    def compress(self, keep):
+        return IntColumn(compress(self.values, keep))
+
+    def nbytes(self):
+        return sys.getsizeof(self.values)
+
+
+class BoolColumn:
+    """Столбец bool: по одному байту (0 или 1) на запись в bytearray."""
+
+    __slots__ = ('values',)
+    kind = bool
+
+    def __init__(self, values=()):
+        self.values = bytearray(values)
+
+    @classmethod
+    def view(cls, buffer):
+        """Создает столбец только для чтения поверх memoryview байтов."""
+        column = cls.__new__(cls)
+        column.values = buffer
+        return column
+
+    def buffer(self):
+        """Возвращает байты значений столбца."""
+        return memoryview(self.values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, position):
+        return self.values[position] == 1
+
+    def set(self, position, value):
+        _check(self, value)
+        self.values[position] = value
+
+    def append(self, value):
+        self.values.append(value)
+
+    def __iter__(self):
+        return map(bool, self.values)
+
+    def compare_mask(self, op, value):
+        if op == '=':
+            return bytes(self.values) if value else mask_not(self.values)
+        if op == '!=':
+            return mask_not(self.values) if value else bytes(self.values)
+        return bytes(map(partial(_SWAPPED[op], int(value)), self.values))
+
+    def member_mask(self, values):
+        return bytes(map({int(value) for value in values}.__contains__, self.values))
+
+    def compress(self, keep):
+        return BoolColumn(compress(self.values, keep))
+
+    def nbytes(self):
+        return sys.getsizeof(self.values)
+
+
+class StrColumn:
+    """Столбец str со словарным кодированием.
+
+    Каждая различная строка хранится один раз в словаре, а для записей
+    хранятся только ее коды в array('I') по 4 байта. Условие по столбцу
+    проверяется сначала по словарю, а затем по кодам.
+    """
+
+    __slots__ = ('codes', 'dictionary', '_lookup')
+    kind = str
+
+    def __init__(self, values=()):
+        self.codes = array('I')
+        self.dictionary = []
+        self._lookup = {}
+        for value in values:
+            self.append(value)
+
+    @classmethod
+    def view(cls, buffer):
+        """Создает столбец только для чтения поверх memoryview кодов формата 'I'.
+
+        Словарь в таком столбце пуст: условия по нему проверяются по
+        готовым наборам кодов (см. codes_mask).
+        """
+        column = cls.__new__(cls)
+        column.codes = buffer
+        column.dictionary = []
+        column._lookup = {}
+        return column
+
+    def buffer(self):
+        """Возвращает байты кодов столбца."""
+        return memoryview(self.codes).cast('B')
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _encode(self, value):
+        _check(self, value)
+        code = self._lookup.get(value)
+        if code is None:
+            code = len(self.dictionary)
+            self.dictionary.append(value)
+            self._lookup[value] = code
+        return code
+
+    def get(self, position):
+        return self.dictionary[self.codes[position]]
+
+    def set(self, position, value):
+        self.codes[position] = self._encode(value)
+
+    def append(self, value):
+        self.codes.append(self._encode(value))
+
+    def __iter__(self):
+        return map(self.dictionary.__getitem__, self.codes)
+
+    def codes_mask(self, matching):
+        """Маска записей, код которых входит в matching."""
+        if not matching:
+            return bytes(len(self.codes))
+        if len(matching) == 1:
+            (code,) = matching
+            return bytes(map(partial(operator.eq, code), self.codes))
+        return bytes(map(matching.__contains__, self.codes))
+
+    def matching_codes(self, op, value):
+        """Коды строк словаря, для которых 'строка оператор значение' истинно."""
+        compare = _DIRECT[op]
+        return {
+            code for code, item in enumerate(self.dictionary) if compare(item, value)
+        }
+
+    def member_codes(self, values):
+        """Коды строк словаря, входящих в values."""
+        return {self._lookup[value] for value in values if value in self._lookup}
+
+    def compare_mask(self, op, value):
+        return self.codes_mask(self.matching_codes(op, value))
+
+    def member_mask(self, values):
+        return self.codes_mask(self.member_codes(values))
+
+    def compress(self, keep):
+        return StrColumn(
+            map(self.dictionary.__getitem__, compress(self.codes, keep))
+        )
+
+    def nbytes(self):
+        total = sys.getsizeof(self.codes) + sys.getsizeof(self.dictionary)
+        total += sys.getsizeof(self._lookup)
+        return total + sum(sys.getsizeof(value) for value in self.dictionary)
+
+
+COLUMN_TYPES = {
+    'int': IntColumn,
+    'bool': BoolColumn,
+    'str': StrColumn,
+}
+
+
+class RowView(Mapping):
+    """Запись колоночной таблицы, доступная как словарь.
+
+    Значения читаются и записываются прямо в столбцы таблицы, поэтому
+    код, работающий со словарями записей, работает и с представлениями.
+    """
+
+    __slots__ = ('_table', '_position')
+
+    def __init__(self, table, position):
+        self._table = table
+        self._position = position
+
+    def __getitem__(self, name):
+        return self._table.columns[name].get(self._position)
+
+    def __setitem__(self, name, value):
+        self._table.columns[name].set(self._position, value)
+
+    def get(self, name, default=None):
+        column = self._table.columns.get(name)
+        return default if column is None else column.get(self._position)
+
+    def __contains__(self, name):
+        return name in self._table.columns
+
+    def __iter__(self):
+        return iter(self._table.columns)
+
+    def __len__(self):
+        return len(self._table.columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ColumnarTable:
+    """Таблица в памяти, хранящая данные по столбцам.
+
+    Поддерживает те же операции, что и список записей (len, индексация,
+    перебор, append), но вместо словарей возвращает RowView. Для
+    просмотра по условию столбцы сравниваются целиком и дают маски
+    (см. compare_mask и member_mask).
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._size = len(next(iter(columns.values()))) if columns else 0
+
+    @classmethod
+    def from_records(cls, records, schema):
+        """Строит таблицу из записей по схеме.
+
+        Выбрасывает TypeError, KeyError или OverflowError, если записи
+        не укладываются в типы столбцов.
+        """
+        columns = {}
+        for column in schema.columns:
+            column_class = COLUMN_TYPES[column.type]
+            columns[column.name] = column_class()
+        table = cls(columns)
+        for record in records:
+            table.append(record)
+        return table
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self._size
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        return RowView(self, position)
+
+    def __iter__(self):
+        return map(partial(RowView, self), range(self._size))
+
+    def append(self, record):
+        """Добавляет запись-словарь.
+
+        Все значения проверяются до изменения столбцов, поэтому при
+        ошибке таблица остается прежней.
+        """
+        if len(record) != len(self.columns):
+            raise KeyError(next(iter(set(record) ^ set(self.columns))))
+        for name, column in self.columns.items():
+            _check(column, record[name])
+        for name, column in self.columns.items():
+            column.append(record[name])
+        self._size += 1
+
+    def column_values(self, name):
+        """Перебирает значения столбца по порядку записей."""
+        return iter(self.columns[name])
+
+    def compare_mask(self, name, op, value):
+        """Маска записей, для которых 'столбец оператор значение' истинно."""
+        return self.columns[name].compare_mask(op, value)
+
+    def member_mask(self, name, values):
+        """Маска записей, значение столбца которых входит в values."""
+        return self.columns[name].member_mask(values)
+
+    def compress(self, keep):
+        """Возвращает новую таблицу из записей, отмеченных в маске keep."""
+        return ColumnarTable(
+            {name: column.compress(keep) for name, column in self.columns.items()}
+        )
+
+    def nbytes(self):
+        """Оценка памяти, занятой столбцами, в байтах."""
+        return sum(column.nbytes() for column in self.columns.values())
+
+
+def to_table(records, schema):
+    """Переводит список записей в колоночную таблицу.
+
+    Если записи не укладываются в типы столбцов (например, в старых
+    данных), возвращает исходный список.
+    """
+    try:
+        return ColumnarTable.from_records(records, schema)
+    except (TypeError, KeyError, OverflowError, ValueError):
+        return records
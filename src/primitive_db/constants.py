@@ -1,6 +1,32 @@
 METADATA_FILE = 'db_meta.json'
 DATA_DIR = 'data'
 
+TABLE_LOG_SUFFIX = '.jsonl'
+LEGACY_TABLE_SUFFIX = '.json'
+INDEX_SUFFIX = '.idx'
+LOCK_SUFFIX = '.lock'
+COMPACT_MIN_ENTRIES = 1000
+CATALOG_MAX_BYTES = 256 * 1024 * 1024
+CACHE_MAX_SIZE = 128
+STATEMENT_CACHE_SIZE = 256
+IMPORT_BATCH_SIZE = 1000
+IMPORT_MAX_REJECTED_SHOWN = 20
+EXPORT_BUFFER_SIZE = 1024 * 1024
+OUTPUT_PAGE_SIZE = 100
+OUTPUT_MAX_COLUMN_WIDTH = 60
+OUTPUT_FORMATS = ('table', 'tsv', 'jsonl')
+ENGINE_NAMES = ('auto', 'python', 'numpy')
+PARALLEL_MIN_ROWS = 1_000_000
+PROFILE_TOP_FUNCTIONS = 20
+
+WAL_FILE = 'wal.log'
+WAL_CHECKPOINT_BYTES = 4 * 1024 * 1024
+GROUP_COMMIT_DELAY = 0.0
+
 VALID_TYPES = {'int', 'str', 'bool'}
 
 ID_COLUMN = 'ID:int'
+
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 7433
+SERVER_THREADS = 8
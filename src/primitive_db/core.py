@@ -1,52 +1,27 @@
+import heapq
+from itertools import islice
+from operator import add, itemgetter
+
+from src.primitive_db.columnar import ColumnarTable
 from src.primitive_db.constants import ID_COLUMN, VALID_TYPES
 from src.primitive_db.decorators import (
     confirm_action,
     handle_db_errors,
     log_time,
 )
+from src.primitive_db.index import (
+    ID_NAME,
+    INDEX_KINDS,
+    SortedIndex,
+    candidate_positions,
+    ordered_positions,
+    remove_from_indexes,
+)
+from src.primitive_db.metrics import metrics
+from src.primitive_db.schema import get_schema
+from src.primitive_db.vector import get_engine
 
-
-def _parse_column_type(col_def):
-    """Парсит определение столбца в формате 'имя:тип'."""
-    if ':' not in col_def:
-        return None, None
-    col_name, col_type = col_def.split(':', 1)
-    return col_name, col_type
-
-
-def _validate_value_type(value, expected_type):
-    """Проверяет соответствие значения ожидаемому типу."""
-    if expected_type == 'int':
-        return isinstance(value, int)
-    elif expected_type == 'str':
-        return isinstance(value, str)
-    elif expected_type == 'bool':
-        return isinstance(value, bool)
-    return False
-
-
-def _convert_value(value_str, expected_type):
-    """Преобразует строковое значение в значение нужного типа."""
-    value_str = value_str.strip()
-    if value_str.startswith('"') and value_str.endswith('"'):
-        value_str = value_str[1:-1]
-    elif value_str.startswith("'") and value_str.endswith("'"):
-        value_str = value_str[1:-1]
-
-    if expected_type == 'int':
-        try:
-            return int(value_str)
-        except ValueError:
-            return None
-    elif expected_type == 'str':
-        return value_str
-    elif expected_type == 'bool':
-        if value_str.lower() == 'true':
-            return True
-        elif value_str.lower() == 'false':
-            return False
-        return None
-    return None
+_MISSING = object()
 
 
 @handle_db_errors
@@ -71,7 +46,9 @@ def create_table(metadata, table_name, columns):
     }
 
     columns_str = ', '.join(table_columns)
-    return metadata, f'Таблица "{table_name}" успешно создана со столбцами: {columns_str}'
+    return metadata, (
+        f'Таблица "{table_name}" успешно создана со столбцами: {columns_str}'
+    )
 
 
 @handle_db_errors
@@ -100,92 +77,410 @@ def insert(metadata, table_name, values):
     if table_name not in metadata:
         return None, f'Ошибка: Таблица "{table_name}" не существует.'
 
-    table_info = metadata[table_name]
-    columns = table_info['columns']
-    data_columns = columns[1:]
-
-    if len(values) != len(data_columns):
-        return None, 'Некорректное значение: количество значений не соответствует столбцам. Попробуйте снова.'
+    return get_schema(metadata, table_name).convert_row(values)
 
-    record = {}
-    for i, col_def in enumerate(data_columns):
-        col_name, col_type = _parse_column_type(col_def)
-        if col_name is None:
-            return None, f'Некорректное значение: {col_def}. Попробуйте снова.'
 
-        converted_value = _convert_value(values[i], col_type)
-        if converted_value is None:
-            return None, f'Некорректное значение: {values[i]}. Попробуйте снова.'
+def iter_matching(records, where_clause=None):
+    """Перебирает записи, удовлетворяющие условию where, без их накопления.
 
-        record[col_name] = converted_value
-
-    return record, None
+    where_clause - скомпилированное условие (Predicate) или None.
+    Колоночная таблица проверяется по столбцам, а не по записям.
+    """
+    if where_clause is None:
+        yield from records
+        return
+    if isinstance(records, ColumnarTable):
+        for position in where_clause.scan(records):
+            yield records[position]
+        return
+    matches = where_clause.matches
+    for record in records:
+        if matches(record):
+            yield record
+
+
+def _matching_positions(table_data, where_clause, indexes):
+    """Возвращает позиции записей, удовлетворяющих условию where.
+
+    Если условие содержит равенство или IN по индексированному столбцу,
+    связанные с остальным условием через AND, записи ищутся по индексу,
+    иначе просматривается вся таблица.
+    """
+    matches = where_clause.matches
+    positions = candidate_positions(indexes, where_clause.conditions)
+    metrics.count(
+        'rows_scanned', len(table_data) if positions is None else len(positions)
+    )
+    if positions is None and isinstance(table_data, ColumnarTable):
+        return where_clause.scan(table_data)
+    if positions is None:
+        return [
+            position
+            for position, record in enumerate(table_data)
+            if matches(record)
+        ]
+    return [
+        position
+        for position in sorted(positions)
+        if matches(table_data[position])
+    ]
+
+
+def _ordered_select(table_data, where_clause, indexes, order_by, limit, offset):
+    """Выбирает записи с сортировкой и ограничением количества.
+
+    Если условие where подбирается по индексу, сортируются только
+    найденные записи. Иначе при упорядоченном индексе по столбцу
+    сортировки записи читаются в порядке индекса до набора нужного
+    количества. В остальных случаях для limit используется куча из
+    offset + limit записей, и таблица целиком не сортируется.
+    """
+    stop = None if limit is None else offset + limit
+    positions = None
+    if where_clause is not None:
+        positions = candidate_positions(indexes, where_clause.conditions)
+
+    if positions is None and order_by is not None:
+        walk = ordered_positions(indexes, *order_by)
+        if walk is not None:
+            walk = metrics.counted('rows_scanned', walk)
+            records = (table_data[position] for position in walk)
+            return list(islice(iter_matching(records, where_clause), offset, stop))
+
+    if positions is None:
+        metrics.count('rows_scanned', len(table_data))
+        records = iter_matching(table_data, where_clause)
+    else:
+        metrics.count('rows_scanned', len(positions))
+        records = iter_matching(
+            (table_data[position] for position in sorted(positions)), where_clause
+        )
+    if order_by is None:
+        return list(islice(records, offset, stop))
+
+    column, descending = order_by
+    key = itemgetter(column)
+    if stop is None:
+        ordered = sorted(records, key=key, reverse=descending)
+    elif descending:
+        ordered = heapq.nlargest(stop, records, key=key)
+    else:
+        ordered = heapq.nsmallest(stop, records, key=key)
+    return ordered[offset:stop]
 
 
 @handle_db_errors
 @log_time
-def select(table_data, where_clause=None):
-    """Выбирает записи из таблицы с опциональным условием фильтрации."""
+def select(table_data, where_clause=None, indexes=None, order_by=None,
+           limit=None, offset=0):
+    """Выбирает записи из таблицы с опциональным условием фильтрации.
+
+    order_by - пара (столбец, по_убыванию) или None, limit и offset
+    ограничивают количество возвращаемых записей.
+    """
+    if order_by is not None or limit is not None or offset:
+        return _ordered_select(
+            table_data, where_clause, indexes, order_by, limit, offset
+        )
     if where_clause is None:
+        metrics.count('rows_scanned', len(table_data))
         return table_data
 
-    result = []
-    for record in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if key not in record or record[key] != value:
-                match = False
-                break
-        if match:
-            result.append(record)
-    return result
+    positions = _matching_positions(table_data, where_clause, indexes)
+    return [table_data[position] for position in positions]
+
+
+def aggregate_label(item):
+    """Возвращает заголовок столбца результата: count(*), sum(age), city."""
+    func, column = item
+    return column if func is None else f'{func}({column})'
+
+
+@handle_db_errors
+def aggregate_columns(metadata, table_name, items, group_by=None):
+    """Проверяет выражения агрегатного select.
+
+    Столбцы должны существовать, sum и avg применимы только к int и
+    bool, а столбец без агрегата допускается, только если по нему идет
+    группировка. Возвращает заголовки столбцов результата и сообщение
+    об ошибке.
+    """
+    schema = get_schema(metadata, table_name)
+    if group_by is not None and schema.column(group_by) is None:
+        return None, f'Ошибка: Столбец "{group_by}" не существует.'
+    for func, name in items:
+        if name == '*':
+            continue
+        column = schema.column(name)
+        if column is None:
+            return None, f'Ошибка: Столбец "{name}" не существует.'
+        if func in ('sum', 'avg') and column.type == 'str':
+            return None, (
+                f'Ошибка: Функция {func} применима только к столбцам int и bool.'
+            )
+        if func is None and name != group_by:
+            return None, (
+                f'Ошибка: Столбец "{name}" должен быть в group by '
+                f'или внутри агрегатной функции.'
+            )
+    return [aggregate_label(item) for item in items], None
+
+
+def _aggregate_rows(table_data, columns, where_clause, indexes):
+    """Перебирает кортежи значений столбцов подходящих записей."""
+    positions = None
+    if where_clause is None:
+        metrics.count('rows_scanned', len(table_data))
+    else:
+        positions = _matching_positions(table_data, where_clause, indexes)
+    if isinstance(table_data, ColumnarTable):
+        if positions is None:
+            return zip(*(table_data.column_values(name) for name in columns))
+        getters = [table_data.columns[name].get for name in columns]
+        return (tuple(get(position) for get in getters) for position in positions)
+    records = table_data
+    if positions is not None:
+        records = (table_data[position] for position in positions)
+    return (tuple(record.get(name) for name in columns) for record in records)
+
+
+def _vector_aggregate(table_data, items, where_clause):
+    """Считает агрегаты без группировки по столбцам целиком (см. vector.py)."""
+    engine = get_engine()
+    metrics.count('rows_scanned', len(table_data))
+    mask = None if where_clause is None else where_clause.mask(table_data, engine)
+    count = engine.aggregate(table_data, None, 'count', mask)
+    values = []
+    for func, column in items:
+        if func == 'count':
+            values.append(count)
+        elif not count:
+            values.append(None)
+        elif func == 'avg':
+            values.append(engine.aggregate(table_data, column, 'sum', mask) / count)
+        else:
+            values.append(engine.aggregate(table_data, column, func, mask))
+    return values
+
+
+_STEPS = {'count': None, 'sum': add, 'avg': add, 'min': min, 'max': max}
+
+
+def _finish(func, count, value):
+    """Возвращает итоговое значение агрегата по накопленному состоянию."""
+    if func == 'count':
+        return count
+    if func == 'avg':
+        return value / count if count else None
+    return value
+
+
+@handle_db_errors
+@log_time
+def aggregate(table_data, items, where_clause=None, indexes=None, group_by=None,
+              order_by=None, limit=None, offset=0):
+    """Считает агрегаты count, sum, min, max и avg за один проход.
+
+    items - пары (функция, столбец) из parse_statement. Записи не
+    накапливаются: для каждой группы хранятся только счетчик и текущее
+    значение каждого агрегата. Без group by колоночная таблица
+    считается по столбцам целиком. Пустые значения не учитываются;
+    для пустого набора записей count равен 0, остальные агрегаты - None.
+    Группы упорядочены по значению столбца группировки, order_by
+    (заголовок, по_убыванию), limit и offset применяются к результату.
+    Возвращает список строк-словарей.
+    """
+    labels = [aggregate_label(item) for item in items]
+    if group_by is None and isinstance(table_data, ColumnarTable):
+        return [dict(zip(labels, _vector_aggregate(table_data, items, where_clause)))]
+
+    # Для count(*) достаточно любого непустого столбца - берется ID.
+    columns = [] if group_by is None else [group_by]
+    for _, column in items:
+        column = ID_NAME if column == '*' else column
+        if column not in columns:
+            columns.append(column)
+    slots = [columns.index(ID_NAME if column == '*' else column) for _, column in items]
+    steps = [_STEPS.get(func) for func, _ in items]
+
+    groups = {} if group_by is not None else {None: [[0, None] for _ in items]}
+    for row in _aggregate_rows(table_data, columns, where_clause, indexes):
+        key = None if group_by is None else row[0]
+        states = groups.get(key)
+        if states is None:
+            states = groups[key] = [[0, None] for _ in items]
+        for state, step, slot in zip(states, steps, slots):
+            value = row[slot]
+            if value is None:
+                continue
+            state[0] += 1
+            if step is not None:
+                state[1] = value if state[1] is None else step(state[1], value)
+
+    results = []
+    for key in sorted(groups, key=lambda value: (value is None, value)):
+        results.append({
+            label: key if func is None else _finish(func, *state)
+            for label, (func, _), state in zip(labels, items, groups[key])
+        })
+    if order_by is not None:
+        label, descending = order_by
+        results.sort(
+            key=lambda row: (row[label] is None, row[label]), reverse=descending
+        )
+    stop = None if limit is None else offset + limit
+    return results[offset:stop]
 
 
 @handle_db_errors
-def update(table_data, set_clause, where_clause):
-    """Обновляет записи в таблице по условию."""
-    updated_count = 0
-    for record in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if key not in record or record[key] != value:
-                match = False
-                break
-        if match:
-            for key, value in set_clause.items():
+def update(table_data, set_clause, where_clause, indexes=None):
+    """Обновляет записи в таблице по условию.
+
+    Возвращает данные таблицы и список обновленных записей. Если новое
+    значение не укладывается в столбец колоночной таблицы, таблица, как
+    и при insert, переводится в список словарей.
+    """
+    indexes = indexes or {}
+    positions = _matching_positions(table_data, where_clause, indexes)
+    for position in positions:
+        record = table_data[position]
+        for key, value in set_clause.items():
+            old_value = record.get(key, _MISSING)
+            try:
+                record[key] = value
+            except (TypeError, OverflowError):
+                table_data = [dict(row) for row in table_data]
+                record = table_data[position]
                 record[key] = value
-            updated_count += 1
-    return table_data, updated_count
+            index = indexes.get(key)
+            if index is not None:
+                if old_value is not _MISSING:
+                    index.discard(old_value, index.ref(record, position))
+                index.add(value, index.ref(record, position))
+    return table_data, [table_data[position] for position in positions]
 
 
 @handle_db_errors
 @confirm_action("удаление записи")
-def delete(table_data, where_clause):
-    """Удаляет записи из таблицы по условию."""
-    result = []
-    deleted_count = 0
-    for record in table_data:
-        match = True
-        for key, value in where_clause.items():
-            if key not in record or record[key] != value:
-                match = False
-                break
-        if not match:
-            result.append(record)
-        else:
-            deleted_count += 1
-    return result, deleted_count
+def delete(table_data, where_clause, indexes=None):
+    """Удаляет записи из таблицы по условию.
+
+    Возвращает оставшиеся записи и список удаленных записей.
+    """
+    positions = _matching_positions(table_data, where_clause, indexes)
+    if not positions:
+        return table_data, []
+
+    deleted = [table_data[position] for position in positions]
+    if isinstance(table_data, ColumnarTable):
+        keep = bytearray(b'\x01') * len(table_data)
+        for position in positions:
+            keep[position] = 0
+        result = table_data.compress(keep)
+    else:
+        removed = set(positions)
+        result = [
+            record
+            for position, record in enumerate(table_data)
+            if position not in removed
+        ]
+    if indexes:
+        remove_from_indexes(indexes, deleted, result)
+    return result, deleted
+
+
+def _indexed_columns(table_info):
+    """Возвращает столбцы таблицы, по которым есть вторичные индексы."""
+    return [column for kind in INDEX_KINDS for column in table_info.get(kind, [])]
+
+
+@handle_db_errors
+def create_index(metadata, table_name, column, ordered=False):
+    """Добавляет вторичный индекс по столбцу в метаданные таблицы.
+
+    Упорядоченный индекс (ordered=True) можно создать только по столбцу
+    типа int или str.
+    """
+    if table_name not in metadata:
+        return metadata, f'Ошибка: Таблица "{table_name}" не существует.'
+
+    table_info = metadata[table_name]
+    col = get_schema(metadata, table_name).column(column)
+    if col is None:
+        return metadata, f'Ошибка: Столбец "{column}" не существует.'
+    if column == ID_NAME or column in _indexed_columns(table_info):
+        return metadata, f'Ошибка: Индекс по столбцу "{column}" уже существует.'
+    if ordered and col.type not in ('int', 'str'):
+        return metadata, (
+            f'Ошибка: Упорядоченный индекс нельзя создать по столбцу типа {col.type}.'
+        )
+
+    kind = 'sorted_indexes' if ordered else 'indexes'
+    table_info.setdefault(kind, []).append(column)
+    return metadata, f'Индекс по столбцу "{column}" таблицы "{table_name}" создан.'
 
 
 @handle_db_errors
-def get_table_info(metadata, table_name, table_data):
-    """Возвращает информацию о таблице."""
+def drop_index(metadata, table_name, column):
+    """Удаляет вторичный индекс по столбцу из метаданных таблицы."""
+    if table_name not in metadata:
+        return metadata, f'Ошибка: Таблица "{table_name}" не существует.'
+
+    table_info = metadata[table_name]
+    for kind in INDEX_KINDS:
+        if column in table_info.get(kind, []):
+            break
+    else:
+        return metadata, f'Ошибка: Индекс по столбцу "{column}" не существует.'
+
+    table_info[kind].remove(column)
+    if not table_info[kind]:
+        del table_info[kind]
+    return metadata, f'Индекс по столбцу "{column}" таблицы "{table_name}" удален.'
+
+
+@handle_db_errors
+def get_table_info(metadata, table_name, stats, table_data=None, indexes=None):
+    """Возвращает информацию о таблице.
+
+    Число записей и диапазоны столбцов берутся из статистики stats,
+    поэтому таблицу не нужно загружать. Если она уже в памяти
+    (table_data), выводятся также занятая память и размеры индексов.
+    """
     if table_name not in metadata:
         return f'Ошибка: Таблица "{table_name}" не существует.'
 
     table_info = metadata[table_name]
     columns = table_info['columns']
     columns_str = ', '.join(columns)
-    record_count = len(table_data)
-
-    return f'Таблица: {table_name}\nСтолбцы: {columns_str}\nКоличество записей: {record_count}'
+    record_count = stats['rows']
+
+    info = (
+        f'Таблица: {table_name}\nСтолбцы: {columns_str}\n'
+        f'Количество записей: {record_count}'
+    )
+    ranges = [
+        f'{name} [{entry["min"]}..{entry["max"]}]'
+        for name, entry in stats['columns'].items()
+        if entry is not None and entry['min'] is not None
+    ]
+    if ranges:
+        info += f'\nДиапазоны: {", ".join(ranges)}'
+    if isinstance(table_data, ColumnarTable):
+        info += f'\nХранение: по столбцам, {table_data.nbytes() / 1024:.1f} КиБ'
+    if indexes is None:
+        names = [
+            f'{column} (упорядоченный)' if kind == 'sorted_indexes' else column
+            for kind in INDEX_KINDS
+            for column in table_info.get(kind, [])
+        ]
+        if names:
+            info += f'\nИндексы: {", ".join(names)}'
+    elif indexes:
+        indexes_str = ', '.join(
+            f'{column} ({"упорядоченный, " if isinstance(index, SortedIndex) else ""}'
+            f'значений: {len(index)}, записей: {index.entries_count()})'
+            for column, index in indexes.items()
+        )
+        info += f'\nИндексы: {indexes_str}'
+    return info
@@ -1,8 +1,41 @@
 import functools
+import threading
 import time
+from collections import OrderedDict
 
 import prompt
 
+from src.primitive_db.constants import CACHE_MAX_SIZE
+from src.primitive_db.metrics import metrics
+
+settings = {
+    'confirm': True,
+    'output': 'table',
+    'pager': False,
+    'engine': 'auto',
+    'workers': 0,
+}
+
+
+def configure(confirm=None, output=None, pager=None, engine=None, workers=None,
+              collect_metrics=None):
+    """Меняет настройки приложения (см. словарь settings).
+
+    collect_metrics включает или выключает сбор метрик (см. metrics.py).
+    """
+    if confirm is not None:
+        settings['confirm'] = confirm
+    if collect_metrics is not None:
+        metrics.enabled = collect_metrics
+    if output is not None:
+        settings['output'] = output
+    if pager is not None:
+        settings['pager'] = pager
+    if engine is not None:
+        settings['engine'] = engine
+    if workers is not None:
+        settings['workers'] = workers
+
 
 def handle_db_errors(func):
     """Декоратор для обработки ошибок базы данных."""
@@ -11,7 +44,10 @@ def handle_db_errors(func):
         try:
             return func(*args, **kwargs)
         except FileNotFoundError:
-            print("Ошибка: Файл данных не найден. Возможно, база данных не инициализирована.")
+            print(
+                "Ошибка: Файл данных не найден. "
+                "Возможно, база данных не инициализирована."
+            )
             return None
         except KeyError as e:
             print(f"Ошибка: Таблица или столбец {e} не найден.")
@@ -31,6 +67,8 @@ def confirm_action(action_name):
     def decorator(func):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
+            if not settings['confirm']:
+                return func(*args, **kwargs)
             confirmation = prompt.string(
                 f'Вы уверены, что хотите выполнить "{action_name}"? [y/n]: '
             )
@@ -51,29 +89,90 @@ def confirm_action(action_name):
 
 
 def log_time(func):
-    """Декоратор для измерения времени выполнения функции."""
+    """Декоратор для измерения времени выполнения функции.
+
+    Время записывается в гистограмму метрик core.<имя функции>, если
+    сбор метрик включен.
+    """
+    name = f'core.{func.__name__}'
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.monotonic()
-        result = func(*args, **kwargs)
-        end_time = time.monotonic()
-        elapsed = end_time - start_time
-        print(f"Функция {func.__name__} выполнилась за {elapsed:.3f} секунд.")
-        return result
+        if not metrics.enabled:
+            return func(*args, **kwargs)
+        start_time = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            metrics.observe(name, time.perf_counter() - start_time)
 
     return wrapper
 
 
-def create_cacher():
-    """Создает функцию кэширования с замыканием."""
-    cache = {}
+class ResultCache:
+    """Ограниченный кэш результатов запросов с вытеснением LRU.
+
+    Ключ запроса начинается с имени таблицы. Для каждой таблицы хранится
+    номер версии, который увеличивается при любом ее изменении, поэтому
+    результаты, посчитанные до изменения, больше не возвращаются.
+    Кэш можно использовать из нескольких потоков: результат вычисляется
+    вне блокировки.
+    """
+
+    def __init__(self, max_size=CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._versions = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, key, value_func):
+        """Возвращает результат из кэша или вычисляет и кэширует его."""
+        table_name = key[0]
+        with self._lock:
+            full_key = (key, self._versions.get(table_name, 0))
+            if full_key in self._entries:
+                self._entries.move_to_end(full_key)
+                self.hits += 1
+                metrics.count('result_cache_hits', table=table_name)
+                return self._entries[full_key]
+            self.misses += 1
+        metrics.count('result_cache_misses', table=table_name)
 
-    def cache_result(key, value_func):
-        """Кэширует результат выполнения функции по ключу."""
-        if key in cache:
-            return cache[key]
         value = value_func()
-        cache[key] = value
+        if value is None or self.max_size <= 0:
+            return value
+        with self._lock:
+            self._entries[full_key] = value
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
         return value
 
-    return cache_result
+    def bump(self, table_name):
+        """Увеличивает версию таблицы и удаляет ее результаты из кэша."""
+        with self._lock:
+            self._versions[table_name] = self._versions.get(table_name, 0) + 1
+            stale = [key for key in self._entries if key[0][0] == table_name]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self):
+        """Возвращает счетчики работы кэша."""
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+def create_cacher(max_size=CACHE_MAX_SIZE):
+    """Создает ограниченный кэш результатов запросов."""
+    return ResultCache(max_size)
@@ -1,11 +1,28 @@
+import cProfile
+import os
+import pstats
 import shlex
+import sys
+from itertools import islice
 
 import prompt
-from prettytable import PrettyTable
 
+from src.primitive_db.catalog import Catalog
+from src.primitive_db.constants import (
+    ENGINE_NAMES,
+    IMPORT_MAX_REJECTED_SHOWN,
+    METADATA_FILE,
+    OUTPUT_FORMATS,
+    PARALLEL_MIN_ROWS,
+    PROFILE_TOP_FUNCTIONS,
+)
 from src.primitive_db.core import (
+    aggregate,
+    aggregate_columns,
+    create_index,
     create_table,
     delete,
+    drop_index,
     drop_table,
     get_table_info,
     insert,
@@ -13,17 +30,34 @@ from src.primitive_db.core import (
     select,
     update,
 )
-from src.primitive_db.constants import METADATA_FILE
-from src.primitive_db.decorators import create_cacher
-from src.primitive_db.parser import parse_set_clause, parse_where_clause
-from src.primitive_db.utils import (
-    load_metadata,
-    load_table_data,
-    save_metadata,
-    save_table_data,
+from src.primitive_db.decorators import configure, create_cacher, settings
+from src.primitive_db.index import drop_table_index
+from src.primitive_db.join import JoinSide, hash_join, joined_columns
+from src.primitive_db.metrics import metrics
+from src.primitive_db.parallel import shutdown_pool
+from src.primitive_db.parser import (
+    is_statement,
+    parse_statement,
+    split_keyword,
+    statement_cache_info,
 )
+from src.primitive_db.predicate import compile_where
+from src.primitive_db.render import write_records
+from src.primitive_db.schema import compile_schema, get_schema
+from src.primitive_db.stats import stats_aggregate
+from src.primitive_db.transfer import export_rows, import_rows
+from src.primitive_db.utils import migrate_table_data
+from src.primitive_db.vector import get_engine
+
+# Счетчики попаданий и промахов кэшей для команды stats.
+CACHE_METRICS = {
+    'таблицы': ('table_cache_hits', 'table_cache_misses'),
+    'запросы': ('result_cache_hits', 'result_cache_misses'),
+}
 
 cache_result = create_cacher()
+catalog = Catalog(METADATA_FILE, on_change=cache_result.bump)
+prepared_statements = {}
 
 
 def print_help():
@@ -31,48 +65,824 @@ def print_help():
     print("\n***Операции с данными***")
     print("Функции:")
     print(
-        "<command> insert into <имя_таблицы> values (<значение1>, <значение2>, ...) - создать запись."
+        "<command> insert into <имя_таблицы> values (<значение1>, <значение2>, ...) "
+        "- создать запись."
     )
     print(
-        "<command> select from <имя_таблицы> where <столбец> = <значение> - прочитать записи по условию."
+        "<command> select from <имя_таблицы> where <условие> - прочитать записи "
+        "по условию (=, !=, <, >, in, and, or, not)."
     )
     print("<command> select from <имя_таблицы> - прочитать все записи.")
     print(
-        "<command> update <имя_таблицы> set <столбец1> = <новое_значение1> where <столбец_условия> = <значение_условия> - обновить запись."
+        "<command> select from <таблица1> join <таблица2> "
+        "on <таблица1.столбец> = <таблица2.столбец> [where <условие>] "
+        "[limit N] [offset M] - соединить записи двух таблиц."
+    )
+    print(
+        "<command> select count(*), sum(<столбец>), ... from <имя_таблицы> "
+        "[where <условие>] [group by <столбец>] - посчитать агрегаты "
+        "(count, sum, min, max, avg)."
+    )
+    print(
+        "<command> select from <имя_таблицы> [where <условие>] "
+        "[order by <столбец> [asc|desc]] [limit N] [offset M] - прочитать записи "
+        "по порядку."
+    )
+    print(
+        "<command> update <имя_таблицы> set <столбец1> = <новое_значение1>[, ...] "
+        "where <условие> - обновить записи."
+    )
+    print(
+        "<command> delete from <имя_таблицы> where <условие> - удалить записи."
+    )
+    print(
+        "<command> prepare <имя> as <команда с параметрами ?> - подготовить "
+        "команду insert, select, update или delete."
     )
     print(
-        "<command> delete from <имя_таблицы> where <столбец> = <значение> - удалить запись."
+        "<command> execute <имя> (<значение1>, ...) - выполнить подготовленную "
+        "команду."
     )
     print("<command> info <имя_таблицы> - вывести информацию о таблице.")
+    print(
+        "<command> import <имя_таблицы> from <путь> [format csv|jsonl] - загрузить "
+        "записи из файла."
+    )
+    print(
+        "<command> export <имя_таблицы> to <путь> [format csv|jsonl] "
+        "[where <условие>] - выгрузить записи в файл."
+    )
+    print(
+        "<command> create_index <имя_таблицы> <столбец> [sorted] - создать индекс "
+        "по столбцу (sorted - упорядоченный)."
+    )
+    print("<command> drop_index <имя_таблицы> <столбец> - удалить индекс по столбцу.")
+    print("<command> compact <имя_таблицы> - сжать журнал таблицы.")
+    print("<command> cache_stats - статистика кэша запросов.")
+    print(
+        "<command> stats [reset] - метрики операций, счетчики и кэши "
+        "(reset - обнулить)."
+    )
+    print("<command> begin - начать транзакцию.")
+    print("<command> commit - зафиксировать транзакцию.")
+    print("<command> rollback - отменить транзакцию.")
+    print(
+        "<command> checkpoint - записать на диск изменения, отложенные "
+        "в режиме скрипта."
+    )
+    print("<command> migrate - перевести таблицы старого формата в формат журнала.")
+    print("\nНастройки вывода:")
+    print("<command> \\pager [on|off] - включить или выключить постраничный вывод.")
+    print("<command> \\output table|tsv|jsonl - формат вывода результатов select.")
+    print("<command> \\engine [auto|python|numpy] - движок вычислений по столбцам.")
+    print(
+        "<command> \\workers [N] - число процессов для просмотра больших таблиц "
+        "(0 - выключить)."
+    )
+    print("<command> \\metrics [on|off] - включить или выключить сбор метрик.")
+    print(
+        "<command> \\profile <команда> - выполнить команду под профилировщиком "
+        "cProfile."
+    )
     print("\nОбщие команды:")
     print("<command> exit - выход из программы")
     print("<command> help - справочная информация\n")
 
 
-def format_select_result(records, columns):
-    """Форматирует результаты select в таблицу PrettyTable."""
-    if not records:
-        return "Записи не найдены."
+def print_select_result(records, columns):
+    """Потоково выводит результаты select в выбранном формате."""
+    write_records(
+        records,
+        compile_schema(columns).names,
+        settings['output'],
+        settings['pager'],
+    )
 
-    table = PrettyTable()
-    col_names = []
-    for col_def in columns:
-        if ':' in col_def:
-            col_name, _ = col_def.split(':', 1)
-            col_names.append(col_name)
-        else:
-            col_names.append(col_def)
 
-    table.field_names = col_names
+def print_import_report(table_name, imported, rejected, elapsed):
+    """Выводит итог загрузки записей из файла."""
+    rate = imported / elapsed if elapsed > 0 else imported
+    print(
+        f'Загружено {imported} записей в таблицу "{table_name}" '
+        f'за {elapsed:.3f} секунд ({rate:.0f} записей/с).'
+    )
+    if not rejected:
+        return
+    print(f'Отклонено строк: {len(rejected)}')
+    for line_no, error in rejected[:IMPORT_MAX_REJECTED_SHOWN]:
+        print(f'  строка {line_no}: {error}')
+    if len(rejected) > IMPORT_MAX_REJECTED_SHOWN:
+        print(f'  ... и еще {len(rejected) - IMPORT_MAX_REJECTED_SHOWN}')
+
+
+def print_metrics():
+    """Выводит собранные метрики: задержки операций, счетчики и кэши."""
+    if not metrics.enabled:
+        print('Сбор метрик выключен (включить: \\metrics on или --metrics).')
+    snapshot = metrics.snapshot()
+    operations = [
+        {
+            'операция': name,
+            'таблица': table_name,
+            'вызовов': histogram['count'],
+            'p50, мс': f"{histogram['p50_ms']:.3f}",
+            'p99, мс': f"{histogram['p99_ms']:.3f}",
+            'макс, мс': f"{histogram['max_ms']:.3f}",
+            'всего, с': f"{histogram['total_s']:.3f}",
+        }
+        for name, tables in snapshot['operations'].items()
+        for table_name, histogram in tables.items()
+    ]
+    counters = snapshot['counters']
+    cache_counters = {name for pair in CACHE_METRICS.values() for name in pair}
+    values = [
+        {'счетчик': name, 'таблица': table_name, 'значение': value}
+        for name, tables in counters.items() if name not in cache_counters
+        for table_name, value in tables.items()
+    ]
+    caches = []
+    for cache, (hits_name, misses_name) in CACHE_METRICS.items():
+        hits, misses = counters.get(hits_name, {}), counters.get(misses_name, {})
+        for table_name in sorted(hits.keys() | misses.keys()):
+            hit, miss = hits.get(table_name, 0), misses.get(table_name, 0)
+            caches.append({
+                'кэш': cache,
+                'таблица': table_name,
+                'попаданий': hit,
+                'промахов': miss,
+                'доля попаданий': f'{hit / (hit + miss):.1%}',
+            })
+    if not (operations or values or caches):
+        print('Метрик пока нет.')
+    for title, rows in (
+        ('Операции', operations), ('Счетчики', values), ('Кэши', caches)
+    ):
+        if rows:
+            print(f'{title}:')
+            write_records(rows, list(rows[0]), settings['output'], settings['pager'])
+
+
+def profile_command(user_input, statements=None):
+    """Выполняет команду под cProfile и выводит самые затратные функции."""
+    profiler = cProfile.Profile()
+    try:
+        ok = profiler.runcall(execute_command, user_input, statements)
+    except ValueError as e:
+        print(f'Ошибка: Профилировщик недоступен ({e}).')
+        return False
+    stats = pstats.Stats(profiler, stream=sys.stdout).strip_dirs()
+    stats.sort_stats('cumulative').print_stats(PROFILE_TOP_FUNCTIONS)
+    return ok
+
+
+def report_conflicts(tables):
+    """Сообщает о таблицах, отложенные изменения которых отменены.
+
+    Возвращает True, если таких таблиц нет.
+    """
+    for table_name in tables:
+        print(
+            f'Ошибка: Таблица "{table_name}" изменена другим процессом, '
+            'отложенные изменения отменены.'
+        )
+    return not tables
+
+
+def compile_where_input(user_input, metadata, table_name):
+    """Компилирует условие после слова where из исходной строки команды.
+
+    Условие берется из исходной строки, а не из разобранных shlex
+    аргументов, чтобы сохранить кавычки вокруг строковых значений.
+    """
+    parts = split_keyword(user_input, 'where')
+    where_str = parts[1] if parts else ''
+    return compile_where(where_str, get_schema(metadata, table_name))
+
+
+def _where_clause(where, schema):
+    """Компилирует дерево условия where или возвращает False при ошибке."""
+    if where is None:
+        return None
+    where_clause = compile_where(where, schema)
+    return False if where_clause is None else where_clause
+
+
+def run_insert(parts, metadata):
+    """Выполняет insert into <таблица> values (...)."""
+    table_name = parts['table']
+    result = insert(metadata, table_name, list(parts['values']))
+    if result is None:
+        return False
+    record, error = result
+    if error:
+        print(error)
+        return False
+    with catalog.writing(table_name):
+        new_id = catalog.reserve_ids(table_name)
+        record['ID'] = new_id
+        catalog.insert_records(table_name, [record])
+    metrics.count('rows_changed')
+    print(f'Запись с ID={new_id} успешно добавлена в таблицу "{table_name}".')
+    return True
+
+
+def run_select(parts, metadata):
+    """Выполняет select: обычный, агрегатный или с соединением."""
+    if parts['items'] is not None:
+        return run_aggregate(parts, metadata)
+    if 'join' in parts:
+        return run_join(parts, metadata)
+
+    table_name = parts['table']
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return False
+    if parts['group_by'] is not None:
+        print(
+            "Некорректное значение: group by используется только с агрегатами. "
+            "Попробуйте снова."
+        )
+        return False
+    order_by, limit, offset = parts['order_by'], parts['limit'], parts['offset']
+
+    schema = get_schema(metadata, table_name)
+    if order_by is not None and schema.column(order_by[0]) is None:
+        print(f'Ошибка: Столбец "{order_by[0]}" не существует.')
+        return False
+    where_clause = _where_clause(parts['where'], schema)
+    if where_clause is False:
+        return False
+
+    table = catalog.load_table(table_name)
+    cache_key = (
+        table_name,
+        where_clause.key if where_clause else None,
+        order_by,
+        limit,
+        offset,
+    )
 
-    for record in records:
-        row = []
-        for col_name in col_names:
-            value = record.get(col_name, '')
-            row.append(value)
-        table.add_row(row)
+    def get_results():
+        return select(
+            table.data, where_clause, table.indexes, order_by, limit, offset
+        )
+
+    results = cache_result(cache_key, get_results)
+    if results is None:
+        return False
+    metrics.count('rows_returned', len(results))
+    print_select_result(results, metadata[table_name]['columns'])
+    return True
+
+
+def run_aggregate(parts, metadata):
+    """Выполняет агрегатный select: select <выражения> from <таблица> ...
+
+    count(*), count, min и max по столбцам int без where и group by
+    берутся из статистики таблицы, и таблица не загружается.
+    """
+    table_name, items = parts['table'], parts['items']
+    group_by, order_by = parts['group_by'], parts['order_by']
+    limit, offset = parts['limit'], parts['offset']
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return False
+
+    result = aggregate_columns(metadata, table_name, items, group_by)
+    if result is None:
+        return False
+    labels, error = result
+    if error:
+        print(error)
+        return False
+    if order_by is not None and order_by[0] not in labels:
+        print(f'Ошибка: Столбец "{order_by[0]}" не входит в результат.')
+        return False
+    where_clause = _where_clause(parts['where'], get_schema(metadata, table_name))
+    if where_clause is False:
+        return False
+
+    if where_clause is None and group_by is None:
+        values = stats_aggregate(catalog.table_stats(table_name), items)
+        if values is not None:
+            metrics.count('rows_returned')
+            write_records(
+                [dict(zip(labels, values))], labels,
+                settings['output'], settings['pager'],
+            )
+            return True
+
+    table = catalog.load_table(table_name)
+    cache_key = (
+        table_name,
+        'aggregate',
+        items,
+        where_clause.key if where_clause else None,
+        group_by,
+        order_by,
+        limit,
+        offset,
+    )
 
-    return table.get_string()
+    def get_results():
+        return aggregate(
+            table.data, items, where_clause, table.indexes, group_by,
+            order_by, limit, offset,
+        )
+
+    results = cache_result(cache_key, get_results)
+    if results is None:
+        return False
+    metrics.count('rows_returned', len(results))
+    write_records(results, labels, settings['output'], settings['pager'])
+    return True
+
+
+def run_join(parts, metadata):
+    """Выполняет соединение: select from <a> join <b> on <a.x> = <b.y> ...
+
+    Записи результата выводятся потоком, столбцы называются
+    таблица.столбец.
+    """
+    left, right = parts['table'], parts['join']
+    if parts['group_by'] is not None or parts['order_by'] is not None:
+        print(
+            "Некорректное значение: group by и order by не поддерживаются "
+            "в соединении. Попробуйте снова."
+        )
+        return False
+    for table_name in (left, right):
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return False
+    if left == right:
+        print('Ошибка: Соединение таблицы с самой собой не поддерживается.')
+        return False
+
+    on_columns = {}
+    for table_name, name in parts['on']:
+        if table_name not in (left, right) or table_name in on_columns:
+            print(
+                f'Некорректное значение: условие on должно связывать столбцы '
+                f'таблиц {left} и {right}. Попробуйте снова.'
+            )
+            return False
+        column = get_schema(metadata, table_name).column(name)
+        if column is None:
+            print(f'Ошибка: Столбец "{table_name}.{name}" не существует.')
+            return False
+        on_columns[table_name] = column
+    if on_columns[left].type != on_columns[right].type:
+        print(
+            f'Ошибка: Столбцы {left}.{on_columns[left].name} и '
+            f'{right}.{on_columns[right].name} имеют разные типы.'
+        )
+        return False
+
+    columns = joined_columns(metadata, left, right)
+    where_clause = _where_clause(parts['where'], compile_schema(columns))
+    if where_clause is False:
+        return False
+
+    sides = []
+    for table_name in (left, right):
+        table = catalog.load_table(table_name)
+        metrics.count('rows_scanned', len(table.data), table_name)
+        sides.append(JoinSide(
+            table_name,
+            table.data,
+            table.indexes,
+            on_columns[table_name].name,
+            get_schema(metadata, table_name).names,
+        ))
+    rows = hash_join(*sides, where_clause)
+    offset, limit = parts['offset'], parts['limit']
+    stop = None if limit is None else offset + limit
+    rows = metrics.counted('rows_returned', islice(rows, offset, stop))
+    print_select_result(rows, columns)
+    return True
+
+
+def run_update(parts, metadata):
+    """Выполняет update <таблица> set <столбец> = <значение>, ... where ..."""
+    table_name = parts['table']
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return False
+    schema = get_schema(metadata, table_name)
+    set_clause, error = schema.convert_assignments(parts['assignments'])
+    if error:
+        print(error)
+        return False
+    where_clause = _where_clause(parts['where'], schema)
+    if where_clause is False:
+        return False
+
+    with catalog.writing(table_name):
+        table = catalog.load_table(table_name)
+        result = update(table.data, set_clause, where_clause, table.indexes)
+        if result is None:
+            return False
+        table_data, updated = result
+        if updated:
+            catalog.log_updates(table_name, table_data, updated, set_clause)
+    metrics.count('rows_changed', len(updated))
+    if updated:
+        updated_id = updated[0].get('ID', '?')
+        print(f'Запись с ID={updated_id} в таблице "{table_name}" успешно обновлена.')
+    else:
+        print(f'Записи не найдены в таблице "{table_name}".')
+    return True
+
+
+def run_delete(parts, metadata):
+    """Выполняет delete from <таблица> where <условие>."""
+    table_name = parts['table']
+    if table_name not in metadata:
+        print(f'Ошибка: Таблица "{table_name}" не существует.')
+        return False
+    where_clause = _where_clause(parts['where'], get_schema(metadata, table_name))
+    if where_clause is False:
+        return False
+
+    with catalog.writing(table_name):
+        table = catalog.load_table(table_name)
+        result = delete(table.data, where_clause, table.indexes)
+        if result is None:
+            return False
+        remaining, deleted = result
+        if isinstance(deleted, str) and "отменена" in deleted:
+            print(deleted)
+            return False
+        if deleted:
+            catalog.log_deletes(table_name, remaining, deleted)
+    metrics.count('rows_changed', len(deleted))
+    if deleted:
+        deleted_id = deleted[0].get('ID', '?')
+        print(f'Запись с ID={deleted_id} успешно удалена из таблицы "{table_name}".')
+    else:
+        print(f'Записи не найдены в таблице "{table_name}".')
+    return True
+
+
+STATEMENT_RUNNERS = {
+    'insert': run_insert,
+    'select': run_select,
+    'update': run_update,
+    'delete': run_delete,
+}
+
+
+def execute_statement(statement, metadata, statements=None):
+    """Выполняет разобранный оператор (см. parse_statement).
+
+    prepare сохраняет оператор с параметрами ? под именем, execute
+    подставляет в него значения и выполняет без повторного разбора.
+    statements - словарь подготовленных операторов (по умолчанию общий
+    prepared_statements; у каждого клиента сервера он свой).
+    """
+    statements = prepared_statements if statements is None else statements
+    parts = statement.parts
+    if statement.kind == 'prepare':
+        statements[parts['name']] = parts['statement']
+        print(
+            f'Оператор "{parts["name"]}" подготовлен '
+            f'(параметров: {parts["statement"].placeholders}).'
+        )
+        return True
+    if statement.kind == 'execute':
+        prepared = statements.get(parts['name'])
+        if prepared is None:
+            print(f'Ошибка: Подготовленный оператор "{parts["name"]}" не найден.')
+            return False
+        try:
+            statement = prepared.bind(parts['args'])
+        except ValueError as e:
+            print(f"Некорректное значение: {e}. Попробуйте снова.")
+            return False
+    elif statement.placeholders:
+        print(
+            "Некорректное значение: параметры ? допустимы только в prepare. "
+            "Попробуйте снова."
+        )
+        return False
+    with metrics.scope(statement.kind, statement.parts['table']):
+        return STATEMENT_RUNNERS[statement.kind](statement.parts, metadata)
+
+
+def execute_meta_command(user_input, statements=None):
+    """Выполняет служебную команду вывода (начинается с обратной косой черты)."""
+    args = user_input[1:].split()
+    command = args[0] if args else ''
+    if command == 'profile' and len(args) > 1:
+        return profile_command(user_input[1:].split(None, 1)[1], statements)
+    if command == 'pager' and len(args) <= 2:
+        if len(args) == 2 and args[1] not in ('on', 'off'):
+            print(f"Некорректное значение: {args[1]}. Попробуйте снова.")
+            return False
+        pager = not settings['pager'] if len(args) == 1 else args[1] == 'on'
+        configure(pager=pager)
+        print(f"Постраничный вывод {'включен' if pager else 'выключен'}.")
+    elif command == 'engine' and len(args) <= 2:
+        if len(args) == 2:
+            if args[1] not in ENGINE_NAMES:
+                print(f"Некорректное значение: {args[1]}. Попробуйте снова.")
+                return False
+            configure(engine=args[1])
+        print(
+            f"Движок вычислений: {get_engine().name} "
+            f"(настройка: {settings['engine']})."
+        )
+    elif command == 'workers' and len(args) <= 2:
+        if len(args) == 2:
+            if not args[1].isdigit():
+                print(f"Некорректное значение: {args[1]}. Попробуйте снова.")
+                return False
+            configure(workers=int(args[1]))
+        workers = settings['workers']
+        if workers < 2:
+            print('Параллельный просмотр выключен.')
+        else:
+            print(
+                f'Параллельный просмотр: {workers} процессов '
+                f'для таблиц от {PARALLEL_MIN_ROWS} записей.'
+            )
+    elif command == 'metrics' and len(args) <= 2:
+        if len(args) == 2 and args[1] not in ('on', 'off'):
+            print(f"Некорректное значение: {args[1]}. Попробуйте снова.")
+            return False
+        enabled = not metrics.enabled if len(args) == 1 else args[1] == 'on'
+        configure(collect_metrics=enabled)
+        print(f"Сбор метрик {'включен' if enabled else 'выключен'}.")
+    elif command == 'output' and len(args) == 2:
+        if args[1] not in OUTPUT_FORMATS:
+            print(f"Некорректное значение: {args[1]}. Попробуйте снова.")
+            return False
+        configure(output=args[1])
+        print(f"Формат вывода: {args[1]}.")
+    else:
+        print(f"Функции {user_input} нет. Попробуйте снова.")
+        return False
+    return True
+
+
+def execute_command(user_input, statements=None):
+    """Выполняет одну команду.
+
+    statements - словарь подготовленных операторов (см.
+    execute_statement). Возвращает False, если команда завершилась
+    ошибкой.
+    """
+    if user_input.startswith('\\'):
+        return execute_meta_command(user_input, statements)
+
+    metadata = catalog.load_metadata()
+
+    if is_statement(user_input):
+        try:
+            statement = parse_statement(user_input)
+        except ValueError as e:
+            print(f"Некорректное значение: {e}. Попробуйте снова.")
+            return False
+        return execute_statement(statement, metadata, statements)
+
+    try:
+        args = shlex.split(user_input)
+    except ValueError:
+        print(f"Некорректное значение: {user_input}. Попробуйте снова.")
+        return False
+
+    if not args:
+        return True
+
+    table_name = args[1] if len(args) > 1 and args[1] in metadata else None
+    with metrics.scope(args[0], table_name):
+        return run_command(args, user_input, metadata)
+
+
+def run_command(args, user_input, metadata):
+    """Выполняет команду, не являющуюся оператором, по ее аргументам."""
+    command = args[0]
+
+    if command == 'help':
+        print_help()
+    elif command == 'info':
+        if len(args) < 2:
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+
+        table_name = args[1]
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return False
+        stats = catalog.table_stats(table_name)
+        table = catalog.cached_table(table_name)
+        if table is None:
+            info = get_table_info(metadata, table_name, stats)
+        else:
+            info = get_table_info(
+                metadata, table_name, stats, table.data, table.indexes
+            )
+        if info is None:
+            return False
+        print(info)
+    elif command == 'import':
+        if len(args) < 4 or args[2] != 'from':
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+        table_name, filepath = args[1], args[3]
+        file_format = None
+        if len(args) >= 6 and args[4] == 'format':
+            file_format = args[5]
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return False
+        if not os.path.exists(filepath):
+            print(f'Ошибка: Файл "{filepath}" не найден.')
+            return False
+        with catalog.writing(table_name):
+            result = import_rows(catalog, table_name, filepath, file_format)
+        if result is None:
+            return False
+        metrics.count('rows_changed', result[0])
+        print_import_report(table_name, *result)
+    elif command == 'export':
+        if len(args) < 4 or args[2] != 'to':
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+        table_name, filepath = args[1], args[3]
+        rest = args[4:]
+        file_format = None
+        if len(rest) >= 2 and rest[0] == 'format':
+            file_format = rest[1]
+            rest = rest[2:]
+        if rest and rest[0] != 'where':
+            print(f"Некорректное значение: {' '.join(rest)}. Попробуйте снова.")
+            return False
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return False
+        where_clause = None
+        if rest:
+            where_clause = compile_where_input(user_input, metadata, table_name)
+            if where_clause is None:
+                return False
+        exported = export_rows(
+            catalog, table_name, filepath, file_format, where_clause
+        )
+        if exported is None:
+            return False
+        print(
+            f'Выгружено {exported} записей из таблицы "{table_name}" '
+            f'в файл "{filepath}".'
+        )
+    elif command == 'create_index':
+        if len(args) < 3:
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+        table_name, column = args[1], args[2]
+        ordered = len(args) > 3 and args[3] == 'sorted'
+        if len(args) > 3 and not ordered:
+            print(f"Некорректное значение: {args[3]}. Попробуйте снова.")
+            return False
+        result = create_index(metadata, table_name, column, ordered)
+        if result is None:
+            return False
+        metadata, message = result
+        print(message)
+        if not message.startswith('Индекс'):
+            return False
+        catalog.save_metadata(metadata)
+        catalog.rebuild_indexes(table_name)
+    elif command == 'drop_index':
+        if len(args) < 3:
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+        table_name, column = args[1], args[2]
+        result = drop_index(metadata, table_name, column)
+        if result is None:
+            return False
+        metadata, message = result
+        print(message)
+        if not message.startswith('Индекс'):
+            return False
+        catalog.save_metadata(metadata)
+        catalog.load_table(table_name).indexes.pop(column, None)
+        drop_table_index(table_name, column)
+    elif command == 'compact':
+        if len(args) < 2:
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+        table_name = args[1]
+        if table_name not in metadata:
+            print(f'Ошибка: Таблица "{table_name}" не существует.')
+            return False
+        if catalog.in_transaction:
+            print('Ошибка: Команда недоступна внутри транзакции.')
+            return False
+        if not report_conflicts(catalog.flush()):
+            return False
+        before, after = catalog.compact(table_name)
+        print(
+            f'Журнал таблицы "{table_name}" сжат: '
+            f'{before} -> {after} строк.'
+        )
+    elif command == 'migrate':
+        if catalog.in_transaction:
+            print('Ошибка: Команда недоступна внутри транзакции.')
+            return False
+        if not report_conflicts(catalog.flush()):
+            return False
+        migrated = [name for name in metadata if migrate_table_data(name)]
+        if migrated:
+            print(f'Переведены в формат журнала: {", ".join(migrated)}')
+        else:
+            print('Нет таблиц в старом формате.')
+    elif command == 'create_table':
+        if len(args) < 3:
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+        table_name = args[1]
+        columns = args[2:]
+        result = create_table(metadata, table_name, columns)
+        if result is None:
+            return False
+        metadata, message = result
+        print(message)
+        if not message.startswith('Таблица'):
+            return False
+        catalog.save_metadata(metadata)
+    elif command == 'drop_table':
+        if len(args) < 2:
+            print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+            return False
+        table_name = args[1]
+        result = drop_table(metadata, table_name)
+        if result is None:
+            return False
+        metadata, message = result
+        print(message)
+        if isinstance(message, str) and "отменена" in message:
+            return False
+        if not message.startswith('Таблица'):
+            return False
+        catalog.save_metadata(metadata)
+        catalog.invalidate(table_name)
+    elif command == 'cache_stats':
+        stats = cache_result.stats()
+        print(
+            f"Кэш запросов: {stats['size']}/{stats['max_size']} записей, "
+            f"попаданий: {stats['hits']}, промахов: {stats['misses']}, "
+            f"вытеснений: {stats['evictions']}, "
+            f"сбросов: {stats['invalidations']}"
+        )
+        parsed = statement_cache_info()
+        print(
+            f"Кэш разобранных операторов: {parsed.currsize}/{parsed.maxsize}, "
+            f"попаданий: {parsed.hits}, промахов: {parsed.misses}"
+        )
+    elif command == 'stats':
+        if len(args) > 1 and args[1] != 'reset':
+            print(f"Некорректное значение: {args[1]}. Попробуйте снова.")
+            return False
+        if len(args) > 1:
+            metrics.reset()
+            print('Метрики обнулены.')
+        else:
+            print_metrics()
+    elif command == 'list_tables':
+        result = list_tables(metadata)
+        if result is None:
+            return False
+        print(result)
+    elif command == 'checkpoint':
+        if not report_conflicts(catalog.flush()):
+            return False
+        catalog.checkpoint()
+    elif command == 'begin':
+        if catalog.in_transaction:
+            print('Ошибка: Транзакция уже начата.')
+            return False
+        if not report_conflicts(catalog.begin()):
+            return False
+        print('Транзакция начата.')
+    elif command == 'commit':
+        if not catalog.in_transaction:
+            print('Ошибка: Нет активной транзакции.')
+            return False
+        if not report_conflicts(catalog.commit()):
+            return False
+        print('Транзакция зафиксирована.')
+    elif command == 'rollback':
+        if not catalog.in_transaction:
+            print('Ошибка: Нет активной транзакции.')
+            return False
+        catalog.rollback()
+        print('Транзакция отменена.')
+    else:
+        print(f"Функции {command} нет. Попробуйте снова.")
+        return False
+    return True
 
 
 def run():
@@ -81,236 +891,72 @@ def run():
     print_help()
 
     while True:
-        metadata = load_metadata(METADATA_FILE)
         user_input = prompt.string(">>> Введите команду: ").strip()
 
         if not user_input:
             continue
 
-        try:
-            args = shlex.split(user_input)
-        except ValueError:
-            print(f"Некорректное значение: {user_input}. Попробуйте снова.")
-            continue
-
-        if not args:
-            continue
-
-        command = args[0]
-
-        if command == 'exit':
+        if user_input == 'exit':
+            if catalog.in_transaction:
+                catalog.rollback()
+                print('Незавершенная транзакция отменена.')
             break
-        elif command == 'help':
-            print_help()
-        elif command == 'insert' and len(args) >= 2 and args[1] == 'into':
-            if len(args) < 4 or args[2] == 'values':
-                print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
-                continue
-            table_name = args[2]
-            if args[3] != 'values':
-                print("Некорректное значение: ожидается 'values'. Попробуйте снова.")
-                continue
-
-            values_str = ' '.join(args[4:])
-            if values_str.startswith('(') and values_str.endswith(')'):
-                values_str = values_str[1:-1]
-
-            values = []
-            current_value = []
-            in_quotes = False
-            quote_char = None
-            for char in values_str:
-                if char in ('"', "'") and not in_quotes:
-                    in_quotes = True
-                    quote_char = char
-                    current_value.append(char)
-                elif char == quote_char and in_quotes:
-                    in_quotes = False
-                    quote_char = None
-                    current_value.append(char)
-                elif char == ',' and not in_quotes:
-                    if current_value:
-                        values.append(''.join(current_value).strip())
-                        current_value = []
-                else:
-                    current_value.append(char)
-            if current_value:
-                values.append(''.join(current_value).strip())
-
-            result = insert(metadata, table_name, values)
-            if result is None:
-                continue
-            record, error = result
-            if error:
-                print(error)
-            else:
-                table_data = load_table_data(table_name)
-                if table_data:
-                    max_id = max(rec.get('ID', 0) for rec in table_data if 'ID' in rec)
-                    new_id = max_id + 1
-                else:
-                    new_id = 1
-                record['ID'] = new_id
-                table_data.append(record)
-                save_table_data(table_name, table_data)
-                print(f'Запись с ID={new_id} успешно добавлена в таблицу "{table_name}".')
-        elif command == 'select' and len(args) >= 3 and args[1] == 'from':
-            table_name = args[2]
-            if table_name not in metadata:
-                print(f'Ошибка: Таблица "{table_name}" не существует.')
-                continue
-
-            table_data = load_table_data(table_name)
-            where_clause = None
-
-            if len(args) > 3 and args[3] == 'where':
-                where_str = ' '.join(args[4:])
-                where_clause = parse_where_clause(where_str)
-                if where_clause is None:
-                    print(f"Некорректное значение: {where_str}. Попробуйте снова.")
-                    continue
-
-            cache_key = (table_name, tuple(where_clause.items()) if where_clause else None)
-
-            def get_results():
-                return select(table_data, where_clause)
-
-            results = cache_result(cache_key, get_results)
-            if results is None:
-                continue
-
-            table_info = metadata[table_name]
-            columns = table_info['columns']
-            formatted = format_select_result(results, columns)
-            print(formatted)
-        elif command == 'update':
-            if len(args) < 2:
-                print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
-                continue
-
-            table_name = args[1]
-            if table_name not in metadata:
-                print(f'Ошибка: Таблица "{table_name}" не существует.')
-                continue
-
-            if len(args) < 4 or args[2] != 'set':
-                print("Некорректное значение: ожидается 'set'. Попробуйте снова.")
-                continue
 
-            where_idx = -1
-            for i, arg in enumerate(args):
-                if arg == 'where':
-                    where_idx = i
-                    break
+        execute_command(user_input)
 
-            if where_idx == -1:
-                print("Некорректное значение: ожидается 'where'. Попробуйте снова.")
-                continue
-
-            set_str = ' '.join(args[3:where_idx])
-            where_str = ' '.join(args[where_idx + 1:])
-
-            set_clause = parse_set_clause(set_str)
-            where_clause = parse_where_clause(where_str)
-
-            if set_clause is None or where_clause is None:
-                print("Некорректное значение. Попробуйте снова.")
-                continue
-
-            table_data = load_table_data(table_name)
-            result = update(table_data, set_clause, where_clause)
-            if result is None:
-                continue
-            updated_data, count = result
-            if count > 0:
-                save_table_data(table_name, updated_data)
-                updated_id = where_clause.get('ID', '?')
-                if updated_id == '?':
-                    for rec in updated_data:
-                        match = True
-                        for key, value in where_clause.items():
-                            if rec.get(key) != value:
-                                match = False
-                                break
-                        if match:
-                            updated_id = rec.get('ID', '?')
-                            break
-                print(f'Запись с ID={updated_id} в таблице "{table_name}" успешно обновлена.')
-            else:
-                print(f'Записи не найдены в таблице "{table_name}".')
-        elif command == 'delete' and len(args) >= 2 and args[1] == 'from':
-            if len(args) < 5 or args[3] != 'where':
-                print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
-                continue
-
-            table_name = args[2]
-            if table_name not in metadata:
-                print(f'Ошибка: Таблица "{table_name}" не существует.')
-                continue
+    catalog.close()
+    shutdown_pool()
 
-            where_str = ' '.join(args[4:])
-            where_clause = parse_where_clause(where_str)
-            if where_clause is None:
-                print(f"Некорректное значение: {where_str}. Попробуйте снова.")
-                continue
 
-            table_data = load_table_data(table_name)
-            result = delete(table_data, where_clause)
-            if result is None:
-                continue
-            updated_data, count = result
-            if isinstance(count, str) and "отменена" in count:
-                print(count)
-                continue
-            if count > 0:
-                save_table_data(table_name, updated_data)
-                deleted_id = where_clause.get('ID', '?')
-                print(f'Запись с ID={deleted_id} успешно удалена из таблицы "{table_name}".')
-            else:
-                print(f'Записи не найдены в таблице "{table_name}".')
-        elif command == 'info':
-            if len(args) < 2:
-                print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
-                continue
+def run_script(lines, checkpoint_every=None):
+    """Выполняет команды из скрипта без вопросов пользователю.
 
-            table_name = args[1]
-            table_data = load_table_data(table_name)
-            info = get_table_info(metadata, table_name, table_data)
-            if info is not None:
-                print(info)
-        elif command == 'create_table':
-            if len(args) < 3:
-                print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
+    Постраничный вывод отключается. Изменения копятся в памяти и
+    записываются на диск один раз в конце, по команде checkpoint или
+    каждые checkpoint_every команд.
+    Возвращает код завершения: 0 при успехе, 1 при первой ошибке.
+    """
+    configure(confirm=False, pager=False)
+    catalog.deferred = True
+    executed = 0
+    try:
+        for line_no, line in enumerate(lines, start=1):
+            user_input = line.strip()
+            if not user_input or user_input.startswith(('#', '--')):
                 continue
-            table_name = args[1]
-            columns = args[2:]
-            result = create_table(metadata, table_name, columns)
-            if result is None:
-                continue
-            metadata, message = result
-            print(message)
-            if message.startswith('Таблица'):
-                save_metadata(METADATA_FILE, metadata)
-        elif command == 'drop_table':
-            if len(args) < 2:
-                print("Некорректное значение: недостаточно аргументов. Попробуйте снова.")
-                continue
-            table_name = args[1]
-            result = drop_table(metadata, table_name)
-            if result is None:
-                continue
-            metadata, message = result
-            print(message)
-            if isinstance(message, str) and "отменена" in message:
-                continue
-            if message.startswith('Таблица') and 'успешно удалена' in message:
-                save_metadata(METADATA_FILE, metadata)
-        elif command == 'list_tables':
-            result = list_tables(metadata)
-            if result is not None:
-                print(result)
-        else:
-            print(f"Функции {command} нет. Попробуйте снова.")
+            if user_input == 'exit':
+                break
+            if not execute_command(user_input):
+                print(f'Ошибка в строке {line_no}: {user_input}', file=sys.stderr)
+                return 1
+            executed += 1
+            if checkpoint_every and executed % checkpoint_every == 0:
+                if not report_conflicts(catalog.flush()):
+                    return 1
+        if not catalog.in_transaction and not report_conflicts(catalog.flush()):
+            return 1
+    finally:
+        if catalog.in_transaction:
+            catalog.rollback()
+            print('Незавершенная транзакция отменена.', file=sys.stderr)
+        catalog.close()
+        catalog.deferred = False
+        shutdown_pool()
+    return 0
+
+
+def run_profile(user_input):
+    """Выполняет одну команду под cProfile без вопросов пользователю.
+
+    Возвращает код завершения: 0 при успехе, 1 при ошибке.
+    """
+    configure(confirm=False, pager=False)
+    try:
+        ok = profile_command(user_input)
+    finally:
+        catalog.close()
+        shutdown_pool()
+    return 0 if ok else 1
 
 
 def welcome():
@@ -0,0 +1,329 @@
+import bisect
+
+from src.primitive_db.columnar import ColumnarTable
+from src.primitive_db.constants import ID_COLUMN
+from src.primitive_db.utils import (
+    load_index_data,
+    remove_index_data,
+    save_index_data,
+)
+
+ID_NAME = ID_COLUMN.split(':', 1)[0]
+
+
+class HashIndex:
+    """Хеш-индекс по столбцу: значение -> ссылки на записи таблицы.
+
+    Первичный индекс по ID хранит позиции записей, вторичные индексы
+    хранят ID записей и поэтому не зависят от сдвига позиций при удалении.
+    """
+
+    def __init__(self, column, unique=False):
+        self.column = column
+        self.unique = unique
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, table_data):
+        """Строит индекс заново по всем записям таблицы."""
+        self._entries = {}
+        if isinstance(table_data, ColumnarTable):
+            values = table_data.column_values(self.column)
+            if self.unique:
+                refs = range(len(table_data))
+            else:
+                refs = table_data.column_values(ID_NAME)
+            for value, ref in zip(values, refs):
+                self.add(value, ref)
+            return
+        for position, record in enumerate(table_data):
+            if self.column in record:
+                self.add(record[self.column], self.ref(record, position))
+
+    def ref(self, record, position):
+        """Возвращает ссылку на запись, которую хранит индекс."""
+        return position if self.unique else record.get(ID_NAME)
+
+    def add(self, value, ref):
+        """Добавляет ссылку на запись для значения."""
+        if self.unique:
+            self._entries[value] = ref
+        else:
+            self._entries.setdefault(value, []).append(ref)
+
+    def discard(self, value, ref):
+        """Удаляет ссылку на запись для значения."""
+        if self.unique:
+            if self._entries.get(value) == ref:
+                del self._entries[value]
+            return
+        refs = self._entries.get(value)
+        if refs is None:
+            return
+        if ref in refs:
+            refs.remove(ref)
+        if not refs:
+            del self._entries[value]
+
+    def lookup(self, value):
+        """Возвращает список ссылок на записи с указанным значением."""
+        if self.unique:
+            ref = self._entries.get(value)
+            return [] if ref is None else [ref]
+        return list(self._entries.get(value, ()))
+
+    def entries_count(self):
+        """Возвращает количество ссылок на записи в индексе."""
+        if self.unique:
+            return len(self._entries)
+        return sum(len(refs) for refs in self._entries.values())
+
+    def dump(self):
+        """Возвращает содержимое индекса в виде, пригодном для JSON."""
+        return [[value, refs] for value, refs in self._entries.items()]
+
+    def restore(self, entries):
+        """Восстанавливает индекс из сохраненного содержимого."""
+        self._entries = {value: refs for value, refs in entries}
+
+
+class SortedIndex(HashIndex):
+    """Упорядоченный индекс: хеш-индекс плюс отсортированный список значений.
+
+    Список значений поддерживается через bisect, поэтому по индексу
+    можно выбирать диапазоны значений и обходить записи по порядку.
+    """
+
+    def __init__(self, column):
+        super().__init__(column)
+        self._keys = []
+
+    def build(self, table_data):
+        super().build(table_data)
+        self._keys = sorted(self._entries)
+
+    def add(self, value, ref):
+        if value not in self._entries:
+            bisect.insort(self._keys, value)
+        super().add(value, ref)
+
+    def discard(self, value, ref):
+        super().discard(value, ref)
+        if value not in self._entries:
+            position = bisect.bisect_left(self._keys, value)
+            if position < len(self._keys) and self._keys[position] == value:
+                del self._keys[position]
+
+    def restore(self, entries):
+        super().restore(entries)
+        self._keys = sorted(self._entries)
+
+    def values(self, descending=False):
+        """Перебирает значения индекса по возрастанию или убыванию."""
+        return reversed(self._keys) if descending else iter(self._keys)
+
+    def refs_between(self, low=None, high=None, low_inclusive=True,
+                     high_inclusive=True):
+        """Перебирает ссылки на записи со значениями в диапазоне."""
+        keys = self._keys
+        if low is None:
+            start = 0
+        elif low_inclusive:
+            start = bisect.bisect_left(keys, low)
+        else:
+            start = bisect.bisect_right(keys, low)
+        if high is None:
+            stop = len(keys)
+        elif high_inclusive:
+            stop = bisect.bisect_right(keys, high)
+        else:
+            stop = bisect.bisect_left(keys, high)
+        for value in keys[start:stop]:
+            yield from self._entries[value]
+
+
+INDEX_KINDS = {
+    'indexes': HashIndex,
+    'sorted_indexes': SortedIndex,
+}
+
+
+def _load_secondary_index(table_name, column, table_data, state,
+                          index_class=HashIndex):
+    """Загружает вторичный индекс с диска или строит и сохраняет его.
+
+    state - состояние журнала, из которого прочитаны table_data.
+    Сохраненный индекс используется, только если он сохранен для того
+    же состояния. Без состояния индекс строится и не сохраняется.
+    """
+    index = index_class(column)
+    if state is None:
+        index.build(table_data)
+        return index
+    saved = load_index_data(table_name, column)
+    if saved is not None and saved.get('log_state') == state:
+        index.restore(saved['entries'])
+        return index
+    index.build(table_data)
+    save_table_index(table_name, index, state)
+    return index
+
+
+def save_table_index(table_name, index, state):
+    """Сохраняет вторичный индекс на диск вместе с состоянием журнала.
+
+    state - состояние журнала, по данным которого построен индекс.
+    """
+    save_index_data(table_name, index.column, {
+        'log_state': state,
+        'entries': index.dump(),
+    })
+
+
+def save_table_indexes(table_name, indexes, state):
+    """Сохраняет вторичные индексы таблицы; первичный строится при загрузке."""
+    for column, index in indexes.items():
+        if column != ID_NAME:
+            save_table_index(table_name, index, state)
+
+
+def drop_table_index(table_name, column):
+    """Удаляет сохраненный вторичный индекс."""
+    remove_index_data(table_name, column)
+
+
+def build_table_indexes(table_data, table_name=None, metadata=None, state=None):
+    """Строит индексы таблицы при ее загрузке.
+
+    Первичный индекс по ID строится всегда, вторичные - по спискам
+    'indexes' (хеш-индексы) и 'sorted_indexes' (упорядоченные индексы)
+    таблицы в метаданных. state - состояние журнала, из которого
+    прочитаны table_data (см. load_table_snapshot): вторичные индексы
+    сохраняются и проверяются по нему, а не по текущему состоянию
+    файла, которое мог изменить другой процесс.
+    """
+    id_index = HashIndex(ID_NAME, unique=True)
+    id_index.build(table_data)
+    indexes = {ID_NAME: id_index}
+    if table_name is None or not metadata or table_name not in metadata:
+        return indexes
+    for kind, index_class in INDEX_KINDS.items():
+        for column in metadata[table_name].get(kind, []):
+            indexes[column] = _load_secondary_index(
+                table_name, column, table_data, state, index_class
+            )
+    return indexes
+
+
+def remove_from_indexes(indexes, deleted, table_data):
+    """Убирает удаленные записи из индексов.
+
+    Первичный индекс перестраивается, так как позиции записей сдвигаются.
+    """
+    for column, index in indexes.items():
+        if index.unique:
+            index.build(table_data)
+            continue
+        for record in deleted:
+            if column in record:
+                index.discard(record[column], record.get(ID_NAME))
+
+
+_RANGE_OPS = ('<', '<=', '>', '>=')
+
+
+def _ref_positions(indexes, index, refs):
+    """Переводит ссылки индекса в позиции записей таблицы.
+
+    Возвращает None, если для вторичного индекса нет первичного.
+    """
+    if index.unique:
+        return list(refs)
+    id_index = indexes.get(ID_NAME)
+    if id_index is None:
+        return None
+    return [
+        position
+        for record_id in refs
+        for position in id_index.lookup(record_id)
+    ]
+
+
+def lookup_positions(indexes, column, value):
+    """Возвращает позиции записей со значением столбца по индексу.
+
+    Возвращает None, если по столбцу нет индекса.
+    """
+    index = indexes.get(column)
+    if index is None:
+        return None
+    return _ref_positions(indexes, index, index.lookup(value))
+
+
+def _range_bounds(conditions):
+    """Сводит условия сравнения по одному столбцу к границам диапазона."""
+    low = high = None
+    low_inclusive = high_inclusive = True
+    for op, value in conditions:
+        if op in ('>', '>='):
+            inclusive = op == '>='
+            if low is None or value > low or (value == low and not inclusive):
+                low, low_inclusive = value, inclusive
+        else:
+            inclusive = op == '<='
+            if high is None or value < high or (value == high and not inclusive):
+                high, high_inclusive = value, inclusive
+    return low, high, low_inclusive, high_inclusive
+
+
+def candidate_positions(indexes, conditions):
+    """Подбирает позиции записей по индексам для условия where.
+
+    conditions - простые условия (столбец, оператор, значение), которые
+    должны выполняться одновременно. По любому индексу используются
+    условия '=' и 'in', по упорядоченному - еще и сравнения '<', '<=',
+    '>', '>='. Возвращает None, если ни один индекс не подходит к условию.
+    """
+    if not indexes or not conditions:
+        return None
+    candidates = []
+    ranges = {}
+    for column, op, value in conditions:
+        index = indexes.get(column)
+        if index is None:
+            continue
+        if op in ('=', 'in'):
+            refs = index.lookup(value) if op == '=' else [
+                ref for item in value for ref in index.lookup(item)
+            ]
+            candidates.append(_ref_positions(indexes, index, refs))
+        elif op in _RANGE_OPS and isinstance(index, SortedIndex):
+            ranges.setdefault(column, []).append((op, value))
+    for column, bounds in ranges.items():
+        index = indexes[column]
+        refs = index.refs_between(*_range_bounds(bounds))
+        candidates.append(_ref_positions(indexes, index, refs))
+
+    best = None
+    for positions in candidates:
+        if positions is not None and (best is None or len(positions) < len(best)):
+            best = positions
+    return None if best is None else set(best)
+
+
+def ordered_positions(indexes, column, descending=False):
+    """Перебирает позиции записей в порядке значений столбца.
+
+    Возвращает None, если по столбцу нет упорядоченного индекса.
+    Записи с одинаковым значением идут в порядке таблицы.
+    """
+    index = indexes.get(column) if indexes else None
+    if not isinstance(index, SortedIndex) or ID_NAME not in indexes:
+        return None
+    return (
+        position
+        for value in index.values(descending)
+        for position in sorted(_ref_positions(indexes, index, index.lookup(value)))
+    )
@@ -0,0 +1,119 @@
+from src.primitive_db.columnar import ColumnarTable
+from src.primitive_db.index import ID_NAME, lookup_positions
+
+
+class JoinSide:
+    """Таблица, участвующая в соединении, и столбец из условия on.
+
+    names - имена столбцов таблицы по схеме; записи стороны читаются
+    кортежами значений в этом порядке.
+    """
+
+    __slots__ = ('name', 'data', 'indexes', 'column', 'names')
+
+    def __init__(self, name, data, indexes, column, names):
+        self.name = name
+        self.data = data
+        self.indexes = indexes or {}
+        self.column = column
+        self.names = names
+
+    @property
+    def qualified_names(self):
+        """Имена столбцов вида таблица.столбец."""
+        return [f'{self.name}.{name}' for name in self.names]
+
+    def rows(self):
+        """Перебирает кортежи значений всех записей."""
+        if isinstance(self.data, ColumnarTable):
+            return zip(*(self.data.column_values(name) for name in self.names))
+        names = self.names
+        return (tuple(record.get(name) for name in names) for record in self.data)
+
+    def row_reader(self):
+        """Возвращает функцию чтения кортежа значений записи по позиции."""
+        if isinstance(self.data, ColumnarTable):
+            getters = [self.data.columns[name].get for name in self.names]
+            return lambda position: tuple(get(position) for get in getters)
+        names, data = self.names, self.data
+        return lambda position: tuple(data[position].get(name) for name in names)
+
+
+def joined_columns(metadata, left, right):
+    """Возвращает определения столбцов результата: 'a.ID:int', 'b.ID:int', ..."""
+    return [
+        f'{table_name}.{col_def}'
+        for table_name in (left, right)
+        for col_def in metadata[table_name]['columns']
+    ]
+
+
+def _value_positions(side):
+    """Строит хеш-таблицу значение -> позиции записей по столбцу соединения."""
+    if isinstance(side.data, ColumnarTable):
+        values = side.data.column_values(side.column)
+    else:
+        values = (record.get(side.column) for record in side.data)
+    positions = {}
+    for position, value in enumerate(values):
+        if value is not None:
+            positions.setdefault(value, []).append(position)
+    return positions
+
+
+def _lookup(side):
+    """Возвращает функцию поиска позиций записей стороны по значению.
+
+    Если по столбцу соединения есть индекс (или это ID), используется
+    он, иначе строится хеш-таблица.
+    """
+    if side.column in side.indexes and ID_NAME in side.indexes:
+        indexes, column = side.indexes, side.column
+        return lambda value: lookup_positions(indexes, column, value)
+    positions = _value_positions(side)
+    return lambda value: positions.get(value, ())
+
+
+def _choose_sides(left, right):
+    """Выбирает сторону для хеш-таблицы и сторону для потокового просмотра.
+
+    Сторона с индексом по столбцу соединения не требует построения
+    хеш-таблицы; из двух таких (или двух без индекса) выбирается
+    меньшая.
+    """
+    sides = [left, right]
+    indexed = [side for side in sides if side.column in side.indexes]
+    build = min(indexed or sides, key=lambda side: len(side.data))
+    probe = right if build is left else left
+    return build, probe
+
+
+def hash_join(left, right, where_clause=None):
+    """Перебирает записи соединения двух таблиц по равенству столбцов.
+
+    Хеш-таблица строится по меньшей стороне (или берется индекс по
+    столбцу соединения), а записи другой стороны просматриваются
+    потоком, поэтому в памяти находятся только позиции записей одной
+    таблицы. Записи результата не накапливаются. where_clause
+    проверяется по записи результата.
+    """
+    build, probe = _choose_sides(left, right)
+    lookup = _lookup(build)
+    read_build = build.row_reader()
+    join_slot = probe.names.index(probe.column)
+    if build is left:
+        names = build.qualified_names + probe.qualified_names
+    else:
+        names = probe.qualified_names + build.qualified_names
+    for probe_values in probe.rows():
+        value = probe_values[join_slot]
+        if value is None:
+            continue
+        for position in lookup(value) or ():
+            build_values = read_build(position)
+            if build is left:
+                row = dict(zip(names, build_values + probe_values))
+            else:
+                row = dict(zip(names, probe_values + build_values))
+            if where_clause is None or where_clause.matches(row):
+                yield row
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Генератор нагрузки для сервера базы данных (см. server.py).
+
+Запускает много клиентов одновременно, каждый выполняет смесь чтений
+и записей над тестовой таблицей, и выводит пропускную способность и
+задержки. Пример:
+
+    python -m src.primitive_db.loadgen --clients 50 --requests 200
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from src.primitive_db.client import AsyncConnection
+from src.primitive_db.constants import SERVER_HOST, SERVER_PORT
+
+READ_STATEMENT = 'select from {table} where ID = ?'
+WRITE_STATEMENT = 'insert into {table} values (?, ?)'
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        prog='loadgen',
+        description='Генератор нагрузки для сервера базы данных.',
+    )
+    parser.add_argument('--host', default=SERVER_HOST, help='адрес сервера')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='порт сервера')
+    parser.add_argument(
+        '--clients', type=int, default=50, metavar='N',
+        help='число одновременных клиентов',
+    )
+    parser.add_argument(
+        '--requests', type=int, default=200, metavar='N',
+        help='число команд от каждого клиента',
+    )
+    parser.add_argument(
+        '--writes', type=float, default=0.1, metavar='P',
+        help='доля команд insert (остальные - select по ID)',
+    )
+    parser.add_argument(
+        '--table',
+        default='loadgen',
+        help='тестовая таблица (создается при необходимости)',
+    )
+    parser.add_argument(
+        '--rows', type=int, default=1000, metavar='N',
+        help='число записей, добавляемых в новую тестовую таблицу',
+    )
+    return parser.parse_args(argv)
+
+
+async def prepare_table(args):
+    """Создает тестовую таблицу и заполняет ее, если таблицы еще нет."""
+    connection = await AsyncConnection.open(args.host, args.port)
+    try:
+        created, _ = await connection.request(
+            f'create_table {args.table} name:str qty:int'
+        )
+        if not created:
+            return
+        await connection.request(
+            'prepare fill as ' + WRITE_STATEMENT.format(table=args.table)
+        )
+        for number in range(args.rows):
+            await connection.request(f'execute fill ("item{number}", {number})')
+    finally:
+        await connection.close()
+
+
+async def run_client(args, ready, latencies, errors):
+    """Выполняет команды одного клиента, записывая задержку каждой."""
+    connection = await AsyncConnection.open(args.host, args.port)
+    try:
+        await connection.request(
+            'prepare get as ' + READ_STATEMENT.format(table=args.table)
+        )
+        await connection.request(
+            'prepare put as ' + WRITE_STATEMENT.format(table=args.table)
+        )
+        await ready.wait()
+        for _ in range(args.requests):
+            if random.random() < args.writes:
+                command = f'execute put ("load", {random.randint(0, 1000)})'
+            else:
+                command = f'execute get ({random.randint(1, args.rows)})'
+            began = time.perf_counter()
+            ok, _ = await connection.request(command)
+            latencies.append(time.perf_counter() - began)
+            if not ok:
+                errors.append(command)
+    finally:
+        await connection.close()
+
+
+def _percentile(values, fraction):
+    """Возвращает перцентиль отсортированного списка значений."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def generate_load(args):
+    """Запускает клиентов одновременно и выводит сводку.
+
+    Время отсчитывается с момента, когда все клиенты подключились.
+    """
+    await prepare_table(args)
+    ready = asyncio.Barrier(args.clients + 1)
+    latencies, errors = [], []
+    clients = [
+        asyncio.create_task(run_client(args, ready, latencies, errors))
+        for _ in range(args.clients)
+    ]
+    await ready.wait()
+    began = time.perf_counter()
+    await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - began
+
+    latencies.sort()
+    total = len(latencies)
+    print(f'Клиентов: {args.clients}, команд: {total}, ошибок: {len(errors)}')
+    print(
+        f'Время: {elapsed:.3f} с, пропускная способность: '
+        f'{total / elapsed:.0f} команд/с'
+    )
+    if latencies:
+        percentiles = (
+            f'p{int(fraction * 100)} {_percentile(latencies, fraction) * 1000:.1f} мс'
+            for fraction in (0.5, 0.95, 0.99)
+        )
+        print('Задержка: ' + ', '.join(percentiles))
+
+
+def main(argv=None):
+    """Точка входа генератора нагрузки."""
+    args = parse_args(argv)
+    try:
+        asyncio.run(generate_load(args))
+    except OSError as e:
+        print(
+            f'Ошибка: Не удалось подключиться к серверу '
+            f'{args.host}:{args.port} ({e}).'
+        )
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,117 @@
 #!/usr/bin/env python3
+import argparse
+import sys
 
+from src.primitive_db.constants import SERVER_HOST, SERVER_PORT
 
-def main():
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        prog='project',
+        description='Консольное приложение для работы с базой данных.',
+    )
+    parser.add_argument(
+        'mode',
+        nargs='?',
+        choices=('serve', 'connect'),
+        help='serve - запустить сервер для клиентов по сети, '
+        'connect - работать с запущенным сервером',
+    )
+    parser.add_argument(
+        '--host', default=SERVER_HOST, help='адрес сервера (для serve и connect)'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=SERVER_PORT,
+        help='порт сервера (для serve и connect)',
+    )
+    parser.add_argument(
+        '--script',
+        metavar='FILE',
+        help="выполнить команды из файла без вопросов ('-' - читать stdin)",
+    )
+    parser.add_argument(
+        '--checkpoint-every',
+        type=int,
+        metavar='N',
+        help='в режиме скрипта записывать изменения на диск каждые N команд',
+    )
+    parser.add_argument(
+        '--metrics',
+        action='store_true',
+        help='собирать метрики выполнения команд (см. команду stats)',
+    )
+    parser.add_argument(
+        '--metrics-file',
+        metavar='FILE',
+        help='при выходе записать метрики в файл JSON (включает --metrics)',
+    )
+    parser.add_argument(
+        '--profile',
+        metavar='COMMAND',
+        help='выполнить одну команду под профилировщиком cProfile и выйти',
+    )
+    parser.add_argument(
+        '--output',
+        choices=('table', 'tsv', 'jsonl'),
+        default='table',
+        help='формат вывода результатов select (tsv и jsonl удобны для конвейеров)',
+    )
+    parser.add_argument(
+        '--engine',
+        choices=('auto', 'python', 'numpy'),
+        default='auto',
+        help='движок вычислений по столбцам (auto - NumPy, если он установлен)',
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=0,
+        metavar='N',
+        help=(
+            'число процессов для параллельного просмотра больших таблиц '
+            '(0 - выключен)'
+        ),
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Точка входа в приложение базы данных."""
-    from src.primitive_db.engine import run
-    run()
+    args = parse_args(argv)
+
+    if args.mode == 'connect':
+        from src.primitive_db.client import run_client
+        sys.exit(run_client(args.host, args.port))
+
+    from src.primitive_db.decorators import configure
+    from src.primitive_db.engine import run, run_profile, run_script
+    from src.primitive_db.metrics import metrics
+    configure(
+        output=args.output,
+        engine=args.engine,
+        workers=args.workers,
+        collect_metrics=args.metrics or args.metrics_file is not None,
+    )
+
+    try:
+        if args.mode == 'serve':
+            from src.primitive_db.server import serve
+            serve(args.host, args.port)
+        elif args.profile is not None:
+            sys.exit(run_profile(args.profile))
+        elif args.script is None:
+            run()
+        elif args.script == '-':
+            sys.exit(run_script(sys.stdin, args.checkpoint_every))
+        else:
+            with open(args.script, 'r', encoding='utf-8') as file:
+                sys.exit(run_script(file, args.checkpoint_every))
+    finally:
+        if args.metrics_file is not None:
+            metrics.dump(args.metrics_file)
 
 
 if __name__ == '__main__':
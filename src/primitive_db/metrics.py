@@ -0,0 +1,165 @@
+import contextlib
+import json
+import math
+import threading
+import time
+
+# Границы корзин гистограммы задержек растут в 2 ** (1 / 4) раза
+# (около 19%), начиная с одной микросекунды.
+_BUCKETS_PER_OCTAVE = 4
+_MIN_SECONDS = 1e-6
+
+_NO_SCOPE = contextlib.nullcontext()
+
+
+class Histogram:
+    """Гистограмма задержек с корзинами в логарифмической шкале.
+
+    Память не зависит от числа замеров: хранится только количество
+    замеров в каждой корзине. Перцентиль возвращается как верхняя
+    граница корзины, то есть с точностью до размера корзины.
+    """
+
+    __slots__ = ('count', 'total', 'max', '_buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._buckets = {}
+
+    def observe(self, seconds):
+        """Добавляет замер в секундах."""
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        bucket = 0
+        if seconds > _MIN_SECONDS:
+            bucket = math.ceil(math.log2(seconds / _MIN_SECONDS) * _BUCKETS_PER_OCTAVE)
+        self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+
+    def percentile(self, fraction):
+        """Возвращает перцентиль задержки в секундах (0 без замеров)."""
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self._buckets):
+            seen += self._buckets[bucket]
+            if seen >= rank:
+                bound = _MIN_SECONDS * 2 ** (bucket / _BUCKETS_PER_OCTAVE)
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class Metrics:
+    """Реестр метрик: счетчики и гистограммы задержек.
+
+    Метрики хранятся по паре (имя, таблица). Команда выполняется внутри
+    scope(операция, таблица): время команды попадает в гистограмму
+    операции, а счетчики, увеличенные во время команды без явной
+    таблицы, относятся к ее таблице. Пока сбор выключен (enabled),
+    вызовы ничего не делают, а scope возвращает пустой контекст.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _table(self, table):
+        return table if table is not None else getattr(self._local, 'table', None)
+
+    def count(self, name, value=1, table=None):
+        """Увеличивает счетчик name на value."""
+        if not self.enabled:
+            return
+        key = (name, self._table(table))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, table=None):
+        """Добавляет замер задержки операции name."""
+        if not self.enabled:
+            return
+        key = (name, self._table(table))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def scope(self, operation, table=None):
+        """Возвращает контекст, замеряющий операцию над таблицей."""
+        if not self.enabled:
+            return _NO_SCOPE
+        return self._scope(operation, table)
+
+    @contextlib.contextmanager
+    def _scope(self, operation, table):
+        outer = getattr(self._local, 'table', None)
+        self._local.table = table
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.table = outer
+            self.observe(operation, time.perf_counter() - began, table)
+
+    def counted(self, name, iterable, table=None):
+        """Перебирает iterable, прибавляя к счетчику name число элементов."""
+        if not self.enabled:
+            return iterable
+        return self._counted(name, iterable, self._table(table))
+
+    def _counted(self, name, iterable, table):
+        seen = 0
+        try:
+            for item in iterable:
+                seen += 1
+                yield item
+        finally:
+            self.count(name, seen, table)
+
+    def reset(self):
+        """Обнуляет все метрики."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Возвращает метрики в виде словаря, пригодного для JSON.
+
+        Метрики без таблицы записываются под ключом '*'.
+        """
+        with self._lock:
+            operations, counters = {}, {}
+            for (name, table), histogram in sorted(
+                self._histograms.items(), key=_sort_key
+            ):
+                operations.setdefault(name, {})[table or '*'] = histogram.to_dict()
+            for (name, table), value in sorted(self._counters.items(), key=_sort_key):
+                counters.setdefault(name, {})[table or '*'] = value
+        return {'operations': operations, 'counters': counters}
+
+    def dump(self, filepath):
+        """Записывает метрики в файл JSON."""
+        with open(filepath, 'w', encoding='utf-8') as file:
+            json.dump(self.snapshot(), file, indent=2, ensure_ascii=False)
+
+
+def _sort_key(item):
+    (name, table), _ = item
+    return name, table or ''
+
+
+metrics = Metrics()
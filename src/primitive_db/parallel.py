@@ -0,0 +1,151 @@
+import mmap
+import os
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from src.primitive_db.columnar import COLUMN_TYPES, ColumnarTable, StrColumn
+from src.primitive_db.constants import PARALLEL_MIN_ROWS
+from src.primitive_db.decorators import settings
+from src.primitive_db.vector import evaluate, get_engine
+
+_FORMATS = {'int': 'q', 'bool': 'B', 'str': 'I'}
+_pool = None
+_pool_workers = 0
+
+
+def _column_kind(column):
+    """Возвращает тип столбца ('int', 'bool' или 'str')."""
+    return next(kind for kind, cls in COLUMN_TYPES.items() if type(column) is cls)
+
+
+def _resolve(key, table):
+    """Заменяет условия по строковым столбцам наборами кодов словаря.
+
+    Процессу-исполнителю передаются только коды записей, без словаря,
+    поэтому сравнение строк со словарем выполняется здесь один раз.
+    """
+    kind = key[0]
+    if kind in ('cmp', 'in'):
+        column = table.columns[key[1]]
+        if not isinstance(column, StrColumn):
+            return key
+        if kind == 'cmp':
+            codes = column.matching_codes(key[2], key[3])
+            return ('codes', key[1], tuple(sorted(codes)))
+        codes = column.member_codes(set(key[2]))
+        node = ('codes', key[1], tuple(sorted(codes)))
+        return ('not', node) if key[3] else node
+    if kind == 'not':
+        return ('not', _resolve(key[1], table))
+    return (kind, tuple(_resolve(item, table) for item in key[1]))
+
+
+def _key_columns(key, found=None):
+    """Собирает имена столбцов, упомянутых в условии."""
+    found = [] if found is None else found
+    kind = key[0]
+    if kind in ('cmp', 'in', 'codes'):
+        if key[1] not in found:
+            found.append(key[1])
+    elif kind == 'not':
+        _key_columns(key[1], found)
+    else:
+        for item in key[1]:
+            _key_columns(item, found)
+    return found
+
+
+def _write_columns(table, names):
+    """Записывает буферы столбцов во временный файл для отображения в память.
+
+    Возвращает путь к файлу и раскладку {столбец: (тип, смещение)}.
+    """
+    descriptor, path = tempfile.mkstemp(prefix='primitive_db_scan_')
+    layout = {}
+    offset = 0
+    with os.fdopen(descriptor, 'wb') as file:
+        for name in names:
+            column = table.columns[name]
+            layout[name] = (_column_kind(column), offset)
+            offset += file.write(column.buffer())
+    return path, layout
+
+
+def _scan_chunk(path, layout, key, engine_name, start, stop):
+    """Проверяет условие на записях [start, stop) в процессе-исполнителе.
+
+    Столбцы читаются из отображенного в память файла без копирования.
+    Возвращает байты array('q') с позициями подходящих записей.
+    """
+    with open(path, 'rb') as file:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    views = []
+    try:
+        whole = memoryview(mapped)
+        views.append(whole)
+        columns = {}
+        for name, (kind, offset) in layout.items():
+            size = array(_FORMATS[kind]).itemsize
+            chunk = whole[offset + start * size:offset + stop * size]
+            views.append(chunk)
+            views.append(chunk.cast(_FORMATS[kind]))
+            columns[name] = COLUMN_TYPES[kind].view(views[-1])
+        engine = get_engine(engine_name)
+        mask = evaluate(engine, key, ColumnarTable(columns))
+        del columns
+        positions = engine.positions(mask)
+        del mask
+        return array('q', map(start.__add__, positions)).tobytes()
+    finally:
+        for view in reversed(views):
+            view.release()
+        mapped.close()
+
+
+def _get_pool(workers):
+    """Возвращает пул процессов с нужным числом исполнителей."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        shutdown_pool()
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        _pool_workers = workers
+    return _pool
+
+
+def shutdown_pool():
+    """Останавливает пул процессов, если он был запущен."""
+    global _pool, _pool_workers
+    if _pool is not None:
+        _pool.shutdown()
+    _pool, _pool_workers = None, 0
+
+
+def parallel_scan(table, key, engine=None):
+    """Проверяет условие на колоночной таблице в нескольких процессах.
+
+    Таблица делится на части по числу исполнителей (настройка
+    'workers'), части проверяются в пуле процессов, позиции
+    возвращаются в порядке записей. Возвращает None, если параллельный
+    режим выключен или таблица меньше PARALLEL_MIN_ROWS записей.
+    """
+    workers = settings['workers']
+    if workers < 2 or len(table) < PARALLEL_MIN_ROWS:
+        return None
+    engine = engine or get_engine()
+    key = _resolve(key, table)
+    path, layout = _write_columns(table, _key_columns(key))
+    try:
+        size = len(table)
+        step = -(-size // workers)
+        starts = range(0, size, step)
+        stops = [min(start + step, size) for start in starts]
+        scan_chunk = partial(_scan_chunk, path, layout, key, engine.name)
+        chunks = _get_pool(workers).map(scan_chunk, starts, stops)
+        positions = array('q')
+        for chunk in chunks:
+            positions.frombytes(chunk)
+        return positions.tolist()
+    finally:
+        os.remove(path)
@@ -1,52 +1,416 @@
+import functools
+import re
+
+from src.primitive_db.constants import STATEMENT_CACHE_SIZE
+
+_TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<string>"[^"]*"|'[^']*')
+      | (?P<op>!=|<>|<=|>=|=|<|>)
+      | (?P<punct>[(),])
+      | (?P<word>[^\s(),=<>!'"]+)
+    )""",
+    re.VERBOSE,
+)
+_KEYWORDS = ('and', 'or', 'not', 'in')
+_WORD_RE = re.compile(r'"[^"]*"|\'[^\']*\'|[^\s"\']+')
+
+
+def split_keyword(text, keyword):
+    """Делит строку по первому слову keyword вне кавычек.
+
+    Возвращает части до и после ключевого слова или None, если его нет.
+    """
+    for match in _WORD_RE.finditer(text):
+        if match.group() == keyword:
+            return text[:match.start()], text[match.end():]
+    return None
+
+
+def tokenize(where_str):
+    """Разбивает команду или условие where на лексемы (вид, текст)."""
+    tokens = []
+    position = 0
+    where_str = where_str.rstrip()
+    while position < len(where_str):
+        match = _TOKEN_RE.match(where_str, position)
+        if match is None:
+            raise ValueError(f'нераспознанный фрагмент условия: {where_str[position:]}')
+        kind = match.lastgroup
+        text = match.group(kind)
+        if kind == 'word' and text.lower() in _KEYWORDS:
+            kind, text = 'keyword', text.lower()
+        if kind == 'op' and text == '<>':
+            text = '!='
+        tokens.append((kind, text))
+        position = match.end()
+    return tokens
+
+
+class _WhereParser:
+    """Рекурсивный разбор условия where в дерево.
+
+    Грамматика:
+        условие  = и {OR и}
+        и        = не {AND не}
+        не       = NOT не | '(' условие ')' | сравнение
+        сравнение = столбец оператор значение
+                  | столбец [NOT] IN '(' значение {',' значение} ')'
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None, None
+
+    def take(self, kind=None, text=None):
+        token_kind, token_text = self.peek()
+        if token_kind is None or (kind and token_kind != kind) or (
+            text and token_text != text
+        ):
+            expected = text or kind or 'продолжение условия'
+            found = token_text or 'конец строки'
+            raise ValueError(f'ожидается {expected}, найдено: {found}')
+        self.position += 1
+        return token_text
+
+    def parse(self):
+        if not self.tokens:
+            raise ValueError('пустое условие')
+        tree = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ValueError(f'лишний фрагмент условия: {self.peek()[1]}')
+        return tree
+
+    def parse_or(self):
+        items = [self.parse_and()]
+        while self.peek() == ('keyword', 'or'):
+            self.position += 1
+            items.append(self.parse_and())
+        return items[0] if len(items) == 1 else ('or', tuple(items))
+
+    def parse_and(self):
+        items = [self.parse_not()]
+        while self.peek() == ('keyword', 'and'):
+            self.position += 1
+            items.append(self.parse_not())
+        return items[0] if len(items) == 1 else ('and', tuple(items))
+
+    def parse_not(self):
+        if self.peek() == ('keyword', 'not'):
+            self.position += 1
+            return ('not', self.parse_not())
+        if self.peek() == ('punct', '('):
+            self.position += 1
+            tree = self.parse_or()
+            self.take('punct', ')')
+            return tree
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        column = self.take('word')
+        negated = False
+        if self.peek() == ('keyword', 'not'):
+            self.position += 1
+            negated = True
+        if self.peek() == ('keyword', 'in'):
+            self.position += 1
+            return ('in', column, self.parse_list(), negated)
+        if negated:
+            raise ValueError(f'ожидается in после "{column} not"')
+        operator = self.take('op')
+        return ('cmp', column, operator, self.parse_literal())
+
+    def parse_list(self):
+        self.take('punct', '(')
+        values = [self.parse_literal()]
+        while self.peek() == ('punct', ','):
+            self.position += 1
+            values.append(self.parse_literal())
+        self.take('punct', ')')
+        return tuple(values)
+
+    def parse_literal(self):
+        kind, text = self.peek()
+        if kind not in ('string', 'word'):
+            raise ValueError(f'ожидается значение, найдено: {text or "конец строки"}')
+        self.position += 1
+        return text
+
+
 def parse_where_clause(where_str):
-    """Парсит условие where в словарь столбец:значение."""
-    if '=' not in where_str:
-        return None
+    """Разбирает условие where в дерево.
+
+    Узлы дерева: ('cmp', столбец, оператор, значение),
+    ('in', столбец, значения, с_отрицанием), ('and', узлы), ('or', узлы)
+    и ('not', узел). Значения остаются строками: их приводят к типу
+    столбца при компиляции условия. При ошибке выбрасывает ValueError.
+    """
+    return _WhereParser(tokenize(where_str)).parse()
+
+
+AGGREGATE_FUNCTIONS = ('count', 'sum', 'min', 'max', 'avg')
+_STATEMENT_KINDS = ('insert', 'select', 'update', 'delete', 'prepare', 'execute')
+
+
+class Placeholder:
+    """Параметр ? подготовленного оператора; index - его номер по порядку."""
+
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return '?'
+
+
+def _bind(value, args):
+    """Подставляет значения параметров вместо Placeholder."""
+    if isinstance(value, Placeholder):
+        return args[value.index]
+    if isinstance(value, tuple):
+        return tuple(_bind(item, args) for item in value)
+    if isinstance(value, dict):
+        return {key: _bind(item, args) for key, item in value.items()}
+    return value
+
+
+class Statement:
+    """Разобранный оператор: вид (kind) и его части (parts).
+
+    Части зависят от вида оператора: table, where (дерево условия),
+    values, assignments, items и т. д. placeholders - число параметров
+    ?, которые нужно задать через bind перед выполнением. Оператор не
+    меняется после разбора, поэтому его можно хранить в кэше.
+    """
+
+    __slots__ = ('kind', 'parts', 'placeholders')
+
+    def __init__(self, kind, parts, placeholders=0):
+        self.kind = kind
+        self.parts = parts
+        self.placeholders = placeholders
+
+    def bind(self, args):
+        """Возвращает оператор с подставленными значениями параметров."""
+        if len(args) != self.placeholders:
+            raise ValueError(
+                f'ожидается параметров: {self.placeholders}, передано: {len(args)}'
+            )
+        return Statement(self.kind, _bind(self.parts, args))
+
+    def __repr__(self):
+        return f'Statement({self.kind}, {self.parts})'
+
+
+class _StatementParser(_WhereParser):
+    """Разбор команды в Statement по лексемам.
+
+    Грамматика (условие - как в _WhereParser):
+        insert  = INSERT INTO имя VALUES ['('] значение {',' значение} [')']
+        select  = SELECT [выражения] FROM имя [JOIN имя ON столбец '=' столбец]
+                  [WHERE условие] [GROUP BY столбец]
+                  [ORDER BY столбец [ASC|DESC]] [LIMIT n] [OFFSET n]
+        update  = UPDATE имя SET столбец '=' значение {',' ...} WHERE условие
+        delete  = DELETE FROM имя WHERE условие
+        prepare = PREPARE имя AS оператор
+        execute = EXECUTE имя ['(' значение {',' значение} ')']
+    Вместо значения можно указать параметр ?.
+    """
+
+    def __init__(self, tokens):
+        super().__init__(tokens)
+        self.placeholders = 0
+
+    def accept(self, word):
+        if self.peek() == ('word', word):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, word):
+        self.take('word', word)
+
+    def parse_literal(self):
+        value = super().parse_literal()
+        if value != '?':
+            return value
+        self.placeholders += 1
+        return Placeholder(self.placeholders - 1)
+
+    def parse_values(self):
+        parenthesized = self.peek() == ('punct', '(')
+        if parenthesized:
+            self.position += 1
+        values = [self.parse_literal()]
+        while self.peek() == ('punct', ','):
+            self.position += 1
+            values.append(self.parse_literal())
+        if parenthesized:
+            self.take('punct', ')')
+        return tuple(values)
+
+    def parse_count(self, clause):
+        text = self.peek()[1]
+        if text is None or not text.isdigit():
+            raise ValueError(
+                f'{clause} ожидает неотрицательное целое число, '
+                f'найдено: {text or "конец строки"}'
+            )
+        self.position += 1
+        return int(text)
+
+    def parse_statement(self):
+        kind = self.peek()[1]
+        if kind not in _STATEMENT_KINDS:
+            raise ValueError(f'неизвестный оператор: {kind or "конец строки"}')
+        self.position += 1
+        parts = getattr(self, f'parse_{kind}')()
+        if self.position != len(self.tokens):
+            raise ValueError(f'лишний фрагмент команды: {self.peek()[1]}')
+        return Statement(kind, parts, self.placeholders)
+
+    def parse_insert(self):
+        self.expect('into')
+        table = self.take('word')
+        self.expect('values')
+        return {'table': table, 'values': self.parse_values()}
+
+    def parse_select(self):
+        items = None
+        if not self.accept('from'):
+            items = self.parse_items()
+            self.expect('from')
+        parts = {'table': self.take('word'), 'items': items}
+        if self.accept('join'):
+            if items is not None:
+                raise ValueError('агрегаты не поддерживаются в соединении')
+            parts['join'] = self.take('word')
+            self.expect('on')
+            first = self.take('word')
+            self.take('op', '=')
+            parts['on'] = (_split_qualified(first), _split_qualified(self.take('word')))
+        parts['where'] = self.parse_or() if self.accept('where') else None
+        parts['group_by'] = None
+        if self.accept('group'):
+            self.expect('by')
+            parts['group_by'] = self.take('word')
+        parts['order_by'] = None
+        if self.accept('order'):
+            self.expect('by')
+            func, column = self.parse_item()
+            if func is not None:
+                column = f'{func}({column})'
+            descending = self.accept('desc')
+            if not descending:
+                self.accept('asc')
+            parts['order_by'] = (column, descending)
+        parts['limit'] = self.parse_count('limit') if self.accept('limit') else None
+        parts['offset'] = self.parse_count('offset') if self.accept('offset') else 0
+        return parts
+
+    def parse_items(self):
+        items = [self.parse_item()]
+        while self.peek() == ('punct', ','):
+            self.position += 1
+            items.append(self.parse_item())
+        return tuple(items)
+
+    def parse_item(self):
+        name = self.take('word')
+        if self.peek() != ('punct', '('):
+            return (None, name)
+        func = name.lower()
+        if func not in AGGREGATE_FUNCTIONS:
+            raise ValueError(f'неизвестная функция: {name}')
+        self.position += 1
+        column = self.take('word')
+        self.take('punct', ')')
+        if column == '*' and func != 'count':
+            raise ValueError(f'{func}(*) не поддерживается')
+        return (func, column)
+
+    def parse_update(self):
+        table = self.take('word')
+        self.expect('set')
+        assignments = [self.parse_assignment()]
+        while self.peek() == ('punct', ','):
+            self.position += 1
+            assignments.append(self.parse_assignment())
+        self.expect('where')
+        return {
+            'table': table,
+            'assignments': dict(assignments),
+            'where': self.parse_or(),
+        }
+
+    def parse_assignment(self):
+        column = self.take('word')
+        self.take('op', '=')
+        return column, self.parse_literal()
+
+    def parse_delete(self):
+        self.expect('from')
+        table = self.take('word')
+        self.expect('where')
+        return {'table': table, 'where': self.parse_or()}
+
+    def parse_prepare(self):
+        name = self.take('word')
+        self.expect('as')
+        if self.peek()[1] in ('prepare', 'execute'):
+            raise ValueError(f'{self.peek()[1]} нельзя подготовить')
+        return {'name': name, 'statement': self.parse_statement()}
+
+    def parse_execute(self):
+        name = self.take('word')
+        args = ()
+        if self.peek() == ('punct', '('):
+            args = self.parse_values()
+        if self.placeholders:
+            raise ValueError('параметры execute должны быть значениями, а не ?')
+        return {'name': name, 'args': args}
+
 
-    parts = where_str.split('=', 1)
-    if len(parts) != 2:
-        return None
+def _split_qualified(name):
+    """Делит имя вида таблица.столбец на таблицу и столбец."""
+    table_name, dot, column = name.partition('.')
+    if not dot or not table_name or not column:
+        raise ValueError(f'ожидается столбец вида таблица.столбец, найдено: {name}')
+    return table_name, column
 
-    column = parts[0].strip()
-    value = parts[1].strip()
 
-    if value.startswith('"') and value.endswith('"'):
-        value = value[1:-1]
-    elif value.startswith("'") and value.endswith("'"):
-        value = value[1:-1]
+def is_statement(command):
+    """Проверяет, разбирается ли команда как оператор (см. parse_statement)."""
+    word = command.split(None, 1)[0] if command.strip() else ''
+    return word in _STATEMENT_KINDS
 
-    if value.lower() == 'true':
-        value = True
-    elif value.lower() == 'false':
-        value = False
-    elif value.isdigit() or (value.startswith('-') and value[1:].isdigit()):
-        value = int(value)
 
-    return {column: value}
+def normalize_statement(command):
+    """Приводит команду к виду для ключа кэша: пробелы вне кавычек сжимаются."""
+    return ' '.join(_WORD_RE.findall(command))
 
 
-def parse_set_clause(set_str):
-    """Парсит условие set в словарь столбец:значение."""
-    if '=' not in set_str:
-        return None
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _parse_normalized(command):
+    return _StatementParser(tokenize(command)).parse_statement()
 
-    parts = set_str.split('=', 1)
-    if len(parts) != 2:
-        return None
 
-    column = parts[0].strip()
-    value = parts[1].strip()
+def parse_statement(command):
+    """Разбирает команду insert, select, update, delete, prepare или execute.
 
-    if value.startswith('"') and value.endswith('"'):
-        value = value[1:-1]
-    elif value.startswith("'") and value.endswith("'"):
-        value = value[1:-1]
+    Разобранные операторы хранятся в LRU-кэше по нормализованному
+    тексту команды, поэтому повторяющиеся команды не разбираются
+    заново. При ошибке выбрасывает ValueError.
+    """
+    return _parse_normalized(normalize_statement(command))
 
-    if value.lower() == 'true':
-        value = True
-    elif value.lower() == 'false':
-        value = False
-    elif value.isdigit() or (value.startswith('-') and value[1:].isdigit()):
-        value = int(value)
 
-    return {column: value}
+def statement_cache_info():
+    """Возвращает статистику кэша разобранных операторов."""
+    return _parse_normalized.cache_info()
@@ -0,0 +1,188 @@
+import functools
+import operator
+
+from src.primitive_db.constants import STATEMENT_CACHE_SIZE
+from src.primitive_db.decorators import handle_db_errors
+from src.primitive_db.parallel import parallel_scan
+from src.primitive_db.parser import parse_where_clause
+from src.primitive_db.vector import evaluate, get_engine
+
+_MISSING = object()
+
+_ORDERINGS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+class Predicate:
+    """Скомпилированное условие where.
+
+    matches(record) проверяет запись. key - нормализованное условие
+    для ключа кэша. conditions - простые условия (столбец, оператор,
+    значение), связанные через AND на верхнем уровне: по ним подбираются
+    индексы.
+    """
+
+    __slots__ = ('matches', 'key', 'conditions')
+
+    def __init__(self, matches, key, conditions):
+        self.matches = matches
+        self.key = key
+        self.conditions = conditions
+
+    def __call__(self, record):
+        return self.matches(record)
+
+    def mask(self, table, engine=None):
+        """Возвращает маску подходящих записей колоночной таблицы.
+
+        Условие проверяется не по записям, а по столбцам целиком:
+        каждое сравнение дает маску, маски объединяются по AND/OR/NOT.
+        Вид маски зависит от движка (см. vector.py).
+        """
+        engine = engine or get_engine()
+        return evaluate(engine, self.key, table)
+
+    def scan(self, table, engine=None):
+        """Возвращает позиции подходящих записей колоночной таблицы.
+
+        Большие таблицы при включенном параллельном режиме проверяются
+        в нескольких процессах (см. parallel.py).
+        """
+        engine = engine or get_engine()
+        positions = parallel_scan(table, self.key, engine)
+        if positions is not None:
+            return positions
+        return engine.positions(evaluate(engine, self.key, table))
+
+
+def _coerce(schema, column_name, raw_value):
+    """Приводит строковое значение из условия к типу столбца."""
+    column = schema.column(column_name)
+    if column is None:
+        raise ValueError(f'столбец "{column_name}" не существует')
+    value = column.convert(raw_value)
+    if value is None:
+        raise ValueError(
+            f'значение {raw_value} не подходит для столбца {column.name}:{column.type}'
+        )
+    return value
+
+
+def _compare(name, op, value):
+    """Строит проверку столбца оператором сравнения."""
+    if op == '=':
+        def matches(record):
+            return record.get(name, _MISSING) == value
+    elif op == '!=':
+        def matches(record):
+            return name in record and record[name] != value
+    else:
+        compare = _ORDERINGS[op]
+
+        def matches(record):
+            current = record.get(name)
+            return current is not None and compare(current, value)
+    return matches
+
+
+def _member(name, values, negated):
+    """Строит проверку вхождения значения столбца в список."""
+    if negated:
+        def matches(record):
+            return name in record and record[name] not in values
+    else:
+        def matches(record):
+            return record.get(name, _MISSING) in values
+    return matches
+
+
+def _all(checks):
+    """Объединяет проверки через AND."""
+    if len(checks) == 2:
+        first, second = checks
+
+        def matches(record):
+            return first(record) and second(record)
+        return matches
+
+    def matches(record):
+        for check in checks:
+            if not check(record):
+                return False
+        return True
+    return matches
+
+
+def _any(checks):
+    """Объединяет проверки через OR."""
+    if len(checks) == 2:
+        first, second = checks
+
+        def matches(record):
+            return first(record) or second(record)
+        return matches
+
+    def matches(record):
+        for check in checks:
+            if check(record):
+                return True
+        return False
+    return matches
+
+
+def _compile_node(node, schema):
+    """Компилирует узел дерева условия в функцию и ключ."""
+    kind = node[0]
+    if kind == 'cmp':
+        _, name, op, raw_value = node
+        value = _coerce(schema, name, raw_value)
+        return _compare(name, op, value), ('cmp', name, op, value)
+    if kind == 'in':
+        _, name, raw_values, negated = node
+        values = frozenset(_coerce(schema, name, raw) for raw in raw_values)
+        key = ('in', name, tuple(sorted(values, key=repr)), negated)
+        return _member(name, values, negated), key
+    if kind == 'not':
+        check, key = _compile_node(node[1], schema)
+        return (lambda record: not check(record)), ('not', key)
+
+    compiled = [_compile_node(item, schema) for item in node[1]]
+    checks = [check for check, _ in compiled]
+    key = (kind, tuple(item_key for _, item_key in compiled))
+    return (_all(checks) if kind == 'and' else _any(checks)), key
+
+
+def _conditions(key):
+    """Выделяет простые условия, связанные через AND на верхнем уровне."""
+    items = key[1] if key[0] == 'and' else (key,)
+    conditions = []
+    for item in items:
+        if item[0] == 'cmp':
+            conditions.append(item[1:])
+        elif item[0] == 'in' and not item[3]:
+            conditions.append((item[1], 'in', item[2]))
+    return tuple(conditions)
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _compile_tree(tree, schema):
+    matches, key = _compile_node(tree, schema)
+    return Predicate(matches, key, _conditions(key))
+
+
+@handle_db_errors
+def compile_where(where, schema):
+    """Компилирует условие where для таблицы со схемой schema.
+
+    where - строка условия или уже разобранное дерево (см.
+    parse_where_clause). Значения приводятся к типам столбцов один раз
+    при компиляции, а не для каждой записи; условие, скомпилированное
+    для той же схемы, берется из кэша. Возвращает Predicate или None
+    при ошибке.
+    """
+    tree = parse_where_clause(where) if isinstance(where, str) else where
+    return _compile_tree(tree, schema)
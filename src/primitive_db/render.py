@@ -0,0 +1,142 @@
+import json
+import sys
+from itertools import chain, islice
+
+import prompt
+
+from src.primitive_db.constants import OUTPUT_MAX_COLUMN_WIDTH, OUTPUT_PAGE_SIZE
+
+
+def _table_cell(value):
+    """Приводит значение к тексту ячейки таблицы."""
+    if value is None:
+        return ''
+    return str(value).replace('\n', ' ').replace('\t', ' ')
+
+
+def _tsv_cell(value):
+    """Приводит значение к полю TSV в формате команды import."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if value is None:
+        return ''
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n')
+
+
+def _fit(text, width):
+    """Обрезает текст до ширины столбца и выравнивает его по центру."""
+    if len(text) > width:
+        text = text[:width - 1] + '…'
+    return text.center(width)
+
+
+def _column_widths(col_names, rows):
+    """Подбирает ширину столбцов по заголовку и строкам первой страницы."""
+    widths = [len(name) for name in col_names]
+    for row in rows:
+        for i, cell in enumerate(row):
+            if len(cell) > widths[i]:
+                widths[i] = len(cell)
+    return [min(width, OUTPUT_MAX_COLUMN_WIDTH) for width in widths]
+
+
+def _continue_paging():
+    """Спрашивает, выводить ли следующую страницу."""
+    answer = prompt.string('-- Enter - следующая страница, q - прекратить вывод -- ')
+    return answer.strip().lower() != 'q'
+
+
+def _write_pages(pages, out, pager):
+    """Выводит страницы строк, между страницами при необходимости спрашивая.
+
+    Вопрос задается, только если вывод идет в терминал: на сервере и
+    при перенаправлении вывода в файл постраничный вывод не нужен.
+    """
+    pager = pager and out.isatty()
+    written = 0
+    for number, (lines, count) in enumerate(pages):
+        if number and pager and not _continue_paging():
+            break
+        out.write(''.join(lines))
+        written += count
+    return written
+
+
+def _paginate(records, to_line, page_size):
+    """Разбивает записи на страницы готовых строк вывода."""
+    records = iter(records)
+    while True:
+        page = list(islice(records, page_size))
+        if not page:
+            return
+        yield [to_line(record) for record in page], len(page)
+
+
+def _write_table(records, col_names, out, page_size, pager):
+    """Выводит записи таблицей с рамкой.
+
+    Ширина столбцов определяется по первой странице и дальше не
+    меняется, поэтому строки выводятся сразу, а не после того, как
+    будет отрисован весь результат. Более длинные значения обрезаются.
+    """
+    rows = (
+        [_table_cell(record.get(name, '')) for name in col_names]
+        for record in records
+    )
+    first = list(islice(rows, page_size))
+    if not first:
+        out.write('Записи не найдены.\n')
+        return 0
+
+    widths = _column_widths(col_names, first)
+    border = '+' + '+'.join('-' * (width + 2) for width in widths) + '+\n'
+
+    def to_line(row):
+        cells = (_fit(cell, width) for cell, width in zip(row, widths))
+        return '| ' + ' | '.join(cells) + ' |\n'
+
+    out.write(border + to_line(col_names) + border)
+    first_page = ([to_line(row) for row in first], len(first))
+    pages = chain([first_page], _paginate(rows, to_line, page_size))
+    written = _write_pages(pages, out, pager)
+    out.write(border)
+    return written
+
+
+def _write_tsv(records, col_names, out, page_size, pager):
+    """Выводит записи в TSV: строка заголовка и по строке на запись."""
+    out.write('\t'.join(col_names) + '\n')
+
+    def to_line(record):
+        return '\t'.join(_tsv_cell(record.get(name)) for name in col_names) + '\n'
+
+    return _write_pages(_paginate(records, to_line, page_size), out, pager)
+
+
+def _write_jsonl(records, col_names, out, page_size, pager):
+    """Выводит записи в JSONL: по объекту JSON на строку."""
+    def to_line(record):
+        row = {name: record.get(name) for name in col_names}
+        return json.dumps(row, ensure_ascii=False) + '\n'
+
+    return _write_pages(_paginate(records, to_line, page_size), out, pager)
+
+
+WRITERS = {
+    'table': _write_table,
+    'tsv': _write_tsv,
+    'jsonl': _write_jsonl,
+}
+
+
+def write_records(records, col_names, output_format='table', pager=False,
+                  out=None, page_size=OUTPUT_PAGE_SIZE):
+    """Потоково выводит записи страницами по page_size строк.
+
+    В памяти одновременно находится только одна страница вывода,
+    сколько бы записей ни было. Если включен пейджер, перед каждой
+    следующей страницей выводится вопрос. Возвращает количество
+    выведенных записей.
+    """
+    out = sys.stdout if out is None else out
+    return WRITERS[output_format](records, col_names, out, page_size, pager)
@@ -0,0 +1,153 @@
+import functools
+
+
+def _strip_quotes(value_str):
+    """Убирает пробелы и кавычки вокруг строкового значения."""
+    value_str = value_str.strip()
+    if value_str.startswith('"') and value_str.endswith('"'):
+        return value_str[1:-1]
+    if value_str.startswith("'") and value_str.endswith("'"):
+        return value_str[1:-1]
+    return value_str
+
+
+def _to_int(value_str):
+    """Преобразует строку в int или возвращает None."""
+    try:
+        return int(_strip_quotes(value_str))
+    except ValueError:
+        return None
+
+
+def _to_str(value_str):
+    """Преобразует строку в значение типа str."""
+    return _strip_quotes(value_str)
+
+
+def _to_bool(value_str):
+    """Преобразует строку в bool или возвращает None."""
+    value_str = _strip_quotes(value_str).lower()
+    if value_str == 'true':
+        return True
+    if value_str == 'false':
+        return False
+    return None
+
+
+def _to_text(value):
+    """Возвращает значение в том виде, в каком его пишут в команде."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _reject(value_str):
+    """Преобразователь для столбца с некорректным типом."""
+    return None
+
+
+CONVERTERS = {
+    'int': _to_int,
+    'str': _to_str,
+    'bool': _to_bool,
+}
+
+VALIDATORS = {
+    'int': lambda value: isinstance(value, int),
+    'str': lambda value: isinstance(value, str),
+    'bool': lambda value: isinstance(value, bool),
+}
+
+
+class Column:
+    """Столбец таблицы с заранее выбранными функциями преобразования и проверки."""
+
+    __slots__ = ('name', 'type', 'position', 'convert', 'validate')
+
+    def __init__(self, name, col_type, position):
+        self.name = name
+        self.type = col_type
+        self.position = position
+        self.convert = CONVERTERS.get(col_type, _reject)
+        self.validate = VALIDATORS.get(col_type, lambda value: False)
+
+    def __repr__(self):
+        return f'Column({self.name}:{self.type})'
+
+
+class Schema:
+    """Скомпилированное описание столбцов таблицы."""
+
+    __slots__ = ('columns', 'names', 'data_columns', 'by_name')
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.names = [column.name for column in columns]
+        self.data_columns = columns[1:]
+        self.by_name = {column.name: column for column in columns}
+
+    def column(self, name):
+        """Возвращает столбец по имени или None."""
+        return self.by_name.get(name)
+
+    def convert_row(self, values):
+        """Преобразует строковые значения в запись.
+
+        Столбец ID пропускается. Возвращает запись и сообщение об ошибке.
+        """
+        if len(values) != len(self.data_columns):
+            return None, (
+                'Некорректное значение: количество значений не соответствует '
+                'столбцам. Попробуйте снова.'
+            )
+
+        record = {}
+        for column, value_str in zip(self.data_columns, values):
+            value = column.convert(value_str)
+            if value is None:
+                return None, f'Некорректное значение: {value_str}. Попробуйте снова.'
+            record[column.name] = value
+        return record, None
+
+    def convert_assignments(self, assignments):
+        """Приводит значения из set к типам столбцов.
+
+        Возвращает словарь столбец:значение и сообщение об ошибке.
+        Столбец ID менять нельзя: по нему записи хранятся в журнале.
+        """
+        converted = {}
+        for name, value in assignments.items():
+            column = self.column(name)
+            if column is None:
+                return None, f'Ошибка: Столбец "{name}" не существует.'
+            if column is self.columns[0]:
+                return None, f'Ошибка: Столбец "{name}" нельзя изменить.'
+            text = _to_text(value)
+            converted[name] = column.convert(text)
+            if converted[name] is None:
+                return None, f'Некорректное значение: {text}. Попробуйте снова.'
+        return converted, None
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(columns):
+    """Компилирует кортеж определений столбцов 'имя:тип' в схему."""
+    compiled = []
+    for position, col_def in enumerate(columns):
+        col_name, _, col_type = col_def.partition(':')
+        compiled.append(Column(col_name, col_type, position))
+    return Schema(compiled)
+
+
+def compile_schema(columns):
+    """Возвращает схему для списка определений столбцов.
+
+    Схема строится один раз для каждого набора столбцов и при изменении
+    метаданных таблицы строится заново.
+    """
+    return _compile(tuple(columns))
+
+
+def get_schema(metadata, table_name):
+    """Возвращает схему таблицы из метаданных."""
+    return compile_schema(metadata[table_name]['columns'])
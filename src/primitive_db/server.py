@@ -0,0 +1,298 @@
+import asyncio
+import contextlib
+import io
+import shlex
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.primitive_db.client import encode_response
+from src.primitive_db.constants import SERVER_HOST, SERVER_PORT, SERVER_THREADS
+from src.primitive_db.decorators import configure
+from src.primitive_db.engine import catalog, execute_command
+from src.primitive_db.parallel import shutdown_pool
+from src.primitive_db.parser import is_statement, parse_statement
+
+# Команды, которые только читают таблицу из второго аргумента.
+READ_COMMANDS = ('info', 'export')
+# Команды, которые меняют данные таблицы из второго аргумента.
+WRITE_COMMANDS = ('import',)
+# Команды, которые не обращаются к данным таблиц.
+SHARED_COMMANDS = ('help', 'list_tables', 'cache_stats', 'stats')
+# Транзакция общая для всего каталога, поэтому клиентам она недоступна.
+REJECTED_COMMANDS = ('begin', 'commit', 'rollback')
+# Служебные команды меняют общие для всех клиентов настройки.
+REJECTED_META_COMMANDS = ('pager', 'output', 'engine', 'workers', 'metrics')
+
+
+class ReadWriteLock:
+    """Блокировка чтения-записи для корутин.
+
+    Читателей может быть сколько угодно, писатель - только один и без
+    читателей. Пока писатель ждет, новые читатели не допускаются, чтобы
+    поток чтений не откладывал запись бесконечно.
+    """
+
+    def __init__(self):
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+        self._condition = asyncio.Condition()
+
+    @contextlib.asynccontextmanager
+    async def reading(self):
+        async with self._condition:
+            await self._condition.wait_for(
+                lambda: not self._writer and not self._waiting_writers
+            )
+            self._readers += 1
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextlib.asynccontextmanager
+    async def writing(self):
+        async with self._condition:
+            self._waiting_writers += 1
+            try:
+                await self._condition.wait_for(
+                    lambda: not self._writer and not self._readers
+                )
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class ServerLocks:
+    """Блокировки сервера: на весь каталог, очередь записей и по таблицам.
+
+    Обычная команда держит блокировку каталога на чтение, а таблицы -
+    на чтение или запись. Изменения данных выполняются по одному через
+    очередь записей, поэтому они не мешают друг другу внутри каталога,
+    а чтение других таблиц продолжается. Команды, меняющие схему или
+    настройки, держат каталог на запись и выполняются в одиночку.
+    Таблицы блокируются в порядке имен, поэтому взаимных блокировок нет.
+    """
+
+    def __init__(self):
+        self.catalog = ReadWriteLock()
+        self.writes = asyncio.Lock()
+        self._tables = {}
+
+    def table(self, table_name):
+        """Возвращает блокировку таблицы, создавая ее при первом обращении."""
+        return self._tables.setdefault(table_name, ReadWriteLock())
+
+    @contextlib.asynccontextmanager
+    async def hold(self, access):
+        """Удерживает блокировки для доступа access (см. command_access)."""
+        async with contextlib.AsyncExitStack() as stack:
+            if access is None:
+                await stack.enter_async_context(self.catalog.writing())
+            else:
+                reads, writes = access
+                await stack.enter_async_context(self.catalog.reading())
+                if writes:
+                    await stack.enter_async_context(self.writes)
+                for table_name in sorted(set(reads) | set(writes)):
+                    lock = self.table(table_name)
+                    if table_name in writes:
+                        await stack.enter_async_context(lock.writing())
+                    else:
+                        await stack.enter_async_context(lock.reading())
+            yield
+
+
+def _statement_access(command, statements):
+    """Определяет таблицы, которые читает и меняет оператор."""
+    try:
+        statement = parse_statement(command)
+    except ValueError:
+        return (), ()
+    if statement.kind == 'execute':
+        statement = statements.get(statement.parts['name'])
+        if statement is None:
+            return (), ()
+    parts = statement.parts
+    if statement.kind == 'select':
+        return tuple(filter(None, (parts['table'], parts.get('join')))), ()
+    if statement.kind in ('insert', 'update', 'delete'):
+        return (), (parts['table'],)
+    return (), ()
+
+
+def command_access(command, statements):
+    """Определяет блокировки, нужные команде.
+
+    Возвращает пару (читаемые таблицы, изменяемые таблицы) или None,
+    если команда должна выполняться одна (create_table, служебные
+    команды и т. п.). Для недоступных на сервере команд выбрасывает
+    ValueError.
+    """
+    if command.startswith('\\'):
+        args = command[1:].split(None, 1)
+        if args and args[0] in REJECTED_META_COMMANDS:
+            raise ValueError('Команда недоступна в режиме сервера')
+        if args and args[0] == 'profile' and len(args) > 1:
+            command_access(args[1], statements)
+        return None
+    if is_statement(command):
+        return _statement_access(command, statements)
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return (), ()
+    if not args or args[0] in SHARED_COMMANDS:
+        return (), ()
+    if args[0] in REJECTED_COMMANDS:
+        raise ValueError('Команда недоступна в режиме сервера')
+    if args[0] in READ_COMMANDS and len(args) > 1:
+        return (args[1],), ()
+    if args[0] in WRITE_COMMANDS and len(args) > 1:
+        return (), (args[1],)
+    return None
+
+
+class ThreadOutput(io.TextIOBase):
+    """Замена sys.stdout, направляющая вывод потока в его буфер.
+
+    Команды выводят результат через print, а на сервере вывод каждой
+    команды нужно отправить ее клиенту. Пока поток выполняет команду,
+    его вывод попадает в буфер; вывод остальных потоков идет в stream.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    def capture(self, buffer):
+        """Направляет вывод текущего потока в buffer (None - в stream)."""
+        self._local.buffer = buffer
+
+    def _target(self):
+        buffer = getattr(self._local, 'buffer', None)
+        return self.stream if buffer is None else buffer
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+
+class Server:
+    """TCP-сервер, выполняющий команды клиентов над общим каталогом.
+
+    Таблицы загружаются в память один раз для всех клиентов. Команды
+    выполняются в пуле потоков под блокировками ServerLocks: select по
+    таблицам идут параллельно, изменения ставятся в очередь.
+    Подготовленные операторы у каждого клиента свои.
+    """
+
+    def __init__(self, output, threads=SERVER_THREADS):
+        self.output = output
+        self.locks = ServerLocks()
+        self.executor = ThreadPoolExecutor(max_workers=threads)
+        self._clients = {}
+
+    def _run(self, command, statements):
+        """Выполняет команду в потоке пула, возвращает (успех, вывод)."""
+        buffer = io.StringIO()
+        self.output.capture(buffer)
+        try:
+            ok = execute_command(command, statements)
+        except Exception as e:
+            print(f"Произошла непредвиденная ошибка: {e}")
+            ok = False
+        finally:
+            self.output.capture(None)
+        return ok, buffer.getvalue()
+
+    async def execute(self, command, statements):
+        """Выполняет команду клиента под нужными блокировками."""
+        try:
+            access = command_access(command, statements)
+        except ValueError as e:
+            return False, f'Ошибка: {e}.\n'
+        loop = asyncio.get_running_loop()
+        async with self.locks.hold(access):
+            return await loop.run_in_executor(
+                self.executor, self._run, command, statements
+            )
+
+    async def handle(self, reader, writer):
+        """Обслуживает одного клиента до команды exit или разрыва соединения."""
+        statements = {}
+        self._clients[writer] = asyncio.current_task()
+        try:
+            while True:
+                line = await reader.readline()
+                command = line.decode('utf-8', errors='replace').strip()
+                if not line or command == 'exit':
+                    break
+                ok, text = True, ''
+                if command:
+                    ok, text = await self.execute(command, statements)
+                writer.write(encode_response(ok, text))
+                await writer.drain()
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def serve_forever(self, host, port):
+        """Принимает подключения до сигнала SIGINT (Ctrl+C) или SIGTERM."""
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(signal_number, stopped.set)
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f'Сервер базы данных слушает {host}:{port} (Ctrl+C - остановить).')
+        async with server:
+            await stopped.wait()
+            server.close()
+            handlers = list(self._clients.values())
+            for writer in list(self._clients):
+                writer.close()
+            await asyncio.gather(*handlers, return_exceptions=True)
+
+
+def serve(host=SERVER_HOST, port=SERVER_PORT, threads=SERVER_THREADS):
+    """Запускает сервер и при остановке записывает изменения на диск.
+
+    Как и в режиме скрипта, вопросы пользователю отключены.
+    """
+    configure(confirm=False, pager=False)
+    catalog.load_metadata()
+    stdout = sys.stdout
+    output = ThreadOutput(stdout)
+    sys.stdout = output
+    server = Server(output, threads)
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown()
+        sys.stdout = stdout
+        catalog.close()
+        shutdown_pool()
+    print('Сервер остановлен.')
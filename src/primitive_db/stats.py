@@ -0,0 +1,105 @@
+from src.primitive_db.columnar import ColumnarTable
+from src.primitive_db.vector import get_engine
+
+
+def _int_columns(schema):
+    """Возвращает имена столбцов типа int."""
+    return [column.name for column in schema.columns if column.type == 'int']
+
+
+def _column_stats(table_data, name):
+    """Считает минимум, максимум и число пустых значений столбца."""
+    if isinstance(table_data, ColumnarTable):
+        engine = get_engine()
+        return {
+            'min': engine.aggregate(table_data, name, 'min'),
+            'max': engine.aggregate(table_data, name, 'max'),
+            'nulls': 0,
+        }
+    values = [record.get(name) for record in table_data]
+    present = [value for value in values if value is not None]
+    return {
+        'min': min(present, default=None),
+        'max': max(present, default=None),
+        'nulls': len(values) - len(present),
+    }
+
+
+def compute_stats(table_data, schema):
+    """Считает статистику таблицы: число записей и диапазоны столбцов int."""
+    return {
+        'rows': len(table_data),
+        'columns': {
+            name: _column_stats(table_data, name) for name in _int_columns(schema)
+        },
+    }
+
+
+def column_stats(stats, table_data, name):
+    """Возвращает статистику столбца, пересчитывая ее, если она устарела."""
+    if stats['columns'].get(name) is None:
+        stats['columns'][name] = _column_stats(table_data, name)
+    return stats['columns'][name]
+
+
+def add_records(stats, records):
+    """Учитывает в статистике добавленные записи."""
+    stats['rows'] += len(records)
+    for name, entry in stats['columns'].items():
+        if entry is None:
+            continue
+        for record in records:
+            value = record.get(name)
+            if value is None:
+                entry['nulls'] += 1
+                continue
+            if entry['min'] is None or value < entry['min']:
+                entry['min'] = value
+            if entry['max'] is None or value > entry['max']:
+                entry['max'] = value
+
+
+def remove_records(stats, records):
+    """Учитывает в статистике удаленные записи.
+
+    Если удалено крайнее значение столбца, его диапазон помечается
+    устаревшим и пересчитывается при следующем обращении.
+    """
+    stats['rows'] -= len(records)
+    for name, entry in stats['columns'].items():
+        if entry is None:
+            continue
+        for record in records:
+            value = record.get(name)
+            if value is None:
+                entry['nulls'] -= 1
+            elif value == entry['min'] or value == entry['max']:
+                stats['columns'][name] = None
+                break
+
+
+def change_columns(stats, columns):
+    """Помечает устаревшими диапазоны измененных столбцов."""
+    for name in columns:
+        if name in stats['columns']:
+            stats['columns'][name] = None
+
+
+def stats_aggregate(stats, items):
+    """Отвечает на агрегаты без where и group by по статистике таблицы.
+
+    Подходят count(*), а также count, min и max по столбцам int.
+    Возвращает список значений или None, если нужен просмотр таблицы.
+    """
+    values = []
+    for func, name in items:
+        entry = stats['columns'].get(name)
+        if func == 'count' and name == '*':
+            values.append(stats['rows'])
+        elif entry is None or func not in ('count', 'min', 'max'):
+            return None
+        elif func == 'count':
+            values.append(stats['rows'] - entry['nulls'])
+        else:
+            values.append(entry[func])
+    return values
@@ -0,0 +1,172 @@
+import csv
+import json
+import os
+import time
+
+from src.primitive_db.constants import EXPORT_BUFFER_SIZE, IMPORT_BATCH_SIZE
+from src.primitive_db.core import iter_matching
+from src.primitive_db.decorators import handle_db_errors
+from src.primitive_db.schema import get_schema
+from src.primitive_db.utils import iter_table_data
+
+
+def detect_format(filepath, file_format=None):
+    """Определяет формат файла по явному указанию или по расширению."""
+    if file_format is None:
+        file_format = os.path.splitext(filepath)[1].lstrip('.').lower()
+    if file_format in ('csv', 'jsonl'):
+        return file_format
+    raise ValueError(f'Неподдерживаемый формат файла: {filepath}')
+
+
+def _json_to_str(value):
+    """Приводит значение из JSON к строке в формате команды insert."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, str)):
+        return str(value)
+    return None
+
+
+def _csv_value(value):
+    """Приводит значение к виду, который понимает команда import."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '' if value is None else value
+
+
+def _read_csv_rows(file, col_names):
+    """Построчно читает CSV и возвращает номер строки и значения.
+
+    Если первая строка совпадает с именами столбцов, она считается
+    заголовком, и значения берутся по именам, а не по порядку.
+    """
+    reader = csv.reader(file)
+    header = None
+    for row in reader:
+        line_no = reader.line_num
+        if not row:
+            continue
+        if line_no == 1 and set(row) >= set(col_names):
+            header = {name: i for i, name in enumerate(row)}
+            continue
+        if header is not None:
+            if len(row) != len(header):
+                yield line_no, row, None
+                continue
+            row = [row[header[name]] for name in col_names]
+        yield line_no, row, None
+
+
+def _read_jsonl_rows(file, col_names):
+    """Построчно читает JSONL и возвращает номер строки и значения."""
+    for line_no, line in enumerate(file, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError:
+            yield line_no, None, 'строка не является корректным JSON'
+            continue
+        if isinstance(item, dict):
+            missing = [name for name in col_names if name not in item]
+            if missing:
+                yield line_no, None, f'нет значений для столбцов {", ".join(missing)}'
+                continue
+            item = [item[name] for name in col_names]
+        if not isinstance(item, list):
+            yield line_no, None, 'ожидается объект или список значений'
+            continue
+        values = [_json_to_str(value) for value in item]
+        if None in values:
+            yield line_no, None, 'неподдерживаемый тип значения'
+            continue
+        yield line_no, values, None
+
+
+def _insert_batch(catalog, table_name, batch):
+    """Выдает порции записей блок ID и записывает ее одной операцией."""
+    first_id = catalog.reserve_ids(table_name, len(batch))
+    for offset, record in enumerate(batch):
+        record['ID'] = first_id + offset
+    catalog.insert_records(table_name, batch)
+
+
+@handle_db_errors
+def import_rows(catalog, table_name, filepath, file_format=None,
+                batch_size=IMPORT_BATCH_SIZE):
+    """Потоково загружает записи из CSV или JSONL в таблицу.
+
+    Строки проверяются по тем же правилам, что и в команде insert,
+    каждой порции из batch_size строк выдается один блок ID, и порция
+    записывается на диск одной операцией. Возвращает количество загруженных строк,
+    список отклоненных строк (номер, причина) и время работы.
+    """
+    metadata = catalog.load_metadata()
+    if table_name not in metadata:
+        raise KeyError(table_name)
+
+    file_format = detect_format(filepath, file_format)
+    schema = get_schema(metadata, table_name)
+    col_names = [column.name for column in schema.data_columns]
+    reader = _read_csv_rows if file_format == 'csv' else _read_jsonl_rows
+
+    start_time = time.monotonic()
+    imported = 0
+    rejected = []
+    batch = []
+
+    with open(filepath, 'r', encoding='utf-8', newline='') as file:
+        for line_no, values, error in reader(file, col_names):
+            if error is None:
+                record, error = schema.convert_row(values)
+            if error is not None:
+                rejected.append((line_no, error))
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                _insert_batch(catalog, table_name, batch)
+                imported += len(batch)
+                batch = []
+
+    if batch:
+        _insert_batch(catalog, table_name, batch)
+        imported += len(batch)
+
+    return imported, rejected, time.monotonic() - start_time
+
+
+@handle_db_errors
+def export_rows(catalog, table_name, filepath, file_format=None, where_clause=None):
+    """Потоково выгружает записи таблицы в CSV или JSONL.
+
+    Столбцы записываются в порядке из метаданных. Если таблица уже
+    загружена в кэш, записи берутся из него, иначе читаются из файла
+    по одной. Возвращает количество выгруженных записей.
+    """
+    metadata = catalog.load_metadata()
+    if table_name not in metadata:
+        raise KeyError(table_name)
+
+    file_format = detect_format(filepath, file_format)
+    col_names = get_schema(metadata, table_name).names
+    cached = catalog.cached_table(table_name)
+    records = cached.data if cached is not None else iter_table_data(table_name)
+
+    exported = 0
+    with open(
+        filepath, 'w', encoding='utf-8', newline='', buffering=EXPORT_BUFFER_SIZE
+    ) as file:
+        if file_format == 'csv':
+            writer = csv.writer(file)
+            writer.writerow(col_names)
+            for record in iter_matching(records, where_clause):
+                writer.writerow([_csv_value(record.get(name)) for name in col_names])
+                exported += 1
+        else:
+            for record in iter_matching(records, where_clause):
+                row = {name: record.get(name) for name in col_names}
+                file.write(json.dumps(row, ensure_ascii=False) + '\n')
+                exported += 1
+    return exported
@@ -1,37 +1,578 @@
+import contextlib
 import json
 import os
+import struct
+import threading
 
-from src.primitive_db.constants import DATA_DIR
+from src.primitive_db.constants import (
+    COMPACT_MIN_ENTRIES,
+    DATA_DIR,
+    INDEX_SUFFIX,
+    LEGACY_TABLE_SUFFIX,
+    LOCK_SUFFIX,
+    TABLE_LOG_SUFFIX,
+)
+from src.primitive_db.metrics import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+_VERSION = struct.Struct('<Q')
+
+
+def _flock(fd, operation):
+    """Вызывает fcntl.flock; без fcntl (Windows) блокировки не действуют."""
+    if fcntl is not None:
+        fcntl.flock(fd, getattr(fcntl, operation))
+
+
+def try_lock(fd):
+    """Блокирует файл монопольно без ожидания.
+
+    Возвращает False, если файл уже заблокирован другим процессом.
+    """
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+class FileLock:
+    """Рекомендательная блокировка чтения-записи через отдельный файл.
+
+    Между процессами действует fcntl.flock, а потоки одного процесса
+    согласуются здесь же: общую блокировку файла берет первый читатель
+    и снимает последний. Поток с монопольной блокировкой может брать
+    блокировку повторно; повысить общую блокировку до монопольной
+    нельзя.
+
+    В начале файла блокировки хранится счетчик изменений. Запись под
+    монопольной блокировкой увеличивает его (bump), поэтому другие
+    процессы узнают об изменении, прочитав 8 байт, а не данные.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._owner = None
+        self._depth = 0
+        self._local = threading.local()
+
+    def _file(self):
+        with self._cond:
+            if self._fd is None:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            return self._fd
+
+    @contextlib.contextmanager
+    def shared(self):
+        """Общая блокировка - для чтения файлов."""
+        nested = (
+            self._owner == threading.get_ident()
+            or getattr(self._local, 'reading', 0) > 0
+        )
+        if not nested:
+            with self._cond:
+                self._cond.wait_for(lambda: self._owner is None)
+                if not self._readers:
+                    _flock(self._file(), 'LOCK_SH')
+                self._readers += 1
+        self._local.reading = getattr(self._local, 'reading', 0) + 1
+        try:
+            yield
+        finally:
+            self._local.reading -= 1
+            if not nested:
+                with self._cond:
+                    self._readers -= 1
+                    if not self._readers:
+                        _flock(self._fd, 'LOCK_UN')
+                        self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Монопольная блокировка - для записи файлов."""
+        me = threading.get_ident()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+            else:
+                if getattr(self._local, 'reading', 0):
+                    raise RuntimeError(f'нельзя повысить блокировку {self.path}')
+                self._cond.wait_for(
+                    lambda: self._owner is None and not self._readers
+                )
+                _flock(self._file(), 'LOCK_EX')
+                self._owner, self._depth = me, 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    _flock(self._fd, 'LOCK_UN')
+                    self._owner = None
+                    self._cond.notify_all()
+
+    def version(self):
+        """Возвращает счетчик изменений."""
+        with self._cond:
+            fd = self._file()
+            os.lseek(fd, 0, os.SEEK_SET)
+            data = os.read(fd, _VERSION.size)
+        return _VERSION.unpack(data)[0] if len(data) == _VERSION.size else 0
+
+    def set_version(self, version):
+        """Записывает счетчик изменений (под монопольной блокировкой)."""
+        with self._cond:
+            fd = self._file()
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, _VERSION.pack(version))
+
+    def bump(self):
+        """Увеличивает счетчик изменений (под монопольной блокировкой)."""
+        with self._cond:
+            version = self.version() + 1
+            self.set_version(version)
+        return version
+
+
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
+
+def file_lock(filepath):
+    """Возвращает блокировку файла filepath (файл блокировки - рядом с ним).
+
+    Блокировки хранятся по абсолютному пути, поэтому после смены
+    текущего каталога не используется файл блокировки из прежнего.
+    """
+    path = os.path.abspath(filepath + LOCK_SUFFIX)
+    with _file_locks_guard:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = FileLock(path)
+        return lock
+
+
+def table_lock(table_name):
+    """Возвращает блокировку таблицы: ее журнала или файла старого формата.
+
+    Блокировки разных таблиц независимы, поэтому запись в одну таблицу
+    не мешает другим процессам работать с остальными.
+    """
+    return file_lock(os.path.join(DATA_DIR, table_name))
+
+
+def _count_file(name, file, table=None):
+    """Прибавляет размер открытого файла к счетчику метрик name."""
+    if metrics.enabled:
+        metrics.count(name, os.fstat(file.fileno()).st_size, table)
 
 
 def load_metadata(filepath):
     """Загружает метаданные базы данных из файла."""
+    with file_lock(filepath).shared():
+        try:
+            with open(filepath, 'r', encoding='utf-8') as file:
+                _count_file('bytes_read', file)
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+
+def _fsync_dir(directory):
+    """Сбрасывает на диск запись каталога после переименования файла."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            return json.load(file)
-    except FileNotFoundError:
-        return {}
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _atomic_write(filepath, write):
+    """Атомарно записывает файл.
+
+    Данные пишутся во временный файл, сбрасываются на диск через fsync
+    и только потом заменяют исходный файл, поэтому при сбое остается
+    либо старая, либо новая версия файла целиком.
+    """
+    directory = os.path.dirname(filepath) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f'{filepath}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            write(file)
+            file.flush()
+            os.fsync(file.fileno())
+            _count_file('bytes_written', file)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    _fsync_dir(directory)
 
 
 def save_metadata(filepath, data):
-    """Сохраняет метаданные базы данных в файл."""
-    with open(filepath, 'w', encoding='utf-8') as file:
-        json.dump(data, file, indent=2, ensure_ascii=False)
+    """Сохраняет метаданные базы данных в файл.
+
+    Возвращает состояние файла после записи (см. metadata_state).
+    """
+    lock = file_lock(filepath)
+    with lock.exclusive():
+        _atomic_write(
+            filepath, lambda file: json.dump(data, file, indent=2, ensure_ascii=False)
+        )
+        lock.bump()
+        return metadata_state(filepath)
+
+
+def metadata_state(filepath):
+    """Возвращает счетчик изменений, размер и время изменения файла метаданных."""
+    return [file_lock(filepath).version(), file_state(filepath)]
+
+
+def _table_log_path(table_name):
+    """Возвращает путь к журналу записей таблицы."""
+    return os.path.join(DATA_DIR, f'{table_name}{TABLE_LOG_SUFFIX}')
+
+
+def _legacy_table_path(table_name):
+    """Возвращает путь к файлу таблицы в старом формате JSON."""
+    return os.path.join(DATA_DIR, f'{table_name}{LEGACY_TABLE_SUFFIX}')
+
+
+def _dump_entry(entry):
+    """Сериализует запись журнала в одну строку."""
+    return json.dumps(entry, ensure_ascii=False) + '\n'
+
+
+def _replay_table_log(filepath):
+    """Восстанавливает данные таблицы по журналу.
+
+    Возвращает список записей, количество строк журнала и следующий
+    свободный ID. Счетчик ID берется из записей 'sequence' и из ID
+    добавленных записей, поэтому ID удаленных записей не выдаются снова.
+    """
+    records = {}
+    entries_count = 0
+    next_id = 1
+    with open(filepath, 'r', encoding='utf-8') as file:
+        _count_file('bytes_read', file)
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith('\n'):
+                    raise
+                break
+            entries_count += 1
+            op = entry.get('op')
+            if op in ('insert', 'update'):
+                record = entry['record']
+                records[record['ID']] = record
+                next_id = max(next_id, record['ID'] + 1)
+            elif op == 'delete':
+                records.pop(entry['ID'], None)
+            elif op == 'sequence':
+                next_id = max(next_id, entry['next_id'])
+    return list(records.values()), entries_count, next_id
+
+
+def _next_id(data):
+    """Вычисляет следующий ID для таблицы без сохраненного счетчика."""
+    return max((record.get('ID', 0) for record in data), default=0) + 1
+
+
+def _write_snapshot(table_name, data, next_id=None):
+    """Перезаписывает журнал таблицы снимком текущих данных.
+
+    Первой строкой записывается счетчик ID таблицы.
+    """
+    if next_id is None:
+        next_id = _next_id(data)
+
+    def write(file):
+        file.write(_dump_entry({'op': 'sequence', 'next_id': next_id}))
+        for record in data:
+            file.write(_dump_entry({'op': 'insert', 'record': record}))
+
+    lock = table_lock(table_name)
+    with lock.exclusive():
+        _atomic_write(_table_log_path(table_name), write)
+        lock.bump()
+
+
+def _read_table(table_name):
+    """Читает данные таблицы, число устаревших строк журнала и следующий ID."""
+    filepath = _table_log_path(table_name)
+    if os.path.exists(filepath):
+        data, entries_count, next_id = _replay_table_log(filepath)
+        return data, entries_count - len(data), next_id
+
+    try:
+        with open(_legacy_table_path(table_name), 'r', encoding='utf-8') as file:
+            _count_file('bytes_read', file, table_name)
+            data = json.load(file)
+    except FileNotFoundError:
+        return [], 0, 1
+    return data, 0, _next_id(data)
+
+
+def load_table_snapshot(table_name):
+    """Загружает данные таблицы, следующий свободный ID и состояние файла.
+
+    Данные и состояние читаются под одной блокировкой, поэтому
+    состояние соответствует именно этим данным. Читает журнал записей,
+    а при его отсутствии - файл в старом формате JSON. Если в журнале
+    накопилось слишком много устаревших записей, он сжимается.
+    """
+    lock = table_lock(table_name)
+    with lock.shared():
+        data, garbage, next_id = _read_table(table_name)
+        state = table_log_state(table_name)
+    if garbage >= COMPACT_MIN_ENTRIES and garbage > len(data):
+        with lock.exclusive():
+            data, garbage, next_id = _read_table(table_name)
+            _write_snapshot(table_name, data, next_id)
+            state = table_log_state(table_name)
+    return data, next_id, state
+
+
+def load_table_with_sequence(table_name):
+    """Загружает данные таблицы и следующий свободный ID."""
+    return load_table_snapshot(table_name)[:2]
 
 
 def load_table_data(table_name):
     """Загружает данные таблицы из файла."""
-    filepath = os.path.join(DATA_DIR, f'{table_name}.json')
+    return load_table_with_sequence(table_name)[0]
+
+
+def iter_table_data(table_name):
+    """Потоково перебирает записи таблицы, не загружая ее целиком.
+
+    Первый проход по журналу запоминает для каждого ID смещение последней
+    версии записи, второй читает записи по этим смещениям в порядке
+    добавления. В памяти остаются только смещения, а не сами записи.
+    """
+    with table_lock(table_name).shared():
+        yield from _iter_table_log(table_name)
+
+
+def _iter_table_log(table_name):
+    filepath = _table_log_path(table_name)
+    if not os.path.exists(filepath):
+        yield from _read_table(table_name)[0]
+        return
+
+    offsets = {}
+    with open(filepath, 'rb') as file:
+        _count_file('bytes_read', file, table_name)
+        while True:
+            offset = file.tell()
+            line = file.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith(b'\n'):
+                    raise
+                break
+            op = entry.get('op')
+            if op in ('insert', 'update'):
+                offsets[entry['record']['ID']] = offset
+            elif op == 'delete':
+                offsets.pop(entry['ID'], None)
+
+        for offset in offsets.values():
+            if file.tell() != offset:
+                file.seek(offset)
+            yield json.loads(file.readline())['record']
+
+
+def save_table_data(table_name, data):
+    """Сохраняет данные таблицы в файл целиком.
+
+    Данные записываются в формате журнала, файл старого формата удаляется.
+    """
+    with table_lock(table_name).exclusive():
+        _write_snapshot(table_name, data)
+        legacy_path = _legacy_table_path(table_name)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+
+
+def append_table_log(table_name, entries):
+    """Дописывает операции в конец журнала таблицы.
+
+    Каждая операция - словарь с ключом 'op' ('insert', 'update', 'delete'
+    или 'sequence').
+    Таблица в старом формате перед этим переводится в формат журнала.
+    Возвращает состояние файла таблицы после записи.
+    """
+    lock = table_lock(table_name)
+    with lock.exclusive():
+        if entries:
+            os.makedirs(DATA_DIR, exist_ok=True)
+            if not os.path.exists(_table_log_path(table_name)):
+                migrate_table_data(table_name)
+            payload = ''.join(_dump_entry(entry) for entry in entries)
+            with open(_table_log_path(table_name), 'a', encoding='utf-8') as file:
+                file.write(payload)
+            if metrics.enabled:
+                metrics.count('bytes_written', len(payload.encode('utf-8')), table_name)
+            lock.bump()
+        return table_log_state(table_name)
+
+
+def sync_table_data(table_name):
+    """Сбрасывает журнал таблицы на диск через fsync."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        with open(_table_log_path(table_name), 'rb') as file:
+            os.fsync(file.fileno())
     except FileNotFoundError:
-        return []
+        pass
 
 
-def save_table_data(table_name, data):
-    """Сохраняет данные таблицы в файл."""
-    os.makedirs(DATA_DIR, exist_ok=True)
-    filepath = os.path.join(DATA_DIR, f'{table_name}.json')
-    with open(filepath, 'w', encoding='utf-8') as file:
-        json.dump(data, file, indent=2, ensure_ascii=False)
+def repair_table_log(table_name):
+    """Обрезает недописанную последнюю строку журнала таблицы.
+
+    Такая строка остается, если процесс прервался во время дозаписи.
+    Возвращает True, если журнал был обрезан.
+    """
+    lock = table_lock(table_name)
+    with lock.exclusive():
+        try:
+            file = open(_table_log_path(table_name), 'rb+')
+        except FileNotFoundError:
+            return False
+        with file:
+            truncated = _truncate_partial_line(file)
+        if truncated:
+            lock.bump()
+        return truncated
+
+
+def _truncate_partial_line(file):
+    """Обрезает файл после последнего перевода строки."""
+    end = file.seek(0, os.SEEK_END)
+    position = end
+    while position > 0:
+        block_start = max(0, position - 65536)
+        file.seek(block_start)
+        block = file.read(position - block_start)
+        newline = block.rfind(b'\n')
+        if newline != -1:
+            position = block_start + newline + 1
+            break
+        position = block_start
+    if position == end:
+        return False
+    file.truncate(position)
+    return True
+
+
+def compact_table_data(table_name):
+    """Сжимает журнал таблицы, оставляя только актуальные записи.
+
+    Возвращает количество строк журнала до и после сжатия.
+    """
+    with table_lock(table_name).exclusive():
+        filepath = _table_log_path(table_name)
+        if not os.path.exists(filepath):
+            data = _read_table(table_name)[0]
+            save_table_data(table_name, data)
+            return 0, len(data) + 1
+
+        data, entries_count, next_id = _replay_table_log(filepath)
+        _write_snapshot(table_name, data, next_id)
+        return entries_count, len(data) + 1
+
+
+def migrate_table_data(table_name):
+    """Переводит таблицу из старого формата JSON в формат журнала.
+
+    Возвращает True, если таблица была сконвертирована.
+    """
+    with table_lock(table_name).exclusive():
+        legacy_path = _legacy_table_path(table_name)
+        if not os.path.exists(legacy_path):
+            return False
+        with open(legacy_path, 'r', encoding='utf-8') as file:
+            data = json.load(file)
+        save_table_data(table_name, data)
+        return True
+
+
+def file_state(filepath):
+    """Возвращает размер и время изменения файла или None, если его нет."""
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def table_log_state(table_name):
+    """Возвращает размер и время изменения файла таблицы и счетчик изменений.
+
+    По этому состоянию проверяется актуальность сохраненных индексов
+    и кэша таблиц в памяти. Счетчик замечает и те изменения другими
+    процессами, после которых размер и время изменения файла совпали.
+    """
+    for filepath in (_table_log_path(table_name), _legacy_table_path(table_name)):
+        state = file_state(filepath)
+        if state is not None:
+            return state + [table_lock(table_name).version()]
+    return None
+
+
+def _index_path(table_name, column):
+    """Возвращает путь к файлу индекса столбца таблицы."""
+    return os.path.join(DATA_DIR, f'{table_name}.{column}{INDEX_SUFFIX}')
+
+
+def load_index_data(table_name, column):
+    """Загружает сохраненный индекс столбца или None, если его нет."""
+    try:
+        with open(_index_path(table_name, column), 'r', encoding='utf-8') as file:
+            _count_file('bytes_read', file, table_name)
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_index_data(table_name, column, data):
+    """Сохраняет индекс столбца в файл."""
+    _atomic_write(
+        _index_path(table_name, column),
+        lambda file: json.dump(data, file, ensure_ascii=False),
+    )
+
+
+def remove_index_data(table_name, column):
+    """Удаляет файл индекса столбца, если он есть."""
+    try:
+        os.remove(_index_path(table_name, column))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,212 @@
+import operator
+from functools import reduce
+from itertools import compress
+
+from src.primitive_db.columnar import (
+    BoolColumn,
+    IntColumn,
+    StrColumn,
+    mask_and,
+    mask_not,
+    mask_or,
+    mask_positions,
+)
+from src.primitive_db.decorators import settings
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AGGREGATES = ('count', 'sum', 'min', 'max')
+
+_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+
+def _check_sum(column):
+    """Проверяет, что столбец можно суммировать."""
+    if isinstance(column, StrColumn):
+        raise ValueError('sum применима только к столбцам int и bool')
+
+
+class PythonEngine:
+    """Вычисление условий и агрегатов по столбцам на чистом Python.
+
+    Маска - bytes из 0 и 1 по одному байту на запись.
+    """
+
+    name = 'python'
+
+    def compare(self, table, column, op, value):
+        return table.columns[column].compare_mask(op, value)
+
+    def member(self, table, column, values):
+        return table.columns[column].member_mask(values)
+
+    def codes(self, table, column, codes):
+        return table.columns[column].codes_mask(codes)
+
+    def and_(self, first, second):
+        return mask_and(first, second)
+
+    def or_(self, first, second):
+        return mask_or(first, second)
+
+    def not_(self, mask):
+        return mask_not(mask)
+
+    def positions(self, mask):
+        return mask_positions(mask)
+
+    def aggregate(self, table, column, func, mask=None):
+        """Считает агрегат count, sum, min или max по столбцу.
+
+        mask ограничивает записи; None - все записи таблицы. Для пустого
+        набора записей sum равна 0, а min и max - None.
+        """
+        if func == 'count':
+            return len(table) if mask is None else mask.count(1)
+        values = table.columns[column]
+        if func == 'sum':
+            _check_sum(values)
+        selected = iter(values) if mask is None else compress(values, mask)
+        if func == 'sum':
+            return sum(selected)
+        return (min if func == 'min' else max)(selected, default=None)
+
+
+class NumpyEngine(PythonEngine):
+    """Векторное вычисление условий и агрегатов через NumPy.
+
+    Столбцы не копируются: массивы NumPy создаются поверх буферов
+    array и bytearray на время одной операции. Маска - массив bool.
+    """
+
+    name = 'numpy'
+
+    @staticmethod
+    def _array(column):
+        if isinstance(column, IntColumn):
+            return np.frombuffer(column.values, dtype=np.int64)
+        if isinstance(column, BoolColumn):
+            return np.frombuffer(column.values, dtype=np.uint8)
+        return np.frombuffer(column.codes, dtype=np.uint32)
+
+    @staticmethod
+    def _from_bytes(mask):
+        return np.frombuffer(mask, dtype=np.uint8).astype(np.bool_)
+
+    def _codes_mask(self, column, codes):
+        array = self._array(column)
+        if not codes:
+            return np.zeros(len(array), dtype=np.bool_)
+        return np.isin(array, np.fromiter(codes, dtype=np.uint32, count=len(codes)))
+
+    def compare(self, table, column, op, value):
+        values = table.columns[column]
+        if isinstance(values, StrColumn):
+            return self._codes_mask(values, values.matching_codes(op, value))
+        try:
+            return _OPERATORS[op](self._array(values), int(value))
+        except OverflowError:
+            return self._from_bytes(values.compare_mask(op, value))
+
+    def member(self, table, column, values):
+        column_values = table.columns[column]
+        if isinstance(column_values, StrColumn):
+            return self._codes_mask(column_values, column_values.member_codes(values))
+        try:
+            items = np.array([int(value) for value in values], dtype=np.int64)
+        except OverflowError:
+            return self._from_bytes(column_values.member_mask(values))
+        return np.isin(self._array(column_values), items)
+
+    def codes(self, table, column, codes):
+        return self._codes_mask(table.columns[column], codes)
+
+    def and_(self, first, second):
+        return first & second
+
+    def or_(self, first, second):
+        return first | second
+
+    def not_(self, mask):
+        return ~mask
+
+    def positions(self, mask):
+        return np.flatnonzero(mask).tolist()
+
+    def aggregate(self, table, column, func, mask=None):
+        if func == 'count':
+            return len(table) if mask is None else int(np.count_nonzero(mask))
+        values = table.columns[column]
+        if func == 'sum':
+            _check_sum(values)
+        array = self._array(values)
+        selected = array if mask is None else array[mask]
+        if isinstance(values, StrColumn):
+            codes = np.unique(selected).tolist()
+            strings = (values.dictionary[code] for code in codes)
+            return (min if func == 'min' else max)(strings, default=None)
+        if func == 'sum':
+            if isinstance(values, BoolColumn):
+                return int(np.count_nonzero(selected))
+            if selected.size and (
+                max(abs(int(selected.min())), abs(int(selected.max())))
+                * selected.size >= 2 ** 63
+            ):
+                # Сумма может не поместиться в int64: считаем точно.
+                return sum(selected.tolist())
+            return int(selected.sum())
+        if not selected.size:
+            return None
+        result = selected.min() if func == 'min' else selected.max()
+        return bool(result) if isinstance(values, BoolColumn) else int(result)
+
+
+ENGINES = {'python': PythonEngine()}
+if np is not None:
+    ENGINES['numpy'] = NumpyEngine()
+
+
+def get_engine(name=None):
+    """Возвращает движок вычислений.
+
+    name (или настройка 'engine'): 'auto' - NumPy, если он установлен,
+    иначе Python; 'numpy' - NumPy с откатом на Python, если его нет;
+    'python' - всегда Python.
+    """
+    name = name or settings['engine']
+    if name in ('auto', 'numpy') and 'numpy' in ENGINES:
+        return ENGINES['numpy']
+    return ENGINES['python']
+
+
+def evaluate(engine, key, table):
+    """Вычисляет маску записей таблицы для нормализованного условия.
+
+    Кроме узлов условия where поддерживается узел ('codes', столбец,
+    коды): записи строкового столбца, код которых входит в набор.
+    """
+    kind = key[0]
+    if kind == 'cmp':
+        _, column, op, value = key
+        return engine.compare(table, column, op, value)
+    if kind == 'in':
+        _, column, values, negated = key
+        mask = engine.member(table, column, set(values))
+        return engine.not_(mask) if negated else mask
+    if kind == 'codes':
+        _, column, codes = key
+        return engine.codes(table, column, set(codes))
+    if kind == 'not':
+        return engine.not_(evaluate(engine, key[1], table))
+    combine = engine.and_ if kind == 'and' else engine.or_
+    return reduce(combine, (evaluate(engine, item, table) for item in key[1]))
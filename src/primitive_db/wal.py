@@ -0,0 +1,163 @@
+import json
+import os
+import threading
+import time
+
+from src.primitive_db.constants import GROUP_COMMIT_DELAY
+from src.primitive_db.utils import try_lock
+
+
+class WriteAheadLog:
+    """Журнал предзаписи (WAL) с групповой фиксацией.
+
+    Каждая группа изменений записывается одной строкой JSON и
+    сбрасывается на диск через fsync до того, как изменения попадут
+    в файлы таблиц. Если несколько потоков пишут одновременно, один
+    fsync подтверждает все строки, записанные к его началу.
+
+    У каждого процесса свой журнал (см. log_path), который он держит
+    заблокированным, пока работает: так другие процессы отличают
+    журналы завершившихся процессов (см. orphaned_logs).
+    """
+
+    def __init__(self, filepath, group_commit_delay=GROUP_COMMIT_DELAY):
+        self.filepath = filepath
+        self.group_commit_delay = group_commit_delay
+        self.records = 0
+        self.syncs = 0
+        self._file = None
+        self._size = 0
+        self._written_seq = 0
+        self._synced_seq = 0
+        self._syncing = False
+        self._cond = threading.Condition()
+
+    @property
+    def size(self):
+        """Размер журнала в байтах с момента последней контрольной точки."""
+        return self._size
+
+    def _open(self):
+        """Открывает файл журнала для дозаписи."""
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.filepath) or '.', exist_ok=True)
+            self._file = open(self.filepath, 'ab')
+            try_lock(self._file.fileno())
+            self._size = self._file.tell()
+        return self._file
+
+    def append(self, record):
+        """Записывает группу изменений и ждет, пока она окажется на диске."""
+        line = (json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8')
+        with self._cond:
+            file = self._open()
+            file.write(line)
+            file.flush()
+            self._size += len(line)
+            self._written_seq += 1
+            self.records += 1
+            seq = self._written_seq
+        self._sync(seq)
+
+    def _sync(self, seq):
+        """Дожидается fsync, покрывающего строку с номером seq.
+
+        Первый ожидающий поток выполняет fsync сам, остальные ждут его
+        результата и при необходимости выполняют следующий.
+        """
+        with self._cond:
+            while self._syncing and self._synced_seq < seq:
+                self._cond.wait()
+            if self._synced_seq >= seq:
+                return
+            self._syncing = True
+
+        synced = None
+        try:
+            if self.group_commit_delay:
+                time.sleep(self.group_commit_delay)
+            with self._cond:
+                target = self._written_seq
+                fd = self._file.fileno()
+            os.fsync(fd)
+            synced = target
+        finally:
+            with self._cond:
+                if synced is not None:
+                    self._synced_seq = max(self._synced_seq, synced)
+                    self.syncs += 1
+                self._syncing = False
+                self._cond.notify_all()
+
+    def checkpoint(self):
+        """Очищает журнал, когда все его изменения уже сохранены в файлах."""
+        with self._cond:
+            file = self._open()
+            file.truncate(0)
+            file.flush()
+            os.fsync(file.fileno())
+            self._size = 0
+
+    def close(self):
+        """Закрывает файл журнала; пустой журнал удаляется."""
+        with self._cond:
+            if self._file is not None:
+                if not self._size:
+                    os.remove(self.filepath)
+                self._file.close()
+                self._file = None
+
+
+def log_path(directory, name, pid=None):
+    """Возвращает путь к журналу процесса: <name>.<pid>."""
+    return os.path.join(directory, f'{name}.{os.getpid() if pid is None else pid}')
+
+
+def read_records(filepath):
+    """Возвращает все целые группы изменений из файла журнала.
+
+    Недописанная последняя строка (обрыв при сбое) пропускается.
+    """
+    try:
+        with open(filepath, 'rb') as file:
+            lines = file.read().split(b'\n')
+    except FileNotFoundError:
+        return []
+    records = []
+    for line in lines[:-1]:
+        if not line.strip():
+            continue
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            break
+    return records
+
+
+def orphaned_logs(directory, name):
+    """Захватывает журналы завершившихся процессов.
+
+    Журналы называются <name>.<pid> (или <name> в старом формате).
+    Журнал работающего процесса заблокирован им, поэтому журналы,
+    которые удалось заблокировать, остались от завершившихся процессов.
+    Возвращает открытые и заблокированные файлы этих журналов; после
+    применения их нужно удалить и закрыть.
+    """
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    logs = []
+    for file_name in names:
+        base, _, pid = file_name.partition(f'{name}.')
+        if file_name != name and (base or not pid.isdigit()):
+            continue
+        try:
+            file = open(os.path.join(directory, file_name), 'rb')
+        except FileNotFoundError:
+            continue
+        if try_lock(file.fileno()):
+            logs.append(file)
+        else:
+            file.close()
+    return logs
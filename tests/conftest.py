@@ -0,0 +1,33 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Переходит во временный каталог: таблицы создаются в его data/."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def run_script(workdir):
+    """Выполняет команды скрипта в отдельном процессе в каталоге workdir."""
+    def run(*commands):
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        result = subprocess.run(
+            [sys.executable, '-m', 'src.primitive_db.main', '--script', '-'],
+            input='\n'.join(commands) + '\n',
+            capture_output=True,
+            text=True,
+            cwd=workdir,
+            env=env,
+            check=False,
+        )
+        assert result.returncode == 0, result.stdout + result.stderr
+        return result.stdout
+    return run
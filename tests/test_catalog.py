@@ -0,0 +1,95 @@
+from src.primitive_db import catalog as catalog_module
+from src.primitive_db import index as index_module
+from src.primitive_db.catalog import Catalog
+from src.primitive_db.index import lookup_positions
+
+
+def test_index_saved_with_snapshot_state(run_script, monkeypatch):
+    """Индекс сохраняется с состоянием журнала, из которого он построен.
+
+    Если другой процесс дописал таблицу между чтением журнала и
+    сохранением индекса, следующая загрузка не должна взять индекс,
+    в котором нет новых записей.
+    """
+    run_script(
+        'create_table t name:str',
+        'create_index t name',
+        'insert into t values ("a")',
+    )
+    build_table_indexes = catalog_module.build_table_indexes
+
+    def build_after_append(*args, **kwargs):
+        run_script('insert into t values ("b")')
+        return build_table_indexes(*args, **kwargs)
+
+    monkeypatch.setattr(catalog_module, 'build_table_indexes', build_after_append)
+    Catalog().load_table('t')
+    monkeypatch.setattr(catalog_module, 'build_table_indexes', build_table_indexes)
+
+    table = Catalog().load_table('t')
+    assert len(table.data) == 2
+    positions = lookup_positions(table.indexes, 'name', 'b')
+    assert [table.data[position]['name'] for position in positions] == ['b']
+
+
+def test_stats_not_saved_over_foreign_changes(run_script):
+    """Статистика не сохраняется для таблицы, измененной другим процессом.
+
+    Иначе статистика по старым данным получила бы метку нового состояния
+    файла, и count(*) по ней расходился бы с содержимым таблицы.
+    """
+    run_script('create_table t name:str', 'insert into t values ("a")')
+    catalog = Catalog()
+    catalog.table_stats('t')
+    with catalog.writing('t'):
+        record_id = catalog.reserve_ids('t')
+        catalog.insert_records('t', [{'ID': record_id, 'name': 'b'}])
+    run_script('insert into t values ("c")')
+    catalog.save_stats()
+    catalog.close()
+
+    assert Catalog().table_stats('t')['rows'] == 3
+
+
+def _secondary_builds(monkeypatch):
+    """Подсчитывает построения вторичных индексов с нуля."""
+    builds = []
+    build = index_module.HashIndex.build
+
+    def counted_build(self, table_data):
+        if not self.unique:
+            builds.append(self.column)
+        return build(self, table_data)
+
+    monkeypatch.setattr(index_module.HashIndex, 'build', counted_build)
+    return builds
+
+
+def test_indexes_saved_after_writes(run_script, monkeypatch):
+    """Индексы таблицы, измененной за сеанс, сохраняются при закрытии.
+
+    Следующий запуск загружает их с диска, а не строит заново, в том
+    числе после сжатия журнала.
+    """
+    run_script(
+        'create_table t name:str age:int',
+        'create_index t name',
+        'create_index t age sorted',
+        'insert into t values ("a", 1)',
+    )
+    run_script(
+        'insert into t values ("b", 2)',
+        'insert into t values ("c", 3)',
+        'update t set name = "d" where ID = 1',
+        'delete from t where ID = 2',
+    )
+    builds = _secondary_builds(monkeypatch)
+    table = Catalog().load_table('t')
+    assert builds == []
+    positions = lookup_positions(table.indexes, 'name', 'd')
+    assert [table.data[position]['ID'] for position in positions] == [1]
+    assert lookup_positions(table.indexes, 'name', 'b') == []
+
+    run_script('select from t', 'compact t')
+    Catalog().load_table('t')
+    assert builds == []
@@ -0,0 +1,28 @@
+import json
+
+BIG = 2 ** 70
+
+
+def _rows(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith('{')]
+
+
+def test_update_beyond_int64_keeps_index(run_script):
+    """update значением вне int64 не падает и не портит индекс столбца."""
+    output = run_script(
+        'create_table t n:int',
+        'create_index t n',
+        'insert into t values (1)',
+        'insert into t values (2)',
+        '\\output jsonl',
+        f'update t set n = {BIG} where ID = 1',
+        f'select from t where n = {BIG}',
+        'select from t where n = 1',
+        'update t set n = 1 where ID = 2',
+        'select from t where n = 1',
+    )
+    assert 'непредвиденная' not in output
+    assert _rows(output) == [{'ID': 1, 'n': BIG}, {'ID': 2, 'n': 1}]
+
+    output = run_script('\\output jsonl', 'select from t')
+    assert _rows(output) == [{'ID': 1, 'n': BIG}, {'ID': 2, 'n': 1}]
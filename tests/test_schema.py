@@ -0,0 +1,12 @@
+from src.primitive_db.core import create_table
+from src.primitive_db.schema import get_schema
+
+
+def test_id_cannot_be_updated():
+    """ID нельзя менять: журнал таблицы хранит записи по ID."""
+    metadata, _ = create_table({}, 't', ['name:str'])
+    schema = get_schema(metadata, 't')
+    assert schema.convert_assignments({'ID': 100}) == (
+        None, 'Ошибка: Столбец "ID" нельзя изменить.'
+    )
+    assert schema.convert_assignments({'name': 'b'}) == ({'name': 'b'}, None)
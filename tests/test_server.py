@@ -0,0 +1,17 @@
+import pytest
+
+from src.primitive_db.server import command_access
+
+
+@pytest.mark.parametrize('command', [
+    '\\pager on', '\\output tsv', '\\engine python', '\\workers 4', '\\metrics',
+    '\\profile \\pager on', 'begin',
+])
+def test_shared_settings_rejected(command):
+    """Клиент не может менять настройки, общие для всех клиентов."""
+    with pytest.raises(ValueError):
+        command_access(command, {})
+
+
+def test_profile_runs_alone():
+    assert command_access('\\profile select from t', {}) is None
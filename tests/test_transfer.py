@@ -0,0 +1,26 @@
+from src.primitive_db.catalog import Catalog
+from src.primitive_db.transfer import import_rows
+
+
+def test_import_writes_one_group_per_batch(run_script, workdir, monkeypatch):
+    """Порция импорта вместе с блоком ID записывается одной операцией."""
+    run_script('create_table t name:str', 'insert into t values ("a")')
+    (workdir / 'rows.csv').write_text('name\nb\nc\nd\ne\nf\n', encoding='utf-8')
+    catalog = Catalog()
+    commits = []
+    commit = catalog._commit
+
+    def counted_commit(tables, metadata=None):
+        commits.append(tables)
+        return commit(tables, metadata)
+
+    monkeypatch.setattr(catalog, '_commit', counted_commit)
+    with catalog.writing('t'):
+        imported, rejected, _ = import_rows(catalog, 't', 'rows.csv', batch_size=2)
+    assert (imported, rejected) == (5, [])
+    assert len(commits) == 3
+    catalog.close()
+
+    table = Catalog().load_table('t')
+    assert sorted(record['ID'] for record in table.data) == [1, 2, 3, 4, 5, 6]
+    assert table.next_id == 7
@@ -0,0 +1,81 @@
+import pytest
+
+from src.primitive_db.columnar import to_table
+from src.primitive_db.core import create_table
+from src.primitive_db.schema import get_schema
+from src.primitive_db.vector import AGGREGATES, ENGINES, evaluate
+
+pytestmark = pytest.mark.skipif('numpy' not in ENGINES, reason='NumPy не установлен')
+
+BIG = 2 ** 62
+NAMES = ['ann', 'bob', 'cid', 'bob', 'dan', 'ann', 'eve', 'fay']
+AGES = [30, -5, 0, 30, 99, BIG, -BIG, 3 * 2 ** 61]
+
+CONDITIONS = [
+    ('cmp', 'age', '<', 30),
+    ('cmp', 'age', '>=', 0),
+    ('cmp', 'age', '=', BIG),
+    ('cmp', 'age', '!=', 30),
+    ('cmp', 'name', '<=', 'bob'),
+    ('cmp', 'name', '=', 'zed'),
+    ('cmp', 'active', '=', True),
+    ('in', 'age', (30, 99, 7), False),
+    ('in', 'name', ('ann', 'zed'), True),
+    ('in', 'active', (False,), False),
+    ('codes', 'name', (0, 2)),
+    ('codes', 'name', ()),
+    ('and', (('cmp', 'age', '>', 0), ('cmp', 'name', '!=', 'bob'))),
+    ('or', (('cmp', 'age', '<', 0), ('cmp', 'active', '=', False))),
+    ('not', ('in', 'name', ('bob',), False)),
+    # Значения вне int64: NumPy откатывается на вычисление по столбцу.
+    ('cmp', 'age', '<', 2 ** 70),
+    ('in', 'age', (2 ** 70, 30), False),
+]
+
+
+@pytest.fixture(scope='module')
+def table():
+    metadata, _ = create_table({}, 't', ['name:str', 'age:int', 'active:bool'])
+    records = [
+        {'ID': number, 'name': name, 'age': age, 'active': number % 3 == 0}
+        for number, (name, age) in enumerate(zip(NAMES, AGES), start=1)
+    ]
+    return to_table(records, get_schema(metadata, 't'))
+
+
+def _positions(name, key, table):
+    engine = ENGINES[name]
+    return engine.positions(evaluate(engine, key, table))
+
+
+@pytest.mark.parametrize('key', CONDITIONS, ids=repr)
+def test_masks_match(table, key):
+    assert _positions('numpy', key, table) == _positions('python', key, table)
+
+
+@pytest.mark.parametrize('key', [None, *CONDITIONS[:4], ('codes', 'name', ())])
+@pytest.mark.parametrize('column', ['name', 'age', 'active'])
+@pytest.mark.parametrize('func', AGGREGATES)
+def test_aggregates_match(table, key, column, func):
+    """Агрегаты совпадают, в том числе по пустой маске и с суммой вне int64."""
+    if func == 'sum' and column == 'name':
+        for engine in ENGINES.values():
+            with pytest.raises(ValueError):
+                engine.aggregate(table, column, func)
+        return
+    results = []
+    for engine in (ENGINES['numpy'], ENGINES['python']):
+        mask = None if key is None else evaluate(engine, key, table)
+        result = engine.aggregate(table, column, func, mask)
+        results.append((type(result), result))
+    assert results[0] == results[1]
+
+
+def test_sum_beyond_int64(table):
+    """Сумма, не помещающаяся в int64, считается точно."""
+    key = ('cmp', 'age', '>', 0)
+    expected = sum(age for age in AGES if age > 0)
+    assert expected >= 2 ** 63
+    for engine in ENGINES.values():
+        mask = evaluate(engine, key, table)
+        assert engine.aggregate(table, 'age', 'sum', mask) == expected